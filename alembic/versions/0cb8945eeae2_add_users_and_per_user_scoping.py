@@ -0,0 +1,106 @@
+"""Add users table and per-user scoping columns
+
+Revision ID: 0cb8945eeae2
+Revises: 2867196b2955
+Create Date: 2026-10-19 09:12:31.402118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from habittracker import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "0cb8945eeae2"
+down_revision: Union[str, Sequence[str], None] = "2867196b2955"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The backfill below commits everything before it, so every step is
+    # skipped when already applied by an interrupted run.
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("username"),
+        if_not_exists=True,
+    )
+
+    # Batch mode rebuilds the table and cannot reflect expression indexes, so
+    # the per-day uniqueness index is dropped here and recreated afterwards.
+    op.drop_index("uq_completions_habit_date", table_name="completions", if_exists=True)
+    for table in ("habits", "completions", "user_preferences"):
+        if migrations.has_column(table, "user_id"):
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column("user_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                f"fk_{table}_user_id_users", "users", ["user_id"], ["id"]
+            )
+
+    # Existing rows belong to the account used by requests without a user
+    # header, so single-user installs keep seeing their data.
+    op.execute(
+        "INSERT INTO users (id, username, created_at) "
+        "SELECT 1, 'default', CURRENT_TIMESTAMP "
+        "WHERE NOT EXISTS (SELECT 1 FROM users WHERE id = 1)"
+    )
+    for table in ("habits", "user_preferences"):
+        op.execute(f"UPDATE {table} SET user_id = 1")
+    migrations.run_batched(
+        "assign completions to the default user",
+        "completions",
+        "UPDATE completions SET user_id = 1 WHERE id BETWEEN :lo AND :hi",
+    )
+
+    migrations.create_index_online(
+        "uq_completions_habit_date",
+        "completions",
+        ["habit_id", sa.text("DATE(completed_at)")],
+        unique=True,
+    )
+    op.create_index(
+        "ix_habits_user_periodicity",
+        "habits",
+        ["user_id", "periodicity"],
+        if_not_exists=True,
+    )
+    migrations.create_index_online(
+        "ix_completions_user_habit_completed_at",
+        "completions",
+        ["user_id", "habit_id", "completed_at"],
+    )
+    op.create_index(
+        "ix_user_preferences_user_id",
+        "user_preferences",
+        ["user_id"],
+        unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_user_preferences_user_id", table_name="user_preferences")
+    op.drop_index("ix_completions_user_habit_completed_at", table_name="completions")
+    op.drop_index("ix_habits_user_periodicity", table_name="habits")
+    op.drop_index("uq_completions_habit_date", table_name="completions")
+    for table in ("user_preferences", "completions", "habits"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f"fk_{table}_user_id_users", type_="foreignkey")
+            batch_op.drop_column("user_id")
+    op.create_index(
+        "uq_completions_habit_date",
+        "completions",
+        ["habit_id", sa.text("DATE(completed_at)")],
+        unique=True,
+    )
+    op.drop_table("users")
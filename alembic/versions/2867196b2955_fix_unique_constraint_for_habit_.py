@@ -11,6 +11,7 @@ from typing import Sequence, Union
 import sqlalchemy as sa
 
 from alembic import op
+from habittracker import migrations
 
 # revision identifiers, used by Alembic.
 revision: str = "2867196b2955"
@@ -21,30 +22,37 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # Drop the existing non-unique index
-    op.drop_index("ix_completions_habit_date", table_name="completions")
-
-    # Clean up any existing duplicate completions before enforcing uniqueness
-    op.execute(
+    # Clean up any existing duplicate completions before enforcing uniqueness,
+    # keeping the first row per habit and day. Batches commit separately so
+    # large tables are not locked for the whole cleanup, and each lookup uses
+    # the non-unique index, which is only dropped afterwards.
+    migrations.run_batched(
+        "dedupe completions per habit and day",
+        "completions",
         """
         DELETE FROM completions
-        WHERE rowid NOT IN (
-            SELECT MIN(rowid)
-            FROM completions
-            GROUP BY habit_id, DATE(completed_at)
-        )
-    """
+        WHERE id BETWEEN :lo AND :hi
+          AND EXISTS (
+            SELECT 1 FROM completions AS earlier
+            WHERE earlier.habit_id = completions.habit_id
+              AND DATE(earlier.completed_at) = DATE(completions.completed_at)
+              AND earlier.id < completions.id
+          )
+        """,
     )
 
     # Create a UNIQUE index to prevent duplicate completions per habit per day
     # This enforces uniqueness at the database level
-    op.create_index(
+    migrations.create_index_online(
         "uq_completions_habit_date",
         "completions",
         ["habit_id", sa.text("DATE(completed_at)")],
         unique=True,
     )
 
+    # The unique index replaces the non-unique one
+    op.drop_index("ix_completions_habit_date", table_name="completions")
+
 
 def downgrade() -> None:
     """Downgrade schema."""
@@ -0,0 +1,105 @@
+"""Add completion period keys and user timezone
+
+Revision ID: 5f1c2a7d9e43
+Revises: 0cb8945eeae2
+Create Date: 2026-10-19 11:40:02.118734
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from habittracker import migrations, periods
+
+# revision identifiers, used by Alembic.
+revision: str = "5f1c2a7d9e43"
+down_revision: Union[str, Sequence[str], None] = "0cb8945eeae2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The backfill commits these columns, so a resumed run finds them added.
+    columns = [
+        (
+            "user_preferences",
+            sa.Column(
+                "timezone",
+                sa.String(),
+                nullable=False,
+                server_default=periods.DEFAULT_TIMEZONE,
+            ),
+        ),
+        ("completions", sa.Column("local_date", sa.Date(), nullable=True)),
+        ("completions", sa.Column("iso_week", sa.String(8), nullable=True)),
+    ]
+    for table, column in columns:
+        if not migrations.has_column(table, column.name):
+            op.add_column(table, column)
+
+    # Every existing user is on UTC, so the local date is the stored UTC date.
+    completions = sa.table(
+        "completions",
+        sa.column("id"),
+        sa.column("completed_at", sa.DateTime()),
+        sa.column("local_date"),
+    )
+
+    def backfill(conn, lo, hi):
+        rows = conn.execute(
+            sa.select(completions.c.id, completions.c.completed_at).where(
+                completions.c.id.between(lo, hi), completions.c.local_date.is_(None)
+            )
+        ).all()
+        updates = []
+        for completion_id, completed_at in rows:
+            day = completed_at.date()
+            updates.append(
+                {
+                    "id": completion_id,
+                    "local_date": day.isoformat(),
+                    "iso_week": periods.iso_week_key(day),
+                }
+            )
+        if updates:
+            conn.execute(
+                sa.text(
+                    "UPDATE completions SET local_date = :local_date, "
+                    "iso_week = :iso_week WHERE id = :id"
+                ),
+                updates,
+            )
+        return len(updates)
+
+    migrations.run_batched("backfill completion period keys", "completions", backfill)
+
+    # Per-day uniqueness now follows the owner's local day.
+    op.drop_index("uq_completions_habit_date", table_name="completions", if_exists=True)
+    migrations.create_index_online(
+        "uq_completions_habit_local_date",
+        "completions",
+        ["habit_id", "local_date"],
+        unique=True,
+    )
+    migrations.create_index_online(
+        "ix_completions_habit_iso_week", "completions", ["habit_id", "iso_week"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_completions_habit_iso_week", table_name="completions")
+    op.drop_index("uq_completions_habit_local_date", table_name="completions")
+    op.create_index(
+        "uq_completions_habit_date",
+        "completions",
+        ["habit_id", sa.text("DATE(completed_at)")],
+        unique=True,
+    )
+    op.drop_column("completions", "iso_week")
+    op.drop_column("completions", "local_date")
+    with op.batch_alter_table("user_preferences") as batch_op:
+        batch_op.drop_column("timezone")
@@ -0,0 +1,30 @@
+"""Add completions index for windowed analytics
+
+Revision ID: 8d3e6b0a4c17
+Revises: 5f1c2a7d9e43
+Create Date: 2026-10-19 14:05:37.402981
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+from habittracker import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "8d3e6b0a4c17"
+down_revision: Union[str, Sequence[str], None] = "5f1c2a7d9e43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    migrations.create_index_online(
+        "ix_completions_user_local_date", "completions", ["user_id", "local_date"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_completions_user_local_date", table_name="completions")
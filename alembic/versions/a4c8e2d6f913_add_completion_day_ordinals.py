@@ -0,0 +1,109 @@
+"""Add integer day and ISO week ordinals to completions
+
+Revision ID: a4c8e2d6f913
+Revises: e7a3c5f19b82
+Create Date: 2026-10-19 20:41:09.118264
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from habittracker import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c8e2d6f913"
+down_revision: Union[str, Sequence[str], None] = "e7a3c5f19b82"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQLite's date.toordinal(): Julian day 1721425.5 is 0001-01-01, ordinal 1.
+DAY_ORDINAL = "CAST(julianday(local_date) - 1721424.5 AS INTEGER)"
+
+
+def _archive_tables() -> list[str]:
+    years = op.get_bind().execute(sa.text("SELECT year FROM completion_archives"))
+    return [f"completions_archive_{year}" for year in years.scalars().all()]
+
+
+def _add_ordinals(table: str):
+    # Columns committed by an interrupted run are kept
+    for column in ("day_ordinal", "iso_week_ordinal"):
+        if not migrations.has_column(table, column):
+            op.add_column(table, sa.Column(column, sa.Integer(), nullable=True))
+    # Ordinal 1 is a Monday, so whole weeks counted from it are ISO weeks
+    migrations.run_batched(
+        f"backfill {table} day ordinals",
+        table,
+        f"UPDATE {table} SET day_ordinal = {DAY_ORDINAL}, "
+        f"iso_week_ordinal = ({DAY_ORDINAL} - 1) / 7 "
+        "WHERE id BETWEEN :lo AND :hi AND local_date IS NOT NULL",
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _add_ordinals("completions")
+    migrations.create_index_online(
+        "uq_completions_habit_day_ordinal",
+        "completions",
+        ["habit_id", "day_ordinal"],
+        unique=True,
+    )
+    migrations.create_index_online(
+        "ix_completions_habit_iso_week_ordinal",
+        "completions",
+        ["habit_id", "iso_week_ordinal"],
+    )
+    migrations.create_index_online(
+        "ix_completions_user_day_ordinal", "completions", ["user_id", "day_ordinal"]
+    )
+    # The integer indexes replace the ones on date and week text
+    for index in (
+        "uq_completions_habit_local_date",
+        "ix_completions_habit_iso_week",
+        "ix_completions_user_local_date",
+    ):
+        op.drop_index(index, table_name="completions", if_exists=True)
+
+    for table in _archive_tables():
+        _add_ordinals(table)
+        for owner in ("user", "habit"):
+            migrations.create_index_online(
+                f"ix_{table}_{owner}_day_ordinal", table, [f"{owner}_id", "day_ordinal"]
+            )
+            op.drop_index(
+                f"ix_{table}_{owner}_local_date", table_name=table, if_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in _archive_tables():
+        for owner in ("user", "habit"):
+            op.create_index(
+                f"ix_{table}_{owner}_local_date", table, [f"{owner}_id", "local_date"]
+            )
+            op.drop_index(f"ix_{table}_{owner}_day_ordinal", table_name=table)
+        op.drop_column(table, "iso_week_ordinal")
+        op.drop_column(table, "day_ordinal")
+
+    op.create_index(
+        "ix_completions_user_local_date", "completions", ["user_id", "local_date"]
+    )
+    op.create_index(
+        "ix_completions_habit_iso_week", "completions", ["habit_id", "iso_week"]
+    )
+    op.create_index(
+        "uq_completions_habit_local_date",
+        "completions",
+        ["habit_id", "local_date"],
+        unique=True,
+    )
+    op.drop_index("ix_completions_user_day_ordinal", table_name="completions")
+    op.drop_index("ix_completions_habit_iso_week_ordinal", table_name="completions")
+    op.drop_index("uq_completions_habit_day_ordinal", table_name="completions")
+    op.drop_column("completions", "iso_week_ordinal")
+    op.drop_column("completions", "day_ordinal")
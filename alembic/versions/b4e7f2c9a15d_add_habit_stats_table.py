@@ -0,0 +1,47 @@
+"""Add habit_stats table for completion-rate rankings
+
+Revision ID: b4e7f2c9a15d
+Revises: 8d3e6b0a4c17
+Create Date: 2026-10-19 15:22:48.917350
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b4e7f2c9a15d"
+down_revision: Union[str, Sequence[str], None] = "8d3e6b0a4c17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows are filled on the first ranking read, so there is no backfill.
+    op.create_table(
+        "habit_stats",
+        sa.Column("habit_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("completions_30d", sa.Integer(), nullable=False),
+        sa.Column("expected_30d", sa.Float(), nullable=False),
+        sa.Column("completion_rate_30d", sa.Float(), nullable=False),
+        sa.Column("as_of", sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(["habit_id"], ["habits.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("habit_id"),
+    )
+    op.create_index(
+        "ix_habit_stats_user_rate",
+        "habit_stats",
+        ["user_id", "completion_rate_30d"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_habit_stats_user_rate", table_name="habit_stats")
+    op.drop_table("habit_stats")
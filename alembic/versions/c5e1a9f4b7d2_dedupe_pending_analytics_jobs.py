@@ -0,0 +1,54 @@
+"""Track analytics job workers and allow one pending job per key
+
+Revision ID: c5e1a9f4b7d2
+Revises: f3b9d1c7a2e4
+Create Date: 2026-10-19 23:48:05.264381
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e1a9f4b7d2"
+down_revision: Union[str, Sequence[str], None] = "f3b9d1c7a2e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING = "status IN ('queued', 'running')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "analytics_jobs", sa.Column("started_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "analytics_jobs", sa.Column("worker", sa.String(length=64), nullable=True)
+    )
+    # Jobs pending from before the upgrade belong to processes that are
+    # gone, and may hold duplicate keys the new index would reject.
+    op.execute(
+        "UPDATE analytics_jobs SET status = 'failed', "
+        "error = 'abandoned: its process exited', "
+        "finished_at = CURRENT_TIMESTAMP, expires_at = CURRENT_TIMESTAMP "
+        f"WHERE {PENDING}"
+    )
+    op.create_index(
+        "uq_analytics_jobs_pending_key",
+        "analytics_jobs",
+        ["key"],
+        unique=True,
+        sqlite_where=sa.text(PENDING),
+        postgresql_where=sa.text(PENDING),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_analytics_jobs_pending_key", table_name="analytics_jobs")
+    op.drop_column("analytics_jobs", "worker")
+    op.drop_column("analytics_jobs", "started_at")
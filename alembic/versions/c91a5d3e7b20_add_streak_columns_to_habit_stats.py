@@ -0,0 +1,43 @@
+"""Add streak columns to habit_stats
+
+Revision ID: c91a5d3e7b20
+Revises: b4e7f2c9a15d
+Create Date: 2026-10-19 16:48:03.551274
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c91a5d3e7b20"
+down_revision: Union[str, Sequence[str], None] = "b4e7f2c9a15d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "habit_stats",
+        sa.Column("current_streak", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "habit_stats",
+        sa.Column("longest_streak", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("habit_stats", sa.Column("last_completed", sa.Date(), nullable=True))
+    # The rows are derived data; dropping them makes the next read or
+    # rollover recompute them with streaks filled in.
+    op.execute("DELETE FROM habit_stats")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("habit_stats") as batch_op:
+        batch_op.drop_column("last_completed")
+        batch_op.drop_column("longest_streak")
+        batch_op.drop_column("current_streak")
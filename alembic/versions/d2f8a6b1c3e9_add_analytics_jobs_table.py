@@ -0,0 +1,50 @@
+"""Add analytics_jobs table for background analytics
+
+Revision ID: d2f8a6b1c3e9
+Revises: c91a5d3e7b20
+Create Date: 2026-10-19 17:31:26.084412
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d2f8a6b1c3e9"
+down_revision: Union[str, Sequence[str], None] = "c91a5d3e7b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "analytics_jobs",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("params", sa.Text(), nullable=False),
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("result", sa.Text(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_analytics_jobs_key_status", "analytics_jobs", ["key", "status"])
+    op.create_index(
+        op.f("ix_analytics_jobs_expires_at"), "analytics_jobs", ["expires_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_analytics_jobs_expires_at"), table_name="analytics_jobs")
+    op.drop_index("ix_analytics_jobs_key_status", table_name="analytics_jobs")
+    op.drop_table("analytics_jobs")
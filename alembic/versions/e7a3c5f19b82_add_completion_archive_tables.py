@@ -0,0 +1,61 @@
+"""Add completion archive bookkeeping and monthly rollups
+
+Revision ID: e7a3c5f19b82
+Revises: d2f8a6b1c3e9
+Create Date: 2026-10-19 19:12:48.530917
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a3c5f19b82"
+down_revision: Union[str, Sequence[str], None] = "d2f8a6b1c3e9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "completion_archives",
+        sa.Column("year", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("archived_before", sa.Date(), nullable=False),
+        sa.Column("completions", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("year"),
+    )
+    op.create_table(
+        "completion_rollups",
+        sa.Column("habit_id", sa.Integer(), nullable=False),
+        sa.Column("month", sa.String(length=7), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("completed", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["habit_id"], ["habits.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("habit_id", "month"),
+    )
+    op.create_index("ix_completion_rollups_user", "completion_rollups", ["user_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived rows go back to the hot table before their tables are dropped
+    conn = op.get_bind()
+    years = conn.execute(sa.text("SELECT year FROM completion_archives")).scalars()
+    for year in years.all():
+        table = f"completions_archive_{year}"
+        op.execute(
+            "INSERT INTO completions "
+            "(id, completed_at, habit_id, user_id, local_date, iso_week) "
+            "SELECT id, completed_at, habit_id, user_id, local_date, iso_week "
+            f"FROM {table}"
+        )
+        op.drop_table(table)
+    op.drop_index("ix_completion_rollups_user", table_name="completion_rollups")
+    op.drop_table("completion_rollups")
+    op.drop_table("completion_archives")
@@ -0,0 +1,41 @@
+"""Index habit_stats by user and as_of, and give every habit a stats row
+
+Revision ID: f3b9d1c7a2e4
+Revises: a4c8e2d6f913
+Create Date: 2026-10-19 23:12:40.517093
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+from habittracker import migrations
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b9d1c7a2e4"
+down_revision: Union[str, Sequence[str], None] = "a4c8e2d6f913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# ``models.STALE_AS_OF``: rows dated this are computed on the next read.
+STALE_AS_OF = "0001-01-01"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    migrations.create_index_online(
+        "ix_habit_stats_user_as_of", "habit_stats", ["user_id", "as_of"]
+    )
+    # Reads look for stale rows only, so habits without one get one
+    op.execute(
+        "INSERT INTO habit_stats (habit_id, user_id, completions_30d, "
+        "expected_30d, completion_rate_30d, current_streak, longest_streak, "
+        f"as_of) SELECT id, user_id, 0, 0.0, 0.0, 0, 0, '{STALE_AS_OF}' "
+        "FROM habits WHERE id NOT IN (SELECT habit_id FROM habit_stats)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"DELETE FROM habit_stats WHERE as_of = '{STALE_AS_OF}'")
+    op.drop_index("ix_habit_stats_user_as_of", table_name="habit_stats")
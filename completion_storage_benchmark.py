@@ -0,0 +1,148 @@
+"""Compare completion period keys stored as text and as integer ordinals.
+
+Fills a throwaway SQLite database with ``--rows`` completions carrying both
+key forms, then for each form builds the completions indexes and reports
+their size, the time of ``--checks`` period checks (the check-off query)
+and of ``--scans`` 90-day windowed count queries (the analytics query):
+
+    python completion_storage_benchmark.py --rows 2000000
+"""
+
+import argparse
+import datetime
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from habittracker import periods
+
+KEYS = {
+    "text": ("local_date", "iso_week"),
+    "ordinal": ("day_ordinal", "iso_week_ordinal"),
+}
+
+
+def build(path: Path, rows: int, habits: int, users: int):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(
+        "CREATE TABLE completions (id INTEGER PRIMARY KEY, habit_id INTEGER, "
+        "user_id INTEGER, completed_at DATETIME, local_date DATE, "
+        "iso_week VARCHAR(8), day_ordinal INTEGER, iso_week_ordinal INTEGER)"
+    )
+    start = datetime.date(2015, 1, 1)
+    days = rows // habits + 1
+    chunk = []
+    for i in range(rows):
+        habit_id = i % habits + 1
+        day = start + datetime.timedelta(days=i // habits % days)
+        chunk.append(
+            (
+                habit_id,
+                habit_id % users + 1,
+                f"{day} 08:00:00",
+                day.isoformat(),
+                periods.iso_week_key(day),
+                periods.day_ordinal(day),
+                periods.iso_week_ordinal(day),
+            )
+        )
+        if len(chunk) == 100_000:
+            _insert(conn, chunk)
+    _insert(conn, chunk)
+    conn.commit()
+    return conn, start, start + datetime.timedelta(days=days - 1)
+
+
+def _insert(conn, chunk: list):
+    conn.executemany(
+        "INSERT INTO completions (habit_id, user_id, completed_at, local_date, "
+        "iso_week, day_ordinal, iso_week_ordinal) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        chunk,
+    )
+    chunk.clear()
+
+
+def _pages(conn) -> int:
+    return conn.execute("PRAGMA page_count").fetchone()[0]
+
+
+def run(conn, form: str, first, last, habits: int, users: int, args) -> tuple:
+    day, week = KEYS[form]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    indexes = {
+        "uq_habit_day": f"CREATE UNIQUE INDEX uq_habit_day ON completions "
+        f"(habit_id, {day})",
+        "ix_habit_week": f"CREATE INDEX ix_habit_week ON completions "
+        f"(habit_id, {week})",
+        "ix_user_day": f"CREATE INDEX ix_user_day ON completions (user_id, {day})",
+    }
+    before = _pages(conn)
+    for ddl in indexes.values():
+        conn.execute(ddl)
+    conn.commit()
+    index_mb = (_pages(conn) - before) * page_size / 2**20
+
+    def key(value: datetime.date):
+        return value.isoformat() if form == "text" else periods.day_ordinal(value)
+
+    rng = random.Random(0)
+    span = (last - first).days
+    started = time.perf_counter()
+    for _ in range(args.checks):
+        on = first + datetime.timedelta(days=rng.randrange(span))
+        conn.execute(
+            f"SELECT id FROM completions WHERE habit_id = ? AND {day} = ? LIMIT 1",
+            (rng.randrange(habits) + 1, key(on)),
+        ).fetchone()
+    check_us = (time.perf_counter() - started) / args.checks * 1e6
+
+    started = time.perf_counter()
+    for _ in range(args.scans):
+        since = first + datetime.timedelta(days=rng.randrange(max(1, span - 90)))
+        conn.execute(
+            f"SELECT habit_id, {day}, COUNT(*) FROM completions "
+            f"WHERE user_id = ? AND {day} BETWEEN ? AND ? GROUP BY habit_id, {day}",
+            (
+                rng.randrange(users) + 1,
+                key(since),
+                key(since + datetime.timedelta(days=89)),
+            ),
+        ).fetchall()
+    scan_ms = (time.perf_counter() - started) / args.scans * 1e3
+
+    for name in indexes:
+        conn.execute(f"DROP INDEX {name}")
+    conn.commit()
+    conn.execute("VACUUM")
+    return index_mb, check_us, scan_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--habits", type=int, default=1_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--checks", type=int, default=20_000)
+    parser.add_argument("--scans", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, first, last = build(
+            Path(tmp) / "benchmark.db", args.rows, args.habits, args.users
+        )
+        print(f"{args.rows:,} completions from {first} to {last}")
+        print(f"{'keys':8} {'index MB':>9} {'check us':>9} {'90d scan ms':>12}")
+        for form in KEYS:
+            index_mb, check_us, scan_ms = run(
+                conn, form, first, last, args.habits, args.users, args
+            )
+            print(f"{form:8} {index_mb:9.1f} {check_us:9.1f} {scan_ms:12.2f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
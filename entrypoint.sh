@@ -3,18 +3,9 @@ set -e
 
 echo "Starting Habit Tracker Application..."
 
-# Wait a moment for any system initialization
-sleep 1
-
-# Run database migrations
-echo "Running database migrations..."
-python -m alembic upgrade head
-
-# Check if database has any habits (fresh start every time due to no volume)
-echo "Initializing with sample data..."
-python seed.py
-
-# Start the Flask application
+# The app migrates the database on boot (AUTO_MIGRATE=1) and adds sample
+# habits to an empty database when SEED_SAMPLE_DATA=1, in the same process
+# that serves requests.
 echo "Starting Flask server on port 5000..."
 echo "Application ready! Visit http://localhost:5000"
-python -m flask run --host=0.0.0.0 --port=5000
+exec python -m flask run --host=0.0.0.0 --port=5000
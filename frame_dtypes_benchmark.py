@@ -0,0 +1,115 @@
+"""Compare the memory of analytics frames read with default and compact dtypes.
+
+Fills a throwaway SQLite database with ``--habits`` habits and ``--rows``
+completions, then reads the habits frame and the per-day completion counts
+the way analytics did before (object periodicity mapped per row, 64-bit ids,
+nanosecond timestamps) and as ``AnalyticsService`` reads them now, and
+reports ``memory_usage(deep=True)`` per million rows and the read time:
+
+    python frame_dtypes_benchmark.py --habits 1000000 --rows 1000000
+"""
+
+import argparse
+import datetime
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy.orm import sessionmaker
+
+from habittracker import periods
+from habittracker.analytics import EPOCH_ORDINAL, AnalyticsService
+from habittracker.database import create_database_engine
+from habittracker.models import Base, Habit
+
+
+def build(path: Path, habits: int, rows: int):
+    engine = create_database_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO habits (id, name, periodicity, created_at) VALUES (?, ?, ?, ?)",
+        (
+            (i, f"Habit {i}", "WEEKLY" if i % 3 else "DAILY", "2020-01-01 08:00:00")
+            for i in range(1, habits + 1)
+        ),
+    )
+    start = datetime.date(2020, 1, 1)
+    per_habit = rows // habits + 1
+
+    def completions():
+        for i in range(rows):
+            day = start + datetime.timedelta(days=i // habits % per_habit)
+            yield (
+                i % habits + 1,
+                f"{day} 08:00:00",
+                day.isoformat(),
+                periods.iso_week_key(day),
+                periods.day_ordinal(day),
+                periods.iso_week_ordinal(day),
+            )
+
+    conn.executemany(
+        "INSERT INTO completions (habit_id, completed_at, local_date, iso_week, "
+        "day_ordinal, iso_week_ordinal) VALUES (?, ?, ?, ?, ?, ?)",
+        completions(),
+    )
+    conn.commit()
+    conn.close()
+
+
+def default_habits(service: AnalyticsService) -> pd.DataFrame:
+    df = pd.read_sql(
+        service.db.query(Habit).statement, service.db.bind, parse_dates=["created_at"]
+    )
+    return df.assign(
+        periodicity=lambda d: d["periodicity"].map(lambda x: getattr(x, "name", str(x)))
+    )
+
+
+def default_counts(service: AnalyticsService) -> pd.DataFrame:
+    df = pd.read_sql(service._counts_statement(), service.db.bind)
+    ordinals = df.pop("day_ordinal")
+    df.insert(1, "local_date", pd.to_datetime(ordinals - EPOCH_ORDINAL, unit="D"))
+    return df.astype({"habit_id": "int64", "completed": "int64"})
+
+
+def measure(read) -> tuple[float, float]:
+    started = time.perf_counter()
+    df = read()
+    elapsed = time.perf_counter() - started
+    return df.memory_usage(deep=True).sum() / len(df) * 1e6 / 2**20, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--habits", type=int, default=1_000_000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "benchmark.db"
+        build(path, args.habits, args.rows)
+        engine = create_database_engine(f"sqlite:///{path}")
+        with sessionmaker(bind=engine)() as db_session:
+            service = AnalyticsService(db_session)
+            frames = {
+                "habits": (lambda: default_habits(service), service._habits_df),
+                "counts": (
+                    lambda: default_counts(service),
+                    service._completion_counts,
+                ),
+            }
+            print(f"{'frame':8} {'dtypes':8} {'MB per 1M rows':>15} {'read s':>7}")
+            for frame, reads in frames.items():
+                for dtypes, read in zip(("default", "compact"), reads):
+                    mb, seconds = measure(read)
+                    print(f"{frame:8} {dtypes:8} {mb:15.1f} {seconds:7.2f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
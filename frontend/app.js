@@ -3,6 +3,7 @@ class HabitTracker {
         this.baseUrl = '/api';
         this.currentTab = 'dashboard';
         this.habits = [];
+        this.liveUpdates = false;
         this.init();
     }
 
@@ -16,6 +17,64 @@ class HabitTracker {
 
         this.habitForm.addEventListener('submit', this.handleSubmit.bind(this));
         this.loadHabits();
+        this.initEvents();
+    }
+
+    initEvents() {
+        if (!window.EventSource) return;
+
+        // Server-sent deltas let us patch local state after every change
+        // instead of re-downloading the whole habit list.
+        const events = new EventSource(`${this.baseUrl}/events`);
+        let connectedBefore = false;
+
+        events.addEventListener('open', () => {
+            // Deltas published while we were disconnected are lost
+            if (connectedBefore) this.loadHabits();
+            connectedBefore = true;
+            this.liveUpdates = true;
+        });
+        events.addEventListener('error', () => {
+            this.liveUpdates = false;
+        });
+
+        const handlers = {
+            habit_created: habit => {
+                this.habits.push({ ...habit, currentStreak: 0, isCompleted: false });
+            },
+            habit_updated: async habit => {
+                const existing = this.habits.find(h => h.id === habit.id);
+                if (!existing) return;
+                const periodicityChanged = existing.periodicity !== habit.periodicity;
+                Object.assign(existing, habit);
+                if (periodicityChanged) {
+                    // The current period changed, so status and streak did too
+                    const [streaks, status] = await Promise.all([
+                        this.getHabitStreaks(habit.id),
+                        this.getHabitCompletionStatus(habit.id)
+                    ]);
+                    existing.currentStreak = streaks.current_streak;
+                    existing.isCompleted = status.completed;
+                }
+            },
+            habit_deleted: ({ id }) => {
+                this.habits = this.habits.filter(h => h.id !== id);
+            },
+            completion_added: completion => {
+                const habit = this.habits.find(h => h.id === completion.habit_id);
+                if (!habit) return;
+                habit.isCompleted = completion.completed;
+                habit.currentStreak = completion.current_streak;
+            },
+            resync: () => this.loadHabits()
+        };
+
+        Object.entries(handlers).forEach(([type, handler]) => {
+            events.addEventListener(type, async e => {
+                await handler(JSON.parse(e.data));
+                if (type !== 'resync') this.renderHabitList();
+            });
+        });
     }
 
     initEditModal() {
@@ -119,7 +178,7 @@ class HabitTracker {
             nameInput.value = '';
             periodicitySelect.value = '';
             this.showMessage('Habit added successfully!', 'success');
-            this.loadHabits();
+            if (!this.liveUpdates) this.loadHabits();
         } catch (error) {
             this.showMessage('Error adding habit', 'error');
         }
@@ -136,38 +195,37 @@ class HabitTracker {
         return response.json();
     }
 
+    async loadDashboard() {
+        const response = await fetch(`${this.baseUrl}/dashboard`);
+        if (!response.ok) throw new Error('Failed to load dashboard');
+        return response.json();
+    }
+
     async loadHabits() {
         try {
-            const response = await fetch(`${this.baseUrl}/habits`);
-            if (!response.ok) throw new Error('Failed to load habits');
-
-            const habits = await response.json();
-            this.renderHabits(habits);
+            const dashboard = await this.loadDashboard();
+            this.renderHabits(dashboard.habits);
         } catch (error) {
             this.habitsContainer.innerHTML = '<p class="error">Failed to load habits</p>';
         }
     }
 
-    async renderHabits(habits) {
-        this.habits = habits;
-        if (habits.length === 0) {
+    renderHabits(habits) {
+        this.habits = habits.map(habit => ({
+            ...habit,
+            currentStreak: habit.current_streak,
+            isCompleted: habit.completed
+        }));
+        this.renderHabitList();
+    }
+
+    renderHabitList() {
+        if (this.habits.length === 0) {
             this.habitsContainer.innerHTML = '<p class="loading">No habits yet. Add your first habit above!</p>';
             return;
         }
 
-        const habitsWithData = await Promise.all(habits.map(async habit => {
-            const [streaks, completionStatus] = await Promise.all([
-                this.getHabitStreaks(habit.id),
-                this.getHabitCompletionStatus(habit.id)
-            ]);
-            return {
-                ...habit,
-                currentStreak: streaks.current_streak,
-                isCompleted: completionStatus.completed
-            };
-        }));
-
-        this.habitsContainer.innerHTML = habitsWithData.map(habit => `
+        this.habitsContainer.innerHTML = this.habits.map(habit => `
             <div class="habit-item ${habit.isCompleted ? 'completed' : ''}">
                 <div class="habit-info">
                     <h3>${this.escapeHtml(habit.name)}</h3>
@@ -196,7 +254,7 @@ class HabitTracker {
 
             if (!response.ok) throw new Error('Failed to complete habit');
             this.showMessage('Habit completed!', 'success');
-            this.loadHabits(); // Refresh the habits list to update UI
+            if (!this.liveUpdates) this.loadHabits(); // Refresh the habits list to update UI
         } catch (error) {
             this.showMessage('Error completing habit', 'error');
         }
@@ -212,7 +270,7 @@ class HabitTracker {
 
             if (!response.ok) throw new Error('Failed to delete habit');
             this.showMessage('Habit deleted', 'success');
-            this.loadHabits();
+            if (!this.liveUpdates) this.loadHabits();
         } catch (error) {
             this.showMessage('Error deleting habit', 'error');
         }
@@ -242,90 +300,67 @@ class HabitTracker {
 
     async getHabitCompletionStatus(habitId) {
         try {
-            const response = await fetch(`${this.baseUrl}/habits/${habitId}/completed`);
-            return response.ok ? await response.json() : { completed: false };
+            const response = await fetch(`${this.baseUrl}/habits/completed-status?ids=${habitId}`);
+            const status = response.ok ? await response.json() : {};
+            return { completed: status[habitId] === true };
         } catch {
             return { completed: false };
         }
     }
 
     async loadAnalytics() {
-        await Promise.all([
-            this.loadSummaryCards(),
-            this.loadCompletionChart(),
-            this.loadStruggledHabitsFromPreferences(),
-            this.loadDayAnalysis()
-        ]);
-    }
-
-    async loadStruggledHabitsFromPreferences() {
-        // Use stored preferences (API will handle defaults)
-        try {
-            const struggled = await fetch(`${this.baseUrl}/analytics/habits/struggled`).then(r => r.json());
-            this.renderStruggledHabits(struggled);
-        } catch (error) {
-            document.getElementById('struggled-habits').innerHTML = '<div class="insights-section"><h3>Struggled Habits</h3><p class="error">Failed to load data</p></div>';
-        }
-    }
-
-    async loadSummaryCards() {
         try {
-            const [habits, completionRates] = await Promise.all([
-                fetch(`${this.baseUrl}/habits`).then(r => r.json()),
-                fetch(`${this.baseUrl}/analytics/habits/completion-rates`).then(r => r.json())
-            ]);
-
-            const totalHabits = habits.length;
-            const avgCompletion = completionRates.length > 0
-                ? Math.round(completionRates.reduce((sum, h) => sum + h.completion_rate, 0) / completionRates.length * 100)
-                : 0;
-
-            const allStreaks = await Promise.all(habits.map(h => this.getHabitStreaks(h.id)));
-            const longestStreak = Math.max(...allStreaks.map(s => s.longest_streak), 0);
-
-            document.getElementById('summary-cards').innerHTML = `
-                <div class="summary-card">
-                    <div class="card-value">${totalHabits}</div>
-                    <div class="card-label">Total Habits</div>
-                </div>
-                <div class="summary-card">
-                    <div class="card-value">${avgCompletion}%</div>
-                    <div class="card-label">Avg Completion</div>
-                </div>
-                <div class="summary-card">
-                    <div class="card-value">${longestStreak}</div>
-                    <div class="card-label">Longest Streak</div>
-                </div>
-            `;
+            const dashboard = await this.loadDashboard();
+            this.renderHabits(dashboard.habits);
+            this.renderSummaryCards(dashboard.summary);
+            this.renderCompletionChart(dashboard.habits);
+            this.renderStruggledHabits(dashboard.struggled);
+            this.renderDayAnalysis(dashboard.habits);
         } catch {
             document.getElementById('summary-cards').innerHTML = '<p class="error">Failed to load summary</p>';
+            document.getElementById('completion-chart').innerHTML = '<p class="error">Failed to load chart</p>';
+            document.getElementById('struggled-habits').innerHTML = '<div class="insights-section"><h3>Struggled Habits</h3><p class="error">Failed to load data</p></div>';
+            document.getElementById('day-analysis').innerHTML = '<div class="insights-section"><h3>Day Analysis</h3><p class="error">Failed to load data</p></div>';
         }
     }
 
-    async loadCompletionChart() {
-        try {
-            const rates = await fetch(`${this.baseUrl}/analytics/habits/completion-rates`).then(r => r.json());
+    renderSummaryCards(summary) {
+        const avgCompletion = Math.round(summary.average_completion_rate * 100);
 
-            if (rates.length === 0) {
-                document.getElementById('completion-chart').innerHTML = '<p class="loading">No data available</p>';
-                return;
-            }
+        document.getElementById('summary-cards').innerHTML = `
+            <div class="summary-card">
+                <div class="card-value">${summary.total_habits}</div>
+                <div class="card-label">Total Habits</div>
+            </div>
+            <div class="summary-card">
+                <div class="card-value">${avgCompletion}%</div>
+                <div class="card-label">Avg Completion</div>
+            </div>
+            <div class="summary-card">
+                <div class="card-value">${summary.longest_streak}</div>
+                <div class="card-label">Longest Streak</div>
+            </div>
+        `;
+    }
 
-            document.getElementById('completion-chart').innerHTML = rates.map(habit => {
-                const percentage = Math.round(habit.completion_rate * 100);
-                return `
-                    <div class="chart-bar">
-                        <div class="chart-label">${this.escapeHtml(habit.name)}</div>
-                        <div class="chart-progress">
-                            <div class="chart-fill" style="width: ${percentage}%"></div>
-                        </div>
-                        <div class="chart-value">${percentage}%</div>
-                    </div>
-                `;
-            }).join('');
-        } catch {
-            document.getElementById('completion-chart').innerHTML = '<p class="error">Failed to load chart</p>';
+    renderCompletionChart(rates) {
+        if (rates.length === 0) {
+            document.getElementById('completion-chart').innerHTML = '<p class="loading">No data available</p>';
+            return;
         }
+
+        document.getElementById('completion-chart').innerHTML = rates.map(habit => {
+            const percentage = Math.round(habit.completion_rate * 100);
+            return `
+                <div class="chart-bar">
+                    <div class="chart-label">${this.escapeHtml(habit.name)}</div>
+                    <div class="chart-progress">
+                        <div class="chart-fill" style="width: ${percentage}%"></div>
+                    </div>
+                    <div class="chart-value">${percentage}%</div>
+                </div>
+            `;
+        }).join('');
     }
 
     async loadStruggledHabits(threshold, quartile) {
@@ -357,37 +392,26 @@ class HabitTracker {
         `;
     }
 
-    async loadDayAnalysis() {
-        try {
-            const weeklyHabits = this.habits.filter(h => h.periodicity === 'weekly');
-            if (weeklyHabits.length === 0) {
-                document.getElementById('day-analysis').innerHTML = '<div class="insights-section"><h3>Day Analysis</h3><p>No weekly habits found</p></div>';
-                return;
-            }
+    renderDayAnalysis(habits) {
+        const weeklyHabits = habits.filter(h => h.periodicity === 'weekly');
+        if (weeklyHabits.length === 0) {
+            document.getElementById('day-analysis').innerHTML = '<div class="insights-section"><h3>Day Analysis</h3><p>No weekly habits found</p></div>';
+            return;
+        }
 
-            const analyses = await Promise.all(
-                weeklyHabits.map(async habit => {
-                    const analysis = await fetch(`${this.baseUrl}/analytics/habits/${habit.id}/best-worst-day`).then(r => r.json());
-                    return { ...habit, ...analysis };
-                })
-            );
-
-            document.getElementById('day-analysis').innerHTML = `
-                <div class="insights-section">
-                    <h3>Best & Worst Days (Weekly Habits)</h3>
-                    ${analyses.map(habit => `
-                        <div class="day-item">
-                            <div>
-                                <strong>${this.escapeHtml(habit.name)}</strong><br>
-                                <small>Best: ${habit.best_day || 'N/A'} | Worst: ${habit.worst_day || 'N/A'}</small>
-                            </div>
+        document.getElementById('day-analysis').innerHTML = `
+            <div class="insights-section">
+                <h3>Best & Worst Days (Weekly Habits)</h3>
+                ${weeklyHabits.map(habit => `
+                    <div class="day-item">
+                        <div>
+                            <strong>${this.escapeHtml(habit.name)}</strong><br>
+                            <small>Best: ${habit.best_day || 'N/A'} | Worst: ${habit.worst_day || 'N/A'}</small>
                         </div>
-                    `).join('')}
-                </div>
-            `;
-        } catch {
-            document.getElementById('day-analysis').innerHTML = '<div class="insights-section"><h3>Day Analysis</h3><p class="error">Failed to load data</p></div>';
-        }
+                    </div>
+                `).join('')}
+            </div>
+        `;
     }
 
     editHabit(id) {
@@ -413,7 +437,7 @@ class HabitTracker {
             await this.updateHabit(id, name, periodicity);
             this.editModal.classList.remove('active');
             this.showMessage('Habit updated successfully!', 'success');
-            this.loadHabits();
+            if (!this.liveUpdates) this.loadHabits();
         } catch (error) {
             this.showMessage('Error updating habit', 'error');
         }
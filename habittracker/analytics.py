@@ -1,91 +1,467 @@
+import datetime
+import math
+import os
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 import pandas as pd
-from sqlalchemy.orm import Session
+from sqlalchemy import String, func, select, type_coerce, union_all
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import archive, models, periods, timeseries
+from .completion_index import completion_index
+from .database import create_database_engine, is_shared
+from .singleflight import coalesce
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+# A Monday, so whole weeks counted from it line up with ISO weeks.
+EPOCH_MONDAY = pd.Timestamp("1970-01-05")
+
+# ``periods.day_ordinal`` of the Unix epoch, to turn ordinals into timestamps.
+EPOCH_ORDINAL = periods.day_ordinal(datetime.date(1970, 1, 1))
+
+# Bucket sizes accepted by the ``granularity`` analytics parameter
+GRANULARITIES = ("day", "week", "month")
+
+# The bucket matching each habit periodicity
+PERIOD_UNITS = {"DAILY": "day", "WEEKLY": "week"}
+
+# Days per period of each habit periodicity
+PERIOD_DAYS = {"DAILY": 1, "WEEKLY": 7}
+
+# Compact dtypes analytics frames are read with: habit ids fit 32 bits,
+# periodicity is one of two names, and nothing needs sub-second times.
+ID_DTYPE = "int32"
+PERIODICITY_DTYPE = pd.CategoricalDtype([p.name for p in models.Periodicity])
+TIMESTAMP_DTYPE = "datetime64[s]"
+HABIT_DTYPES = {
+    "id": ID_DTYPE,
+    "periodicity": PERIODICITY_DTYPE,
+    "created_at": TIMESTAMP_DTYPE,
+}
+COUNT_DTYPES = {"habit_id": ID_DTYPE, "completed": "int32"}
+
+# Worker processes for batch analytics; defaults to one per CPU.
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "0")) or os.cpu_count() or 1
+
+# Memory one analytics call may spend on completion rows. Per-day counts are
+# streamed from the database in chunks sized to stay inside it.
+ANALYTICS_MEMORY_BUDGET_MB = int(os.getenv("ANALYTICS_MEMORY_BUDGET_MB", "256"))
+
+# Peak working memory per streamed count row: the row plus the frames merged,
+# sorted and grouped from it while a chunk is analysed.
+COUNT_ROW_BYTES = 1024
+
+# Below this, per-chunk overhead outweighs the memory saved.
+MIN_CHUNK_ROWS = 1_000
+
+# Habits per chunk of a ``habit_report``; each chunk is computed, handed on
+# and dropped before the next is waited for.
+REPORT_CHUNK_HABITS = 10_000
+
+# Columns of a ``habit_report`` and their dtypes, fixed so every chunk has the
+# same schema whatever values it happens to hold.
+REPORT_DTYPES = {
+    "habit_id": ID_DTYPE,
+    "user_id": "Int32",
+    "name": "string",
+    "periodicity": "string",
+    "created_at": TIMESTAMP_DTYPE,
+    "completed_this_period": "bool",
+    "completion_rate": "float64",
+    "window_completed": "int64",
+    "window_expected": "float64",
+    "window_completion_rate": "float64",
+    "current_streak": "int64",
+    "longest_streak": "int64",
+    "last_completed": TIMESTAMP_DTYPE,
+    "best_day": "string",
+    "worst_day": "string",
+}
+
+# Sessions of a batch analytics worker process, bound to its own engine.
+_worker_sessions = None
+
+
+def _init_worker(db_url: str):
+    """Give a batch analytics worker process its own engine."""
+    global _worker_sessions
+    _worker_sessions = sessionmaker(bind=create_database_engine(db_url))
+
+
+def _analytics_chunk(
+    user_id: int | None, habit_ids: list[int], today: datetime.date
+) -> pd.DataFrame:
+    """Compute one chunk of ``batch_habit_analytics`` in a worker process."""
+    with _worker_sessions() as db_session:
+        service = AnalyticsService(db_session, user_id)
+        return service._habit_analytics_for(habit_ids, today)
+
+
+def _report_chunk(
+    user_id: int | None,
+    habit_ids: list[int],
+    now: pd.Timestamp,
+    today: datetime.date,
+) -> pd.DataFrame:
+    """Compute one chunk of ``habit_report`` in a worker process."""
+    with _worker_sessions() as db_session:
+        service = AnalyticsService(db_session, user_id)
+        habits = service._habits_df(habit_ids)
+        return _concat(
+            [
+                service._report_rows(chunk, counts, now, today)
+                for chunk, counts in service._counts_by_habit(
+                    service._analysis_windows(habits, now), habit_ids=habit_ids
+                )
+            ]
+        )
+
 
-from . import models
+def chunk_rows() -> int:
+    """Count rows streamed per chunk under ``ANALYTICS_MEMORY_BUDGET_MB``."""
+    budget = ANALYTICS_MEMORY_BUDGET_MB * 2**20
+    return max(MIN_CHUNK_ROWS, budget // COUNT_ROW_BYTES)
+
+
+def _concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Join per-chunk results, skipping the empty ones so they cannot change
+    the result's dtypes; all empty gives the first."""
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
 
 
 class AnalyticsService:
     """Provides analytical insights into user habits using pandas."""
 
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, user_id: int | None = None):
         self.db = db_session
+        self.user_id = user_id
+
+    def _habits_query(self):
+        query = self.db.query(models.Habit)
+        if self.user_id is not None:
+            query = query.filter(models.Habit.user_id == self.user_id)
+        return query
 
-    def _habits_df(self) -> pd.DataFrame:
-        df = pd.read_sql(
-            self.db.query(models.Habit).statement,
-            self.db.bind,
-            parse_dates=["created_at"],
+    def _get_habit(self, habit_id: int):
+        return self._habits_query().filter(models.Habit.id == habit_id).first()
+
+    def _timezone(self) -> str:
+        tz_name = (
+            self.db.query(models.UserPreferences.timezone)
+            .filter(models.UserPreferences.user_id == self.user_id)
+            .scalar()
         )
-        return df.assign(
-            periodicity=lambda d: d["periodicity"].map(
-                lambda x: getattr(x, "name", str(x))
+        return tz_name or periods.DEFAULT_TIMEZONE
+
+    def _local_date(self, today) -> datetime.date:
+        """Resolve ``today`` to a date in the user's timezone.
+
+        Naive values are taken to already be local dates; ``None`` means now.
+        """
+        if today is None:
+            return periods.local_today(self._timezone())
+        today = pd.Timestamp(today)
+        if today.tzinfo is not None:
+            return periods.local_date(today.to_pydatetime(), self._timezone())
+        return today.date()
+
+    def _window_end(self, today, end: datetime.date | None) -> pd.Timestamp:
+        """The moment an analysis runs up to: now (or ``today``), or the last
+        instant of the ``end`` day when that is earlier."""
+        now = today or pd.Timestamp.utcnow().tz_localize(None)
+        if end is None:
+            return now
+        return min(now, pd.Timestamp(end) + pd.Timedelta(days=1, microseconds=-1))
+
+    def _completion_rows(self, since=None, until=None, habit_ids=None):
+        """Habit, local date and day and ISO week ordinals of the completions
+        in a window, as a subquery over the hot table and any archive years
+        the window reaches.
+
+        ``since`` and ``until`` bound the local dates, both inclusive.
+        """
+        tables = [models.Completion.__table__]
+        tables += archive.archive_tables(self.db, since, until)
+        selects = []
+        for table in tables:
+            stmt = select(
+                table.c.habit_id,
+                table.c.local_date,
+                table.c.day_ordinal,
+                table.c.iso_week_ordinal,
             )
+            if self.user_id is not None:
+                stmt = stmt.where(table.c.user_id == self.user_id)
+            if since is not None:
+                stmt = stmt.where(table.c.day_ordinal >= periods.day_ordinal(since))
+            if until is not None:
+                stmt = stmt.where(table.c.day_ordinal <= periods.day_ordinal(until))
+            if habit_ids is not None:
+                stmt = stmt.where(table.c.habit_id.in_(habit_ids))
+            selects.append(stmt)
+        if len(selects) == 1:
+            return selects[0].subquery()
+        return union_all(*selects).subquery()
+
+    def _completion_counts(
+        self, since=None, habit_ids=None, until=None
+    ) -> pd.DataFrame:
+        """Completions per habit and local day, grouped in SQL.
+
+        ``since`` and ``until`` bound the local dates, both inclusive.
+        """
+        stmt = self._counts_statement(since, until, habit_ids)
+        df = pd.read_sql(stmt, self.db.bind, dtype=COUNT_DTYPES)
+        return self._parse_counts(df)
+
+    def _counts_statement(self, since=None, until=None, habit_ids=None):
+        rows = self._completion_rows(since, until, habit_ids)
+        return (
+            select(rows.c.habit_id, rows.c.day_ordinal, func.count().label("completed"))
+            .group_by(rows.c.habit_id, rows.c.day_ordinal)
+            .order_by(rows.c.habit_id, rows.c.day_ordinal)
         )
 
-    def _completions_df(self) -> pd.DataFrame:
-        return pd.read_sql(
-            self.db.query(models.Completion).statement,
-            self.db.bind,
-            parse_dates=["completed_at"],
+    def _parse_counts(self, df: pd.DataFrame) -> pd.DataFrame:
+        local_dates = self._ordinal_dates(df.pop("day_ordinal"))
+        df.insert(1, "local_date", local_dates)
+        return df
+
+    def _counts_by_habit(
+        self, habits: pd.DataFrame, since=None, until=None, habit_ids=None
+    ):
+        """``_stream_by_habit`` over the per-day completion counts."""
+        stmt = self._counts_statement(since, until, habit_ids)
+        return self._stream_by_habit(habits, stmt, self._parse_counts, COUNT_DTYPES)
+
+    def _stream_by_habit(self, habits: pd.DataFrame, stmt, parse, dtype):
+        """Yield ``habits`` in id order a chunk at a time, each with the rows of
+        ``stmt`` (ordered by habit) that belong to it, read with ``dtype``
+        and then passed through ``parse``.
+
+        Rows are read ``chunk_rows()`` at a time and a habit's rows are never
+        split, so per-habit results computed chunk by chunk match those of a
+        single pass. Habits without rows come in the chunk covering their id.
+        """
+        size = chunk_rows()
+        habits = habits.sort_values("id")
+        ids = habits["id"].to_numpy()
+        first, rows = 0, None
+        for chunk in pd.read_sql(stmt, self.db.bind, chunksize=size, dtype=dtype):
+            done = len(chunk) < size
+            rows = (
+                parse(chunk)
+                if rows is None
+                else pd.concat([rows, parse(chunk)], ignore_index=True)
+            )
+            if done:
+                break
+            # The last habit's rows may go on in the next chunk
+            last = rows["habit_id"].iat[-1]
+            held = (rows["habit_id"] == last).to_numpy()
+            end = int(np.searchsorted(ids, last))
+            if end > first or not held.all():
+                yield habits.iloc[first:end], rows[~held]
+            first, rows = end, rows[held]
+        yield habits.iloc[first:], rows
+
+    @staticmethod
+    def _ordinal_dates(ordinals: pd.Series) -> pd.Series:
+        """Timestamps of the days numbered by ``periods.day_ordinal``."""
+        days = (ordinals.to_numpy("int64") - EPOCH_ORDINAL).astype("datetime64[D]")
+        return pd.Series(days.astype(TIMESTAMP_DTYPE), index=ordinals.index)
+
+    def _completion_totals(self) -> pd.DataFrame:
+        """All-time completions per habit: the hot table counted live plus the
+        monthly rollups of archived completions, so no archive is read."""
+        hot = select(
+            models.Completion.habit_id, func.count().label("completed")
+        ).group_by(models.Completion.habit_id)
+        archived = select(
+            models.CompletionRollup.habit_id,
+            func.sum(models.CompletionRollup.completed).label("completed"),
+        ).group_by(models.CompletionRollup.habit_id)
+        if self.user_id is not None:
+            hot = hot.where(models.Completion.user_id == self.user_id)
+            archived = archived.where(models.CompletionRollup.user_id == self.user_id)
+        both = union_all(hot, archived).subquery()
+        stmt = select(
+            both.c.habit_id, func.sum(both.c.completed).label("completed")
+        ).group_by(both.c.habit_id)
+        return pd.read_sql(stmt, self.db.bind, dtype=COUNT_DTYPES)
+
+    def _habits_df(self, habit_ids: list[int] | None = None) -> pd.DataFrame:
+        query = self._habits_query().with_entities(
+            models.Habit.id,
+            models.Habit.name,
+            # The stored enum name, read straight into categories
+            type_coerce(models.Habit.periodicity, String).label("periodicity"),
+            models.Habit.created_at,
+            models.Habit.user_id,
         )
+        if habit_ids is not None:
+            query = query.filter(models.Habit.id.in_(habit_ids))
+        return pd.read_sql(query.statement, self.db.bind, dtype=HABIT_DTYPES)
+
+    @staticmethod
+    def _period_index(local_dates: pd.Series, units: pd.Series) -> pd.Series:
+        """Number periods so that consecutive days, ISO weeks or months differ
+        by one. ``units`` holds each row's bucket from ``GRANULARITIES``."""
+        days = (local_dates - EPOCH_MONDAY).dt.days
+        months = local_dates.dt.year * 12 + local_dates.dt.month
+        return days.where(units == "day", days // 7).where(units != "month", months)
+
+    @staticmethod
+    def _today_index(today: datetime.date, units: pd.Series) -> np.ndarray:
+        """The period index of ``today`` for each row's bucket."""
+        days = (pd.Timestamp(today) - EPOCH_MONDAY).days
+        months = today.year * 12 + today.month
+        return np.select([units == "day", units == "week"], [days, days // 7], months)
 
     def list_habits(self, periodicity: str | None = None) -> pd.DataFrame:
         """Return all habits or filter by periodicity."""
         df = self._habits_df()
         return df if not periodicity else df[df["periodicity"] == periodicity.upper()]
 
+    def _streaks_frame(
+        self,
+        habits: pd.DataFrame,
+        counts: pd.DataFrame,
+        today: datetime.date,
+        granularity: str | None = None,
+    ) -> pd.DataFrame:
+        """Longest and current streak for every habit with completions.
+
+        Streaks are counted in each habit's own period unless ``granularity``
+        names a bucket from ``GRANULARITIES`` to count in instead.
+        """
+        df = counts.merge(
+            habits[["id", "periodicity"]], left_on="habit_id", right_on="id"
+        )
+        if df.empty:
+            return pd.DataFrame(
+                columns=["habit_id", "longest_streak", "current_streak"], dtype="int64"
+            )
+
+        df["unit"] = granularity or df["periodicity"].map(PERIOD_UNITS)
+        df["index"] = self._period_index(df["local_date"], df["unit"])
+        df = df.drop_duplicates(["habit_id", "index"]).sort_values(
+            ["habit_id", "index"]
+        )
+        # A new streak starts wherever consecutive periods are not adjacent
+        df["streak_id"] = df.groupby("habit_id")["index"].diff().ne(1).cumsum()
+        runs = (
+            df.groupby(["habit_id", "streak_id"])
+            .agg(
+                length=("index", "size"),
+                last=("index", "max"),
+                unit=("unit", "first"),
+            )
+            .reset_index()
+        )
+
+        latest = runs.groupby("habit_id").tail(1).set_index("habit_id")
+        today_index = self._today_index(today, latest["unit"])
+        current = latest["length"].where(today_index - latest["last"] <= 1, 0)
+        return pd.DataFrame(
+            {
+                "longest_streak": runs.groupby("habit_id")["length"].max(),
+                "current_streak": current,
+            }
+        ).reset_index()
+
     def calculate_streaks(
-        self, habit_id: int, today: pd.Timestamp | None = None
+        self,
+        habit_id: int,
+        today: pd.Timestamp | None = None,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        granularity: str | None = None,
     ) -> dict:
-        """Calculate longest and current streak for a habit."""
-        habit = self.db.query(models.Habit).filter(models.Habit.id == habit_id).first()
+        """Calculate longest and current streak for a habit.
+
+        ``start`` and ``end`` limit the completions considered, with the
+        current streak measured as of ``end``; ``granularity`` overrides the
+        habit's periodicity as the streak unit.
+        """
+        habit = self._get_habit(habit_id)
         if not habit:
             return {"longest_streak": 0, "current_streak": 0}
 
-        period = 1 if habit.periodicity == models.Periodicity.DAILY else 7
-        df = pd.read_sql(
-            self.db.query(models.Completion)
-            .filter(models.Completion.habit_id == habit_id)
-            .order_by(models.Completion.completed_at)
-            .statement,
-            self.db.bind,
-            parse_dates=["completed_at"],
+        habits = pd.DataFrame(
+            {"id": [habit.id], "periodicity": [habit.periodicity.name]}
         )
-        if df.empty:
+        local_today = self._local_date(today)
+        if end is not None:
+            local_today = min(local_today, end)
+        if start is None and end is None and granularity is None:
+            cached = completion_index.streaks(habit.id, habit.periodicity, local_today)
+            if cached is not None:
+                return cached
+        streaks = self._streaks_frame(
+            habits,
+            self._completion_counts(since=start, until=end, habit_ids=[habit_id]),
+            local_today,
+            granularity,
+        )
+        if streaks.empty:
             return {"longest_streak": 0, "current_streak": 0}
+        return {
+            "longest_streak": int(streaks["longest_streak"].iloc[0]),
+            "current_streak": int(streaks["current_streak"].iloc[0]),
+        }
 
-        df = df.sort_values("completed_at")
-        df["gap"] = df["completed_at"].diff().dt.days.fillna(0).gt(period)
-        df["streak_id"] = df["gap"].cumsum()
-        streaks = df.groupby("streak_id").size()
-        longest = int(streaks.max())
-
-        if today is None:
-            today = pd.Timestamp.utcnow()
-        if not isinstance(today, pd.Timestamp):
-            today = pd.Timestamp(today)
-        if today.tzinfo is not None and today.tzinfo.utcoffset(today) is not None:
-            today = today.tz_convert(None)
-        last_date = df["completed_at"].max()
-        current = int(streaks.iloc[-1]) if (today - last_date).days <= period else 0
-        return {"longest_streak": longest, "current_streak": current}
+    def streak_figures(
+        self, today: pd.Timestamp | None = None, habit_ids: list[int] | None = None
+    ) -> pd.DataFrame:
+        """Longest and current streak and last completed local day for every
+        habit (all, or the given ids) with completions."""
+        local_today = self._local_date(today)
+        frames = []
+        for habits, counts in self._counts_by_habit(
+            self._habits_df(), habit_ids=habit_ids
+        ):
+            streaks = self._streaks_frame(habits, counts, local_today)
+            last = counts.groupby("habit_id")["local_date"].max()
+            frames.append(
+                streaks.merge(
+                    last.rename("last_completed"), left_on="habit_id", right_index=True
+                )
+            )
+        return _concat(frames)
 
-    def identify_struggled_habits(
+    def _analysis_windows(
         self,
-        today: pd.Timestamp | None = None,
-        threshold: float = 0.75,
-        quartile: float = 0.25,
+        habits: pd.DataFrame,
+        today: pd.Timestamp,
+        start: datetime.date | None = None,
     ) -> pd.DataFrame:
-        """Return habits in bottom quartile below the specified threshold."""
-        today = today or pd.Timestamp.utcnow().tz_localize(None)
-
-        habits = self._habits_df()
-        if habits.empty:
-            return pd.DataFrame(columns=["id", "name", "completion_rate"])
-
+        """Attach each habit's individual analysis period for struggle checks."""
+        habits = habits.copy()
         # Calculate individual analysis periods for each habit
-        # Use minimum of 30 days or days since creation (minimum 1 day)
+        # Use minimum of the window (default 30 days) or days since creation
+        # (minimum 1 day)
         max_analysis_days = 30
+        if start is not None:
+            max_analysis_days = max(
+                1, (today.normalize() - pd.Timestamp(start)).days + 1
+            )
         habits["created_date"] = pd.to_datetime(habits["created_at"]).dt.tz_localize(
             None
         )
@@ -99,30 +475,19 @@ class AnalyticsService:
         habits["analysis_start"] = today_start - pd.to_timedelta(
             habits["analysis_days"] - 1, unit="D"
         )
+        return habits
 
-        # Get completions for each habit's individual analysis period
-        all_completions = []
-        for _, habit in habits.iterrows():
-            habit_completions = pd.read_sql(
-                self.db.query(models.Completion)
-                .filter(
-                    models.Completion.habit_id == habit["id"],
-                    models.Completion.completed_at >= habit["analysis_start"],
-                )
-                .statement,
-                self.db.bind,
-                parse_dates=["completed_at"],
-            )
-            if not habit_completions.empty:
-                all_completions.append(habit_completions)
-
-        if all_completions:
-            completions = pd.concat(all_completions, ignore_index=True)
-            counts = (
-                completions.groupby("habit_id").size().rename("completed").reset_index()
-            )
-        else:
-            counts = pd.DataFrame(columns=["habit_id", "completed"])
+    def _window_rates(self, habits: pd.DataFrame, counts: pd.DataFrame) -> pd.DataFrame:
+        """Completions, expected completions and completion rate per habit
+        inside each habit's analysis window."""
+        # Keep only the days inside each habit's individual analysis period
+        daily_counts = counts.merge(
+            habits[["id", "analysis_start"]], left_on="habit_id", right_on="id"
+        )
+        in_window = daily_counts[
+            daily_counts["local_date"] >= daily_counts["analysis_start"]
+        ]
+        counts = in_window.groupby("habit_id")["completed"].sum().reset_index()
 
         merged = (
             habits.merge(counts, left_on="id", right_on="habit_id", how="left")
@@ -130,15 +495,21 @@ class AnalyticsService:
             .infer_objects(copy=False)
         )
 
-        merged["period_days"] = merged["periodicity"].map({"DAILY": 1, "WEEKLY": 7})
+        merged["period_days"] = merged["periodicity"].map(PERIOD_DAYS).astype("int64")
         # Calculate expected completions based on actual analysis period for each habit
         merged["expected"] = merged["analysis_days"] / merged["period_days"]
         merged["completion_rate"] = (
             (merged["completed"] / merged["expected"]).fillna(0).clip(upper=1.0)
         )
+        return merged
 
+    @staticmethod
+    def _struggled_from(
+        rates: pd.DataFrame, threshold: float, quartile: float
+    ) -> pd.DataFrame:
+        """Pick struggling habits given every habit's ``_window_rates``."""
         # Only consider habits below threshold
-        bottom_performers = merged[merged["completion_rate"] < threshold]
+        bottom_performers = rates[rates["completion_rate"] < threshold]
 
         if bottom_performers.empty:
             return pd.DataFrame(columns=["id", "name", "completion_rate"])
@@ -149,24 +520,76 @@ class AnalyticsService:
             ["id", "name", "completion_rate"]
         ]
 
-    def overall_completion_rate(
-        self, today: pd.Timestamp | None = None
+    def window_completion_rates(
+        self, today: pd.Timestamp | None = None, habit_ids: list[int] | None = None
     ) -> pd.DataFrame:
-        """Calculate overall completion rate for each habit."""
-        today = today or pd.Timestamp.utcnow().tz_localize(None)
+        """Completions, expected completions and completion rate per habit over
+        the same analysis windows ``identify_struggled_habits`` uses."""
+        columns = ["id", "user_id", "completed", "expected", "completion_rate"]
+        today = self._window_end(today, None)
         habits = self._habits_df()
-        completions = self._completions_df()
+        if habit_ids is not None:
+            habits = habits[habits["id"].isin(habit_ids)]
+        if habits.empty:
+            return pd.DataFrame(columns=columns)
 
-        counts = (
-            completions.groupby("habit_id").size().rename("completed").reset_index()
+        habits = self._analysis_windows(habits, today)
+        chunks = self._counts_by_habit(
+            habits, since=habits["analysis_start"].min().date(), habit_ids=habit_ids
         )
+        return _concat([self._window_rates(*chunk)[columns] for chunk in chunks])
+
+    @coalesce
+    def identify_struggled_habits(
+        self,
+        today: pd.Timestamp | None = None,
+        threshold: float = 0.75,
+        quartile: float = 0.25,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> pd.DataFrame:
+        """Return habits in bottom quartile below the specified threshold.
+
+        Rates cover the last 30 days, or ``start`` to ``end`` when given.
+        """
+        today = self._window_end(today, end)
+
+        habits = self._habits_df()
+        if habits.empty:
+            return pd.DataFrame(columns=["id", "name", "completion_rate"])
+
+        habits = self._analysis_windows(habits, today, start)
+        # Count completions per local day in one grouped, streamed query
+        chunks = self._counts_by_habit(
+            habits, since=habits["analysis_start"].min().date(), until=end
+        )
+        rates = _concat([self._window_rates(*chunk) for chunk in chunks])
+        return self._struggled_from(rates, threshold, quartile)
+
+    def _completion_rates_from(
+        self,
+        habits: pd.DataFrame,
+        counts: pd.DataFrame,
+        today: pd.Timestamp,
+        start: datetime.date | None = None,
+    ) -> pd.DataFrame:
+        """Overall completion rate per habit given per-day counts, counting
+        expected completions from creation or ``start``, whichever is later."""
+        if habits.empty:
+            return pd.DataFrame(columns=["id", "name", "completion_rate"])
+
+        counts = counts.groupby("habit_id")["completed"].sum().reset_index()
         merged = (
             habits.merge(counts, left_on="id", right_on="habit_id", how="left")
             .fillna({"completed": 0})
             .infer_objects(copy=False)
         )
-        merged["period_days"] = merged["periodicity"].map({"DAILY": 1, "WEEKLY": 7})
-        merged["total_days"] = (today - merged["created_at"]).dt.days
+        merged["period_days"] = merged["periodicity"].map(PERIOD_DAYS).astype("int64")
+        tracked_from = merged["created_at"]
+        if start is not None:
+            tracked_from = tracked_from.clip(lower=pd.Timestamp(start))
+        # Habits created after the window end expect nothing, not a negative count
+        merged["total_days"] = (today - tracked_from).dt.days.clip(lower=0)
         merged["expected"] = (merged["total_days"] / merged["period_days"]).floordiv(1)
         # Avoid division by zero: handle expected=0 case properly
         merged["completion_rate"] = merged.apply(
@@ -183,52 +606,468 @@ class AnalyticsService:
         )
         return merged[["id", "name", "completion_rate"]]
 
-    def best_and_worst_day(self, habit_id: int) -> dict:
-        """Determine best and worst performing days for a weekly habit."""
-        habit = self.db.query(models.Habit).filter(models.Habit.id == habit_id).first()
-        if not habit or habit.periodicity != models.Periodicity.WEEKLY:
-            return {"best_day": None, "worst_day": None}
+    @coalesce
+    def overall_completion_rate(
+        self,
+        today: pd.Timestamp | None = None,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> pd.DataFrame:
+        """Calculate overall completion rate for each habit, optionally only
+        over the local dates ``start`` to ``end``."""
+        habits = self._habits_df()
+        now = self._window_end(today, end)
+        if start is None and end is None:
+            return self._completion_rates_from(habits, self._completion_totals(), now)
+        chunks = self._counts_by_habit(habits, since=start, until=end)
+        return _concat(
+            [self._completion_rates_from(*chunk, now, start) for chunk in chunks]
+        )
 
-        df = pd.read_sql(
-            self.db.query(models.Completion)
-            .filter(models.Completion.habit_id == habit_id)
-            .statement,
-            self.db.bind,
-            parse_dates=["completed_at"],
+    @coalesce
+    def completion_rate_series(
+        self,
+        granularity: str,
+        today: pd.Timestamp | None = None,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> pd.DataFrame:
+        """Completion rate per habit for every day, ISO week or month bucket
+        between ``start`` (default: first habit's creation) and ``end``
+        (default: today), with the bucketing done in SQL."""
+        columns = ["id", "name", "period", "completed", "expected", "completion_rate"]
+        habits = self._habits_df()
+        if habits.empty:
+            return pd.DataFrame(columns=columns)
+
+        end = min(end, self._local_date(today)) if end else self._local_date(today)
+        if start is None:
+            start = habits["created_at"].min().date()
+        if start > end:
+            return pd.DataFrame(columns=columns)
+
+        rows = self._completion_rows(start, end)
+        bucket = self._bucket_column(granularity, rows)
+        stmt = (
+            select(
+                rows.c.habit_id, bucket.label("period"), func.count().label("completed")
+            )
+            .group_by(rows.c.habit_id, bucket)
+            .order_by(rows.c.habit_id)
+        )
+        days = pd.DataFrame({"day": pd.date_range(start, end, freq="D")})
+        days["period"] = self._bucket_labels(days["day"], granularity)
+        # The habits-by-days grid of each chunk stays inside the budget too
+        grid_habits = max(1, chunk_rows() // len(days))
+
+        frames = []
+        for habits, counts in self._stream_by_habit(
+            habits,
+            stmt,
+            lambda df: self._bucket_counts(df, granularity),
+            COUNT_DTYPES,
+        ):
+            for i in range(0, len(habits), grid_habits):
+                part = habits.iloc[i : i + grid_habits]
+                frames.append(self._series_frame(part, counts, days)[columns])
+        return _concat(frames)
+
+    def _bucket_counts(self, counts: pd.DataFrame, granularity: str) -> pd.DataFrame:
+        """Label the buckets of ``completion_rate_series``' grouped counts."""
+        if granularity == "day":
+            counts["period"] = self._ordinal_dates(counts["period"])
+        elif granularity == "week":
+            # Label each week by its Monday, day ordinal 7 * week + 1
+            counts["period"] = self._ordinal_dates(counts["period"] * 7 + 1)
+        if granularity != "month":
+            counts["period"] = self._bucket_labels(counts["period"], granularity)
+        return counts.astype({"period": str})
+
+    @staticmethod
+    def _series_frame(
+        habits: pd.DataFrame, counts: pd.DataFrame, days: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Completion rate per habit and bucket given bucket counts and the
+        labelled days of the series."""
+        # Expected completions: tracked days in each bucket over period length
+        grid = habits[["id", "name", "periodicity", "created_at"]].merge(
+            days, how="cross"
+        )
+        grid = grid[grid["day"] >= grid["created_at"].dt.normalize()]
+        grid["period_days"] = grid["periodicity"].map(PERIOD_DAYS).astype("int64")
+        grid["expected"] = 1 / grid["period_days"]
+        series = (
+            grid.groupby(["id", "name", "period"], sort=True)["expected"]
+            .sum()
+            .reset_index()
+            .merge(
+                counts,
+                left_on=["id", "period"],
+                right_on=["habit_id", "period"],
+                how="left",
+            )
+            .fillna({"completed": 0})
+            .astype({"completed": "int64"})
+        )
+        series["completion_rate"] = (
+            (series["completed"] / series["expected"]).fillna(0).clip(upper=1.0)
         )
+        return series
+
+    @staticmethod
+    def _bucket_column(granularity: str, rows):
+        """SQL expression naming the day, ISO week or month of each row of a
+        ``_completion_rows`` subquery. Days and weeks are ordinals, labelled
+        after grouping."""
+        if granularity == "day":
+            return rows.c.day_ordinal
+        if granularity == "week":
+            return rows.c.iso_week_ordinal
+        if granularity == "month":
+            return func.strftime("%Y-%m", rows.c.local_date)
+        raise ValueError(f"Unknown granularity: {granularity}")
+
+    @staticmethod
+    def _bucket_labels(days: pd.Series, granularity: str) -> pd.Series:
+        """The labels ``_bucket_column`` produces, for a series of days."""
+        if granularity == "day":
+            return days.dt.strftime("%Y-%m-%d")
+        if granularity == "week":
+            iso = days.dt.isocalendar()
+            return iso["year"].astype(str) + "-W" + iso["week"].map("{:02d}".format)
+        return days.dt.strftime("%Y-%m")
+
+    def _best_and_worst_frame(
+        self, habits: pd.DataFrame, counts: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Best and worst weekday for every weekly habit with completions."""
+        weekly_ids = habits.loc[habits["periodicity"] == "WEEKLY", "id"]
+        df = counts[counts["habit_id"].isin(weekly_ids)]
         if df.empty:
-            return {"best_day": None, "worst_day": None}
+            return pd.DataFrame(columns=["best_day", "worst_day"])
 
-        counts = (
-            df["completed_at"]
-            .dt.day_name()
-            .value_counts()
-            .reindex(
-                [
-                    "Monday",
-                    "Tuesday",
-                    "Wednesday",
-                    "Thursday",
-                    "Friday",
-                    "Saturday",
-                    "Sunday",
-                ],
+        table = (
+            df.pivot_table(
+                index="habit_id",
+                columns=df["local_date"].dt.day_name(),
+                values="completed",
+                aggfunc="sum",
                 fill_value=0,
             )
+            .reindex(columns=WEEKDAYS, fill_value=0)
+            .astype("int64")
         )
 
-        best_day = counts.idxmax()
-
         # Only consider days we've actually observed completions on when
         # determining the worst day. If a habit has only been completed on a
         # single weekday, there's no meaningful "worst" day yet.
-        observed_days = counts[counts > 0]
-        worst_day = "N/A"
+        observed = table.where(table > 0)
+        is_lowest = observed.eq(observed.min(axis=1), axis=0)
+        clear_worst = (observed.count(axis=1) > 1) & (is_lowest.sum(axis=1) == 1)
+        return pd.DataFrame(
+            {
+                "best_day": table.idxmax(axis=1),
+                "worst_day": is_lowest.idxmax(axis=1).where(clear_worst, "N/A"),
+            }
+        )
 
-        if observed_days.shape[0] > 1:
-            min_count = observed_days.min()
-            lowest_days = observed_days[observed_days == min_count]
-            if lowest_days.shape[0] == 1:
-                worst_day = lowest_days.index[0]
+    def best_and_worst_day(
+        self,
+        habit_id: int,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> dict:
+        """Determine best and worst performing days for a weekly habit,
+        optionally only over the local dates ``start`` to ``end``."""
+        habit = self._get_habit(habit_id)
+        if not habit or habit.periodicity != models.Periodicity.WEEKLY:
+            return {"best_day": None, "worst_day": None}
 
-        return {"best_day": best_day, "worst_day": worst_day}
+        habits = pd.DataFrame({"id": [habit.id], "periodicity": ["WEEKLY"]})
+        days = self._best_and_worst_frame(
+            habits,
+            self._completion_counts(since=start, until=end, habit_ids=[habit_id]),
+        )
+        if days.empty:
+            return {"best_day": None, "worst_day": None}
+        return days.iloc[0].to_dict()
+
+    def completion_timeseries(
+        self,
+        habit_ids: list[int] | None = None,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        encoding: str = "bitmap",
+    ) -> list[dict]:
+        """Per-day completion history for each habit (all, or the given ids),
+        packed per calendar year with ``timeseries.encode_days``.
+
+        Days are the owner's local dates, optionally bounded by ``start`` and
+        ``end``; history comes from one grouped completions query.
+        """
+        if habit_ids is None:
+            habit_ids = [
+                habit_id
+                for (habit_id,) in self._habits_query()
+                .with_entities(models.Habit.id)
+                .order_by(models.Habit.id)
+            ]
+        years = {habit_id: {} for habit_id in habit_ids}
+        for _, counts in self._counts_by_habit(
+            pd.DataFrame({"id": habit_ids}), since=start, until=end, habit_ids=habit_ids
+        ):
+            counts = counts.assign(
+                year=counts["local_date"].dt.year,
+                day=counts["local_date"].dt.dayofyear - 1,
+            )
+            for (habit_id, year), group in counts.groupby(["habit_id", "year"]):
+                years[habit_id][str(year)] = timeseries.encode_days(
+                    group["day"].to_numpy(), encoding
+                )
+        return [
+            {"habit_id": habit_id, "encoding": encoding, "years": by_year}
+            for habit_id, by_year in years.items()
+        ]
+
+    def _habit_analytics_for(
+        self, habit_ids: list[int], today: datetime.date
+    ) -> pd.DataFrame:
+        """Streaks and best/worst day of the given habits."""
+        frames = []
+        for habits, counts in self._counts_by_habit(
+            self._habits_df(habit_ids), habit_ids=habit_ids
+        ):
+            streaks = self._streaks_frame(habits, counts, today).set_index("habit_id")
+            days = self._best_and_worst_frame(habits, counts)
+            frames.append(habits[["id"]].join(streaks, on="id").join(days, on="id"))
+        frame = _concat(frames).fillna({"longest_streak": 0, "current_streak": 0})
+        frame = frame.astype({"longest_streak": "int64", "current_streak": "int64"})
+        return frame.replace({np.nan: None})
+
+    def batch_habit_analytics(
+        self,
+        today: pd.Timestamp | None = None,
+        workers: int | None = None,
+        chunk_size: int | None = None,
+    ) -> pd.DataFrame:
+        """Streaks and best/worst day for every habit, with habits split into
+        chunks computed in parallel worker processes.
+
+        Each worker opens its own engine on this session's database URL.
+        Sessions other connections cannot see into (in-memory SQLite, or
+        bound to an open outer transaction) and ``workers=1`` are computed
+        serially in this process.
+        """
+        local_today = self._local_date(today)
+        habit_ids = [
+            habit_id
+            for (habit_id,) in self._habits_query()
+            .with_entities(models.Habit.id)
+            .order_by(models.Habit.id)
+        ]
+        workers = workers or ANALYTICS_WORKERS
+        if workers <= 1 or len(habit_ids) < 2 or not is_shared(self.db):
+            return self._habit_analytics_for(habit_ids, local_today)
+
+        # A few chunks per worker keeps them busy when chunks finish unevenly
+        chunk_size = chunk_size or math.ceil(len(habit_ids) / (workers * 4))
+        chunks = [
+            habit_ids[i : i + chunk_size] for i in range(0, len(habit_ids), chunk_size)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            initializer=_init_worker,
+            initargs=(self.db.get_bind().url.render_as_string(hide_password=False),),
+        ) as pool:
+            frames = pool.map(
+                _analytics_chunk, repeat(self.user_id), chunks, repeat(local_today)
+            )
+            return pd.concat(list(frames), ignore_index=True)
+
+    def _report_rows(
+        self,
+        habits: pd.DataFrame,
+        counts: pd.DataFrame,
+        now: pd.Timestamp,
+        today: datetime.date,
+    ) -> pd.DataFrame:
+        """The ``habit_report`` rows of ``habits`` (with their analysis
+        windows attached), given all of their per-day counts."""
+        rates = self._completion_rates_from(habits, counts, now).set_index("id")
+        window = self._window_rates(habits, counts).set_index("id")
+        streaks = self._streaks_frame(habits, counts, today).set_index("habit_id")
+        last = counts.groupby("habit_id")["local_date"].max()
+        days = self._best_and_worst_frame(habits, counts)
+        completed = self._completed_this_period(habits, counts, today)
+
+        ids = habits["id"].to_numpy()
+        frame = pd.DataFrame(
+            {
+                "habit_id": ids,
+                "user_id": habits["user_id"].to_numpy(),
+                "name": habits["name"].to_numpy(),
+                "periodicity": habits["periodicity"].str.lower().to_numpy(),
+                "created_at": habits["created_at"].to_numpy(),
+                "completed_this_period": habits["id"].isin(completed).to_numpy(),
+                "completion_rate": rates["completion_rate"].reindex(ids).to_numpy(),
+                "window_completed": window["completed"].reindex(ids).to_numpy(),
+                "window_expected": window["expected"].reindex(ids).to_numpy(),
+                "window_completion_rate": (
+                    window["completion_rate"].reindex(ids).to_numpy()
+                ),
+                "current_streak": (
+                    streaks["current_streak"].reindex(ids, fill_value=0).to_numpy()
+                ),
+                "longest_streak": (
+                    streaks["longest_streak"].reindex(ids, fill_value=0).to_numpy()
+                ),
+                "last_completed": last.reindex(ids).to_numpy(),
+                "best_day": days["best_day"].reindex(ids).to_numpy(),
+                "worst_day": days["worst_day"].reindex(ids).to_numpy(),
+            }
+        )
+        return frame.astype(REPORT_DTYPES)
+
+    def habit_report(
+        self,
+        today: pd.Timestamp | None = None,
+        workers: int | None = None,
+        chunk_size: int | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Every metric of every habit, one row per habit in id order, as
+        frames of ``REPORT_DTYPES`` yielded a chunk of habits at a time.
+
+        Rows hold the all-time completion rate, the 30-day window rate
+        ``identify_struggled_habits`` uses, streaks, the last completed day,
+        the best and worst weekday and whether the current period is done.
+        Chunks are computed in worker processes as in
+        ``batch_habit_analytics``, at most two per worker ahead of the
+        consumer, so the whole report is never held at once. Serially, the
+        completions are read in a single streamed pass.
+        """
+        now = self._window_end(today, None)
+        local_today = self._local_date(today)
+        habit_ids = [
+            habit_id
+            for (habit_id,) in self._habits_query()
+            .with_entities(models.Habit.id)
+            .order_by(models.Habit.id)
+        ]
+        workers = workers or ANALYTICS_WORKERS
+        if workers <= 1 or len(habit_ids) < 2 or not is_shared(self.db):
+            habits = self._analysis_windows(self._habits_df(), now)
+            for chunk, counts in self._counts_by_habit(habits):
+                yield self._report_rows(chunk, counts, now, local_today)
+            return
+
+        chunk_size = chunk_size or min(
+            REPORT_CHUNK_HABITS, math.ceil(len(habit_ids) / (workers * 4))
+        )
+        chunks = [
+            habit_ids[i : i + chunk_size] for i in range(0, len(habit_ids), chunk_size)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            initializer=_init_worker,
+            initargs=(self.db.get_bind().url.render_as_string(hide_password=False),),
+        ) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(
+                    pool.submit(_report_chunk, self.user_id, chunk, now, local_today)
+                )
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _completed_this_period(
+        self, habits: pd.DataFrame, counts: pd.DataFrame, today: datetime.date
+    ) -> set:
+        """Ids of habits completed today (daily) or this ISO week (weekly)."""
+        df = counts.merge(
+            habits[["id", "periodicity"]], left_on="habit_id", right_on="id"
+        )
+        units = df["periodicity"].map(PERIOD_UNITS)
+        current = self._today_index(today, units)
+        done = self._period_index(df["local_date"], units) == current
+        return set(df.loc[done, "habit_id"].tolist())
+
+    def _dashboard_rows(
+        self,
+        habits: pd.DataFrame,
+        counts: pd.DataFrame,
+        now: pd.Timestamp,
+        today: datetime.date,
+        start: datetime.date | None,
+    ) -> list[dict]:
+        """The dashboard's row for each of ``habits``, given their counts."""
+        rates = self._completion_rates_from(habits, counts, now, start).set_index("id")
+        streaks = self._streaks_frame(habits, counts, today).set_index("habit_id")
+        days = self._best_and_worst_frame(habits, counts)
+        completed = self._completed_this_period(habits, counts, today)
+
+        rows = []
+        for habit in habits.itertuples():
+            has_streak = habit.id in streaks.index
+            has_days = habit.id in days.index
+            rows.append(
+                {
+                    "id": habit.id,
+                    "name": habit.name,
+                    "periodicity": habit.periodicity.lower(),
+                    "created_at": habit.created_at.isoformat(),
+                    "completed": habit.id in completed,
+                    "completion_rate": float(rates.at[habit.id, "completion_rate"]),
+                    "current_streak": (
+                        int(streaks.at[habit.id, "current_streak"]) if has_streak else 0
+                    ),
+                    "longest_streak": (
+                        int(streaks.at[habit.id, "longest_streak"]) if has_streak else 0
+                    ),
+                    "best_day": days.at[habit.id, "best_day"] if has_days else None,
+                    "worst_day": days.at[habit.id, "worst_day"] if has_days else None,
+                }
+            )
+        return rows
+
+    @coalesce
+    def dashboard(
+        self,
+        today: pd.Timestamp | None = None,
+        threshold: float = 0.75,
+        quartile: float = 0.25,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+    ) -> dict:
+        """Everything the dashboard shows, computed from one habits query and
+        one grouped, streamed completions query, optionally limited to
+        ``start``-``end``."""
+        habits = self._habits_df()
+        now = self._window_end(today, end)
+        local_today = self._local_date(today)
+        if end is not None:
+            local_today = min(local_today, end)
+
+        rows, window_rates = [], []
+        for chunk, counts in self._counts_by_habit(
+            self._analysis_windows(habits, now, start), since=start, until=end
+        ):
+            window_rates.append(self._window_rates(chunk, counts))
+            rows += self._dashboard_rows(chunk, counts, now, local_today, start)
+
+        if rows:
+            struggled = self._struggled_from(_concat(window_rates), threshold, quartile)
+        else:
+            struggled = pd.DataFrame(columns=["id", "name", "completion_rate"])
+        return {
+            "habits": rows,
+            "struggled": struggled.to_dict("records"),
+            "summary": {
+                "total_habits": len(rows),
+                "average_completion_rate": (
+                    sum(r["completion_rate"] for r in rows) / len(rows) if rows else 0.0
+                ),
+                "longest_streak": max((r["longest_streak"] for r in rows), default=0),
+            },
+        }
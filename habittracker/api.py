@@ -1,38 +1,106 @@
-from flask import Blueprint, jsonify, request
+import datetime
+import queue
 
-from .analytics import AnalyticsService
+from flask import Blueprint, Response, g, jsonify, request
+
+from . import handlers, profiling
+from .analytics import GRANULARITIES, AnalyticsService
 from .database import get_db
+from .events import KEEPALIVE_SECONDS, broker, format_sse
+from .jobs import JOB_KINDS, job_queue
+from .ranking import RANK_ORDERS, RankingService
 from .serializers import (
-    serialize_completion,
+    serialize_analytics_job,
     serialize_habit,
     serialize_user_preferences,
 )
-from .services import HabitAlreadyCompletedError, HabitService
+from .services import DEFAULT_USERNAME, NO_USER_ID, HabitService
+from .singleflight import analytics_flights
+from .timeseries import ENCODINGS
 
 # Create a Blueprint object to organize routes.
 bp = Blueprint("api", __name__, url_prefix="/api")
 
 
+# Methods that only read, and so never create the requesting user
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def get_current_user_id():
+    """
+    Resolves the user for the current request from the ``X-User`` header.
+    Reads by an unknown username get ``NO_USER_ID``, which owns nothing;
+    only writes create the user. Found users are cached on ``flask.g`` by
+    username.
+    """
+    username = request.headers.get("X-User", "").strip() or DEFAULT_USERNAME
+    user_ids = g.setdefault("user_ids", {})
+    if username not in user_ids:
+        habit_service = HabitService(get_db())
+        if request.method in SAFE_METHODS:
+            user = habit_service.get_user(username)
+            if user is None:
+                return NO_USER_ID
+        else:
+            user = habit_service.get_or_create_user(username)
+        user_ids[username] = user.id
+    return user_ids[username]
+
+
+@bp.before_request
+def start_profiling():
+    """Profile the request when ``?profile=1`` (or ``stats``/``collapsed``)
+    is sent with the profiling token while ``PROFILE_REQUESTS`` is on. The
+    response is then the profile, as plain text, instead of the endpoint's
+    own body."""
+    fmt = request.args.get("profile")
+    if not fmt:
+        return None
+    if not profiling.PROFILE_REQUESTS:
+        return jsonify({"error": "Profiling is disabled"}), 403
+    if not profiling.token_matches(request.headers.get(profiling.TOKEN_HEADER, "")):
+        return jsonify({"error": "Invalid profiling token"}), 403
+    try:
+        g.profiler = profiling.Profiler("stats" if fmt == "1" else fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    g.profiler.start()
+    return None
+
+
+@bp.after_request
+def finish_profiling(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    profiler.stop()
+    return Response(
+        profiler.report(),
+        mimetype="text/plain",
+        headers={"X-Profiled-Status": str(response.status_code)},
+    )
+
+
+@bp.teardown_request
+def stop_profiling(exc):
+    """Stop a profile left running by a request that raised."""
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+
+
 @bp.route("/habits", methods=["GET"])
 def get_habits():
     """Endpoint to get a list of all habits."""
-    db_session = get_db()
-    habit_service = HabitService(db_session)
-    habits = habit_service.get_all_habits()
-    return jsonify([serialize_habit(h) for h in habits])
+    payload, status = handlers.list_habits(get_db(), get_current_user_id())
+    return jsonify(payload), status
 
 
 @bp.route("/habits/<int:habit_id>", methods=["GET"])
 def get_habit(habit_id: int):
     """Endpoint to get a single habit."""
-    db_session = get_db()
-    habit_service = HabitService(db_session)
-    habit = habit_service.get_habit_by_id(habit_id)
-
-    if not habit:
-        return jsonify({"error": "Habit not found"}), 404
-
-    return jsonify(serialize_habit(habit))
+    payload, status = handlers.get_habit(get_db(), get_current_user_id(), habit_id)
+    return jsonify(payload), status
 
 
 @bp.route("/habits", methods=["POST"])
@@ -47,7 +115,7 @@ def create_habit():
         return jsonify({"error": "Habit name cannot be empty"}), 400
 
     db_session = get_db()
-    habit_service = HabitService(db_session)
+    habit_service = HabitService(db_session, get_current_user_id())
 
     try:
         new_habit = habit_service.create_habit(data["name"], data["periodicity"])
@@ -68,7 +136,7 @@ def update_habit(habit_id: int):
         return jsonify({"error": "Habit name cannot be empty"}), 400
 
     db_session = get_db()
-    habit_service = HabitService(db_session)
+    habit_service = HabitService(db_session, get_current_user_id())
 
     try:
         updated_habit = habit_service.update_habit(
@@ -87,7 +155,7 @@ def update_habit(habit_id: int):
 def delete_habit(habit_id: int):
     """Endpoint to delete a habit."""
     db_session = get_db()
-    habit_service = HabitService(db_session)
+    habit_service = HabitService(db_session, get_current_user_id())
     deleted_habit = habit_service.delete_habit(habit_id)
 
     if not deleted_habit:
@@ -99,29 +167,81 @@ def delete_habit(habit_id: int):
 @bp.route("/habits/<int:habit_id>/checkoff", methods=["POST"])
 def check_off_habit(habit_id: int):
     """Endpoint for marking a habit as complete."""
-    db_session = get_db()
-    habit_service = HabitService(db_session)
-    try:
-        completion = habit_service.check_off_habit(habit_id)
-    except HabitAlreadyCompletedError:
-        return (
-            jsonify({"error": "Habit already completed for this period"}),
-            409,
-        )
-
-    if not completion:
-        return jsonify({"error": "Habit not found"}), 404
-
-    return jsonify(serialize_completion(completion)), 201
+    payload, status = handlers.check_off_habit(
+        get_db(), get_current_user_id(), habit_id
+    )
+    return jsonify(payload), status
 
 
 @bp.route("/habits/<int:habit_id>/completed", methods=["GET"])
 def is_habit_completed(habit_id: int):
     """Endpoint to check if a habit is already completed for the current period."""
-    db_session = get_db()
-    habit_service = HabitService(db_session)
-    is_completed = habit_service.is_habit_completed_today(habit_id)
-    return jsonify({"completed": is_completed})
+    payload, status = handlers.is_habit_completed(
+        get_db(), get_current_user_id(), habit_id
+    )
+    return jsonify(payload), status
+
+
+@bp.route("/habits/completed-status", methods=["GET"])
+def get_completion_status():
+    """Endpoint to check which habits are completed for the current period.
+    Accepts an optional comma-separated ``ids`` filter."""
+    payload, status = handlers.completion_status(
+        get_db(), get_current_user_id(), request.args.get("ids")
+    )
+    return jsonify(payload), status
+
+
+@bp.route("/events", methods=["GET"])
+def stream_events():
+    """Endpoint streaming the current user's habit changes as server-sent events."""
+    subscription = broker.subscribe(get_current_user_id())
+
+    # The generator runs after the request context is gone, so it must not
+    # touch the database session.
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = subscription.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _analytics_window(args=None):
+    """
+    Parses the ``from``/``to`` local dates (YYYY-MM-DD, inclusive) and the
+    ``granularity`` shared by the analytics endpoints, from the query string
+    or the given mapping.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    args = request.args if args is None else args
+    bounds = []
+    for name in ("from", "to"):
+        value = args.get(name)
+        try:
+            bounds.append(datetime.date.fromisoformat(value) if value else None)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+    start, end = bounds
+    if start and end and start > end:
+        raise ValueError("from must not be after to")
+
+    granularity = args.get("granularity")
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    return start, end, granularity
 
 
 @bp.route("/analytics/habits", methods=["GET"])
@@ -129,7 +249,7 @@ def get_habits_analytics():
     """Endpoint to get habits analytics with optional periodicity filter."""
     periodicity = request.args.get("periodicity")
     db_session = get_db()
-    analytics_service = AnalyticsService(db_session)
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
     habits_df = analytics_service.list_habits(periodicity)
     return jsonify(habits_df.to_dict("records"))
 
@@ -137,62 +257,245 @@ def get_habits_analytics():
 @bp.route("/analytics/habits/<int:habit_id>/streaks", methods=["GET"])
 def get_habit_streaks(habit_id: int):
     """Endpoint to get streak analytics for a specific habit."""
+    try:
+        start, end, granularity = _analytics_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     db_session = get_db()
-    analytics_service = AnalyticsService(db_session)
-    streaks = analytics_service.calculate_streaks(habit_id)
+    if start is None and end is None and granularity is None:
+        # Current streaks are kept up to date by check-offs and the rollover
+        ranking_service = RankingService(db_session, get_current_user_id())
+        return jsonify(ranking_service.streaks(habit_id))
+
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
+    streaks = analytics_service.calculate_streaks(
+        habit_id, start=start, end=end, granularity=granularity
+    )
     return jsonify(streaks)
 
 
-@bp.route("/analytics/habits/struggled", methods=["GET"])
-def get_struggled_habits():
-    """Endpoint to get habits with lowest completion rates in last 30 days."""
-    db_session = get_db()
+def _float_param(args, name, default):
+    """Reads a float from ``args``, falling back to ``default`` when the value
+    is missing or malformed."""
+    try:
+        return float(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
 
+def _struggle_settings(db_session, args=None):
+    """Returns (threshold, quartile) from preferences, overridable by query
+    or the given mapping."""
+    args = request.args if args is None else args
     # Get preferences or use query params as override
-    habit_service = HabitService(db_session)
+    habit_service = HabitService(db_session, get_current_user_id())
     preferences = habit_service.get_user_preferences()
 
-    threshold = request.args.get(
-        "threshold", default=preferences.struggle_threshold, type=float
-    )
-    quartile = request.args.get(
-        "quartile", default=preferences.show_bottom_percent, type=float
-    )
+    threshold = _float_param(args, "threshold", preferences.struggle_threshold)
+    quartile = _float_param(args, "quartile", preferences.show_bottom_percent)
 
     # Clamp values between 0.1 and 1.0
     threshold = max(0.1, min(1.0, threshold))
     quartile = max(0.1, min(1.0, quartile))
+    return threshold, quartile
+
+
+@bp.route("/analytics/habits/struggled", methods=["GET"])
+def get_struggled_habits():
+    """Endpoint to get habits with lowest completion rates in last 30 days,
+    or between ``from`` and ``to``."""
+    try:
+        start, end, _ = _analytics_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db_session = get_db()
+    threshold, quartile = _struggle_settings(db_session)
 
-    analytics_service = AnalyticsService(db_session)
+    if start is None and end is None:
+        # The default 30-day window is maintained in the ranking index
+        ranking_service = RankingService(db_session, get_current_user_id())
+        return jsonify(ranking_service.struggled(threshold, quartile))
+
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
     struggled_df = analytics_service.identify_struggled_habits(
-        threshold=threshold, quartile=quartile
+        threshold=threshold, quartile=quartile, start=start, end=end
     )
     return jsonify(struggled_df.to_dict("records"))
 
 
+@bp.route("/analytics/habits/leaderboard", methods=["GET"])
+def get_leaderboard():
+    """Endpoint to get the best or worst habits by 30-day completion rate."""
+    order = request.args.get("order", "top")
+    limit = request.args.get("limit", default=10, type=int)
+    threshold = request.args.get("threshold", type=float)
+    if order not in RANK_ORDERS:
+        return jsonify({"error": f"order must be one of {', '.join(RANK_ORDERS)}"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    db_session = get_db()
+    ranking_service = RankingService(db_session, get_current_user_id())
+    return jsonify(ranking_service.ranked(order, limit, threshold))
+
+
 @bp.route("/analytics/habits/completion-rates", methods=["GET"])
 def get_completion_rates():
-    """Endpoint to get overall completion rates for all habits."""
+    """Endpoint to get overall completion rates for all habits, or one rate
+    per day/week/month bucket when ``granularity`` is given."""
+    try:
+        start, end, granularity = _analytics_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     db_session = get_db()
-    analytics_service = AnalyticsService(db_session)
-    rates_df = analytics_service.overall_completion_rate()
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
+    if granularity:
+        rates_df = analytics_service.completion_rate_series(
+            granularity, start=start, end=end
+        )
+    else:
+        rates_df = analytics_service.overall_completion_rate(start=start, end=end)
     return jsonify(rates_df.to_dict("records"))
 
 
+def _timeseries_args():
+    """Returns (start, end, encoding) for the timeseries endpoints.
+    Raises ValueError with a client-facing message on bad input."""
+    encoding = request.args.get("encoding", "bitmap")
+    if encoding not in ENCODINGS:
+        raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+    start, end, _ = _analytics_window()
+    return start, end, encoding
+
+
+@bp.route("/analytics/habits/timeseries", methods=["GET"])
+def get_timeseries():
+    """Endpoint to get every habit's per-day completion history, packed per
+    year as a base64 bitmap or as run lengths."""
+    try:
+        start, end, encoding = _timeseries_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db_session = get_db()
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
+    series = analytics_service.completion_timeseries(
+        start=start, end=end, encoding=encoding
+    )
+    return jsonify(series)
+
+
+@bp.route("/analytics/habits/<int:habit_id>/timeseries", methods=["GET"])
+def get_habit_timeseries(habit_id: int):
+    """Endpoint to get one habit's per-day completion history."""
+    try:
+        start, end, encoding = _timeseries_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db_session = get_db()
+    user_id = get_current_user_id()
+    if not HabitService(db_session, user_id).get_habit_by_id(habit_id):
+        return jsonify({"error": "Habit not found"}), 404
+
+    analytics_service = AnalyticsService(db_session, user_id)
+    series = analytics_service.completion_timeseries(
+        [habit_id], start=start, end=end, encoding=encoding
+    )
+    return jsonify(series[0])
+
+
 @bp.route("/analytics/habits/<int:habit_id>/best-worst-day", methods=["GET"])
 def get_best_worst_day(habit_id: int):
     """Endpoint to get best and worst performing days for a weekly habit."""
+    try:
+        start, end, _ = _analytics_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     db_session = get_db()
-    analytics_service = AnalyticsService(db_session)
-    days = analytics_service.best_and_worst_day(habit_id)
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
+    days = analytics_service.best_and_worst_day(habit_id, start=start, end=end)
     return jsonify(days)
 
 
+@bp.route("/analytics/metrics", methods=["GET"])
+def get_analytics_metrics():
+    """Endpoint to get this worker's request coalescing counters."""
+    return jsonify({"singleflight": analytics_flights.metrics()})
+
+
+@bp.route("/analytics/jobs", methods=["POST"])
+def create_analytics_job():
+    """Endpoint to queue a background analytics computation.
+    Identical pending or recently finished requests share one job."""
+    data = request.get_json(silent=True)
+    if not data or data.get("kind") not in JOB_KINDS:
+        return jsonify({"error": f"kind must be one of {', '.join(JOB_KINDS)}"}), 400
+    params = data.get("params") or {}
+    if not isinstance(params, dict):
+        return jsonify({"error": "params must be an object"}), 400
+
+    try:
+        start, end, granularity = _analytics_window(params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db_session = get_db()
+    threshold, quartile = _struggle_settings(db_session, params)
+    job = job_queue.submit(
+        db_session,
+        get_current_user_id(),
+        data["kind"],
+        {
+            "from": start.isoformat() if start else None,
+            "to": end.isoformat() if end else None,
+            "granularity": granularity,
+            "threshold": threshold,
+            "quartile": quartile,
+        },
+    )
+    return jsonify(serialize_analytics_job(job)), 202
+
+
+@bp.route("/analytics/jobs/<job_id>", methods=["GET"])
+def get_analytics_job(job_id: str):
+    """Endpoint to poll a background analytics job for its status and result."""
+    db_session = get_db()
+    job = job_queue.get(db_session, job_id, get_current_user_id())
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(serialize_analytics_job(job))
+
+
+@bp.route("/dashboard", methods=["GET"])
+def get_dashboard():
+    """Endpoint to get habits with their status, streaks, rates and day
+    analysis plus struggled habits and summary figures in one response."""
+    try:
+        start, end, _ = _analytics_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db_session = get_db()
+    threshold, quartile = _struggle_settings(db_session)
+
+    analytics_service = AnalyticsService(db_session, get_current_user_id())
+    return jsonify(
+        analytics_service.dashboard(
+            threshold=threshold, quartile=quartile, start=start, end=end
+        )
+    )
+
+
 @bp.route("/preferences", methods=["GET"])
 def get_preferences():
     """Endpoint to get user preferences."""
     db_session = get_db()
-    habit_service = HabitService(db_session)
+    habit_service = HabitService(db_session, get_current_user_id())
     preferences = habit_service.get_user_preferences()
     return jsonify(serialize_user_preferences(preferences))
 
@@ -205,12 +508,13 @@ def update_preferences():
         return jsonify({"error": "No data provided"}), 400
 
     db_session = get_db()
-    habit_service = HabitService(db_session)
+    habit_service = HabitService(db_session, get_current_user_id())
 
     try:
         updated_preferences = habit_service.update_user_preferences(
             struggle_threshold=data.get("struggle_threshold"),
             show_bottom_percent=data.get("show_bottom_percent"),
+            timezone=data.get("timezone"),
         )
         return jsonify(serialize_user_preferences(updated_preferences)), 200
     except Exception as e:
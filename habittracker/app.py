@@ -1,6 +1,16 @@
+import os
+
 from flask import Flask, send_from_directory
 
-from habittracker import api, database
+from habittracker import api, boot, database
+from habittracker.cli import (
+    analytics_group,
+    archive_command,
+    profile_analytics_command,
+    rollover_command,
+)
+from habittracker.completion_index import completion_index
+from habittracker.rollover import RolloverScheduler
 
 
 def create_app(db_url="sqlite:///habittracker.db"):
@@ -17,8 +27,33 @@ def create_app(db_url="sqlite:///habittracker.db"):
     # Rebind the SessionLocal to the new, correct engine.
     database.SessionLocal.configure(bind=database.engine)
 
+    # Deployments that start straight into the server migrate on boot; an
+    # up-to-date database costs a single query. Sample data is opt-in.
+    if os.getenv("AUTO_MIGRATE") == "1":
+        boot.prepare_database(
+            database.engine, seed=os.getenv("SEED_SAMPLE_DATA") == "1"
+        )
+
+    # The optional in-memory completion index belongs to one database, so it
+    # is rebuilt whenever the app is bound to a new one.
+    completion_index.reset()
+    if os.getenv("COMPLETION_INDEX") == "1":
+        with database.SessionLocal() as db_session:
+            completion_index.warm(db_session)
+
     app.teardown_appcontext(database.close_db)
     app.register_blueprint(api.bp)
+    app.cli.add_command(rollover_command)
+    app.cli.add_command(archive_command)
+    app.cli.add_command(profile_analytics_command)
+    app.cli.add_command(analytics_group)
+
+    # In-process day rollover; deployments with several workers should run
+    # `flask rollover` from cron instead.
+    if os.getenv("ROLLOVER_SCHEDULER") == "1":
+        scheduler = RolloverScheduler(database.SessionLocal)
+        scheduler.start()
+        app.extensions["rollover_scheduler"] = scheduler
 
     @app.route("/")
     def index():
@@ -0,0 +1,163 @@
+import datetime
+import os
+
+import pandas as pd
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.orm import Session
+
+from . import models, periods
+
+# Completions with local dates more than this many days old are moved out of
+# the hot table by ``archive_completions``.
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "730"))
+
+# Period checks and check-offs only read the hot table, so the current day
+# and ISO week in every timezone must never be archived.
+MIN_HORIZON_DAYS = 14
+
+# Archive tables are created on demand, one per year, so they live outside
+# the models' metadata and ``create_all``.
+archive_metadata = MetaData()
+
+
+def utc_today() -> datetime.date:
+    """Today's UTC date, the day ``ranking`` and ``rollover`` work from, so
+    the horizon does not move with the server's timezone."""
+    return pd.Timestamp.utcnow().tz_localize(None).date()
+
+
+def archive_table(year: int) -> Table:
+    """The archive table of completions with local dates in ``year``."""
+    name = f"completions_archive_{year}"
+    return Table(
+        name,
+        archive_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("completed_at", DateTime),
+        Column("habit_id", Integer, nullable=False),
+        Column("user_id", Integer),
+        Column("local_date", Date),
+        Column("iso_week", String(8)),
+        Column("day_ordinal", Integer),
+        Column("iso_week_ordinal", Integer),
+        Index(f"ix_{name}_user_day_ordinal", "user_id", "day_ordinal"),
+        Index(f"ix_{name}_habit_day_ordinal", "habit_id", "day_ordinal"),
+        keep_existing=True,
+    )
+
+
+def archive_tables(
+    db_session: Session,
+    since: datetime.date | None = None,
+    until: datetime.date | None = None,
+) -> list[Table]:
+    """Archive tables holding local dates between ``since`` and ``until``
+    (both inclusive); none when the window starts after everything archived.
+    """
+    archives = db_session.query(
+        models.CompletionArchive.year, models.CompletionArchive.archived_before
+    ).all()
+    if not archives:
+        return []
+    if since is not None and since >= max(before for _, before in archives):
+        return []
+    return [
+        archive_table(year)
+        for year, _ in sorted(archives)
+        if (since is None or year >= since.year)
+        and (until is None or year <= until.year)
+    ]
+
+
+def archive_completions(
+    db_session: Session, before: datetime.date | None = None
+) -> int:
+    """Move completions with local dates before ``before`` (default:
+    ``ARCHIVE_HORIZON_DAYS`` ago) into per-year archive tables, adding them
+    to the monthly rollups, and return how many moved.
+
+    Each year moves in its own transaction, so analytics never see a row
+    twice or not at all, and an interrupted run loses nothing.
+    """
+    today = utc_today()
+    latest = today - datetime.timedelta(days=MIN_HORIZON_DAYS)
+    if before is None:
+        before = today - datetime.timedelta(days=ARCHIVE_HORIZON_DAYS)
+    if before > latest:
+        raise ValueError(f"Completions after {latest} must stay in the hot table")
+
+    hot = models.Completion.__table__
+    year_label = func.strftime("%Y", hot.c.local_date)
+    years = db_session.scalars(
+        select(year_label)
+        .where(hot.c.day_ordinal < periods.day_ordinal(before))
+        .group_by(year_label)
+    ).all()
+
+    moved = 0
+    for year in sorted(int(label) for label in years):
+        year_end = min(before, datetime.date(year + 1, 1, 1))
+        moved += _archive_year(db_session, year, year_end)
+    return moved
+
+
+def _archive_year(db_session: Session, year: int, year_end: datetime.date) -> int:
+    hot = models.Completion.__table__
+    in_year = and_(
+        hot.c.day_ordinal >= periods.day_ordinal(datetime.date(year, 1, 1)),
+        hot.c.day_ordinal < periods.day_ordinal(year_end),
+    )
+    table = archive_table(year)
+    table.create(db_session.connection(), checkfirst=True)
+
+    columns = [column.name for column in table.columns]
+    moved = db_session.execute(
+        insert(table).from_select(
+            columns, select(*(hot.c[name] for name in columns)).where(in_year)
+        )
+    ).rowcount
+    if moved:
+        month = func.strftime("%Y-%m", hot.c.local_date)
+        counts = db_session.execute(
+            select(hot.c.habit_id, hot.c.user_id, month, func.count())
+            .where(in_year)
+            .group_by(hot.c.habit_id, hot.c.user_id, month)
+        ).all()
+        rollups = {
+            (rollup.habit_id, rollup.month): rollup
+            for rollup in db_session.query(models.CompletionRollup).filter(
+                models.CompletionRollup.month.startswith(f"{year}-")
+            )
+        }
+        for habit_id, user_id, label, completed in counts:
+            rollup = rollups.get((habit_id, label))
+            if rollup is None:
+                rollup = models.CompletionRollup(
+                    habit_id=habit_id, month=label, user_id=user_id, completed=0
+                )
+                db_session.add(rollup)
+            rollup.completed += completed
+        db_session.execute(delete(hot).where(in_year))
+
+    state = db_session.get(models.CompletionArchive, year)
+    if state is None:
+        state = models.CompletionArchive(year=year, completions=0)
+        db_session.add(state)
+    state.archived_before = max(year_end, state.archived_before or year_end)
+    state.completions += moved
+    db_session.commit()
+    return moved
@@ -0,0 +1,324 @@
+import asyncio
+import io
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from . import database, handlers
+from .api import SAFE_METHODS
+from .app import create_app
+from .events import KEEPALIVE_SECONDS, broker, format_sse
+from .models import Completion, Habit
+from .services import DEFAULT_USERNAME, NO_USER_ID, HabitService
+
+# Threads running the Flask app for routes without a native async handler,
+# which includes all pandas analytics.
+EXECUTOR_WORKERS = 8
+
+
+class _Request:
+    """The parts of an ASGI HTTP request the handlers need."""
+
+    def __init__(self, scope: dict, body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query_string = scope.get("query_string", b"")
+        self.query = {
+            key: values[0]
+            for key, values in parse_qs(self.query_string.decode("latin-1")).items()
+        }
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+        self.body = body
+
+
+class AsyncAPI:
+    """ASGI application serving the habit API.
+
+    The per-habit routes that are dominated by database round trips run the
+    existing services on an async engine through ``AsyncSession.run_sync``,
+    so waiting on SQLite does not hold a thread; a check-off's stats refresh
+    and event payload still go to the thread pool. The event stream is served
+    natively as well. Every other route, including the pandas analytics, is
+    handed to the Flask app on a thread pool so CPU-bound work never blocks
+    the event loop.
+    """
+
+    def __init__(self, db_url: str, executor_workers: int = EXECUTOR_WORKERS):
+        if ":memory:" in db_url:
+            raise ValueError(
+                "The ASGI app needs a file database shared by both engines"
+            )
+        self.flask_app = create_app(db_url)
+        self.engine = database.create_async_database_engine(db_url)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(
+            max_workers=executor_workers, thread_name_prefix="asgi-wsgi"
+        )
+        self._user_ids: dict[str, int] = {}
+        self.routes = [
+            ("GET", re.compile(r"/api/habits"), self.get_habits),
+            ("GET", re.compile(r"/api/habits/(\d+)"), self.get_habit),
+            ("POST", re.compile(r"/api/habits/(\d+)/checkoff"), self.check_off_habit),
+            ("GET", re.compile(r"/api/habits/(\d+)/completed"), self.is_completed),
+            ("GET", re.compile(r"/api/habits/completed-status"), self.get_status),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] == "GET" and scope["path"] == "/api/events":
+            await self.stream_events(_Request(scope, b""), receive, send)
+            return
+
+        body = await self._read_body(receive)
+        request = _Request(scope, body)
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match and method == request.method:
+                payload, status = await handler(request, *match.groups())
+                await self._send_json(send, payload, status)
+                return
+        await self._call_flask(scope, body, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _send_json(send, payload, status: int):
+        body = json.dumps(payload).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _run(self, fn):
+        """Run ``fn(session)`` with a sync session facade over the async engine."""
+        async with self.sessions() as session:
+            return await session.run_sync(fn)
+
+    async def _user_id(self, request: _Request) -> int:
+        """Resolve the ``X-User`` header as ``api.get_current_user_id`` does.
+        Users are never deleted, so ids are cached for the process; unknown
+        users are not, as a write may create them."""
+        username = request.headers.get("x-user", "").strip() or DEFAULT_USERNAME
+        if username in self._user_ids:
+            return self._user_ids[username]
+
+        def resolve(db):
+            service = HabitService(db)
+            if request.method in SAFE_METHODS:
+                user = service.get_user(username)
+                return user.id if user else None
+            return service.get_or_create_user(username).id
+
+        user_id = await self._run(resolve)
+        if user_id is None:
+            return NO_USER_ID
+        self._user_ids[username] = user_id
+        return user_id
+
+    async def get_habits(self, request):
+        user_id = await self._user_id(request)
+        return await self._run(lambda db: handlers.list_habits(db, user_id))
+
+    async def get_habit(self, request, habit_id):
+        user_id = await self._user_id(request)
+        return await self._run(
+            lambda db: handlers.get_habit(db, user_id, int(habit_id))
+        )
+
+    async def check_off_habit(self, request, habit_id):
+        user_id = await self._user_id(request)
+        payload, status = await self._run(
+            lambda db: handlers.check_off_habit(
+                db, user_id, int(habit_id), defer_updates=True
+            )
+        )
+        if status != 201:
+            return payload, status
+
+        # The stats refresh and the streaks pushed to listeners use pandas,
+        # so they run on the thread pool rather than the event loop.
+        def after_check_off():
+            with database.SessionLocal() as db:
+                HabitService(db, user_id).after_check_off(
+                    db.get(Habit, payload["habit_id"]),
+                    db.get(Completion, payload["id"]),
+                )
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, after_check_off)
+        return payload, status
+
+    async def is_completed(self, request, habit_id):
+        user_id = await self._user_id(request)
+        return await self._run(
+            lambda db: handlers.is_habit_completed(db, user_id, int(habit_id))
+        )
+
+    async def get_status(self, request):
+        user_id = await self._user_id(request)
+        return await self._run(
+            lambda db: handlers.completion_status(db, user_id, request.query.get("ids"))
+        )
+
+    async def stream_events(self, request, receive, send):
+        """Serve ``/api/events`` without tying up a thread per client."""
+        subscription = broker.subscribe(
+            await self._user_id(request), asyncio.get_running_loop()
+        )
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        next_event = None
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"),
+                    ],
+                }
+            )
+            await self._send_chunk(send, "retry: 5000\n\n")
+            while not disconnected.done():
+                # A wait that timed out keeps waiting on the same get
+                if next_event is None or next_event.done():
+                    next_event = asyncio.ensure_future(subscription.get())
+                await asyncio.wait(
+                    [next_event, disconnected],
+                    timeout=KEEPALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if next_event.done():
+                    await self._send_chunk(send, format_sse(next_event.result()))
+                elif not disconnected.done():
+                    await self._send_chunk(send, ": keepalive\n\n")
+        finally:
+            disconnected.cancel()
+            if next_event is not None:
+                next_event.cancel()
+            broker.unsubscribe(subscription)
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def _send_chunk(send, text: str):
+        await send(
+            {"type": "http.response.body", "body": text.encode(), "more_body": True}
+        )
+
+    async def _call_flask(self, scope, body: bytes, send):
+        """Serve a request with the Flask app on the thread pool."""
+        environ = self._wsgi_environ(scope, body)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self.executor, self.flask_app, environ, start_response
+        )
+        try:
+            # Flask calls start_response before returning a plain response,
+            # but a streamed one may only do so on its first chunk.
+            chunks = iter(result)
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response["status"],
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in response["headers"]
+                    ],
+                }
+            )
+            while chunk is not None:
+                if chunk:
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self.executor, result.close)
+
+    @staticmethod
+    def _wsgi_environ(scope: dict, body: bytes) -> dict:
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"],
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif name != "CONTENT_LENGTH":
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+def create_asgi_app(db_url: str | None = None) -> AsyncAPI:
+    """Application factory for the ASGI variant of the API. The database
+    defaults to ``DATABASE_URL`` so servers can configure it from the
+    environment."""
+    return AsyncAPI(db_url or database.DATABASE_URL)
@@ -0,0 +1,82 @@
+import logging
+import re
+from pathlib import Path
+
+from sqlalchemy import exc, func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+from .sample_data import add_sample_habits
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+VERSIONS_DIR = ALEMBIC_INI.parent / "alembic" / "versions"
+
+_REVISION = re.compile(r"^revision\b.*=\s*['\"](\w+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision\b.*=(.*)$", re.MULTILINE)
+
+
+def head_revision(versions_dir: Path = VERSIONS_DIR) -> str:
+    """The head revision of the migration scripts.
+
+    Read from the scripts' ``revision`` and ``down_revision`` lines rather
+    than through alembic, whose import alone takes longer than the rest of
+    the boot check.
+    """
+    revisions, parents = set(), set()
+    for path in versions_dir.glob("*.py"):
+        source = path.read_text()
+        revision = _REVISION.search(source)
+        if revision:
+            revisions.add(revision.group(1))
+            down = _DOWN_REVISION.search(source)
+            if down:
+                parents.update(re.findall(r"['\"](\w+)['\"]", down.group(1)))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise RuntimeError(f"Expected one migration head, found {sorted(heads)}")
+    return heads.pop()
+
+
+def current_revision(engine: Engine) -> str | None:
+    """The revision the database is migrated to, or None if it never was."""
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT version_num FROM alembic_version"))
+            return version.scalar()
+    except exc.DBAPIError:
+        return None
+
+
+def upgrade(engine: Engine):
+    """Run ``alembic upgrade head`` against the engine's database."""
+    # Imported here so that booting an up-to-date database never loads it
+    from alembic.config import Config
+
+    from alembic import command
+
+    config = Config(str(ALEMBIC_INI))
+    config.attributes["configure_logger"] = False
+    url = engine.url.render_as_string(hide_password=False)
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    command.upgrade(config, "head")
+
+
+def prepare_database(engine: Engine, seed: bool = False):
+    """Bring the database to the latest schema before serving requests.
+
+    An up-to-date database costs one query; alembic is only loaded when a
+    migration is pending. With ``seed``, a database without habits gets the
+    sample habits, so restarts never touch existing data.
+    """
+    current, head = current_revision(engine), head_revision()
+    if current != head:
+        logger.info("Migrating database from %s to %s", current, head)
+        upgrade(engine)
+    if seed:
+        with Session(engine) as db_session:
+            if not db_session.scalar(select(func.count(models.Habit.id))):
+                count = add_sample_habits(db_session)
+                logger.info("Seeded %d sample habits", count)
@@ -0,0 +1,124 @@
+import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import database, models
+from .analytics import AnalyticsService
+from .archive import ARCHIVE_HORIZON_DAYS, archive_completions, utc_today
+from .profiling import FORMATS, Profiler
+from .reports import REPORT_FORMATS, check_output, write_report
+from .rollover import run_rollover
+from .services import DEFAULT_USERNAME
+
+
+@click.command("rollover")
+def rollover_command():
+    """Refresh date-dependent habit stats for the current day."""
+    with database.SessionLocal() as db_session:
+        result = run_rollover(db_session)
+    click.echo(
+        f"Refreshed {result['refreshed']} habits, "
+        f"reset {result['streaks_reset']} streaks."
+    )
+
+
+@click.command("archive")
+@click.option(
+    "--horizon-days",
+    type=int,
+    default=ARCHIVE_HORIZON_DAYS,
+    show_default=True,
+    help="Archive completions older than this many days.",
+)
+def archive_command(horizon_days):
+    """Move old completions into per-year archive tables."""
+    before = utc_today() - datetime.timedelta(days=horizon_days)
+    with database.SessionLocal() as db_session:
+        try:
+            moved = archive_completions(db_session, before)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--horizon-days")
+    click.echo(f"Archived {moved} completions from before {before}.")
+
+
+@click.command("profile-analytics")
+@click.argument("path")
+@click.option(
+    "--user",
+    default=DEFAULT_USERNAME,
+    show_default=True,
+    help="Username to send the request as (X-User).",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(FORMATS),
+    default="stats",
+    show_default=True,
+    help="Ranked cProfile breakdown or sampled collapsed stacks.",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="File to write the profile to instead of stdout.",
+)
+@with_appcontext
+def profile_analytics_command(path, user, fmt, output):
+    """Profile one GET request to PATH, e.g. /api/dashboard?from=2024-01-01."""
+    client = current_app.test_client()
+    with Profiler(fmt) as profiler:
+        response = client.get(path, headers={"X-User": user})
+    click.echo(f"GET {path} -> {response.status}", err=True)
+    output.write(profiler.report())
+
+
+@click.group("analytics")
+def analytics_group():
+    """Offline analytics over the whole database."""
+
+
+@analytics_group.command("report")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(REPORT_FORMATS),
+    default="csv",
+    show_default=True,
+    help="CSV, JSON lines, or Parquet (needs pyarrow).",
+)
+@click.option(
+    "--output",
+    default="-",
+    help="File to write the report to instead of stdout.",
+)
+@click.option("--user", help="Only report this user's habits.")
+@click.option(
+    "--workers",
+    type=int,
+    help="Worker processes; defaults to ANALYTICS_WORKERS.",
+)
+@click.option("--chunk-size", type=int, help="Habits computed per worker task.")
+def analytics_report_command(fmt, output, user, workers, chunk_size):
+    """Write every analytics metric of every habit, one row per habit."""
+    try:
+        check_output(fmt, output)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    with database.SessionLocal() as db_session:
+        user_id = None
+        if user is not None:
+            user_id = (
+                db_session.query(models.User.id)
+                .filter(models.User.username == user)
+                .scalar()
+            )
+            if user_id is None:
+                raise click.BadParameter(f"no user {user!r}", param_hint="--user")
+        frames = AnalyticsService(db_session, user_id).habit_report(
+            workers=workers, chunk_size=chunk_size
+        )
+        rows = write_report(frames, output, fmt)
+    click.echo(f"Wrote {rows} habits.", err=True)
@@ -0,0 +1,148 @@
+import datetime
+import threading
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import archive, models
+
+
+class _HabitDays:
+    """Completed local days of one habit as a bool array.
+
+    Day 0 is ``origin``, always a Monday so that weeks fold into rows of 7.
+    """
+
+    def __init__(self, origin: datetime.date):
+        self.origin = origin - datetime.timedelta(days=origin.weekday())
+        self.bits = np.zeros(0, dtype=bool)
+
+    def offset(self, day: datetime.date) -> int:
+        return (day - self.origin).days
+
+    def add(self, day: datetime.date):
+        offset = self.offset(day)
+        if offset < 0:
+            # Grow to the left in whole weeks to keep the origin a Monday
+            shift = -(offset // 7) * 7
+            self.bits = np.concatenate([np.zeros(shift, dtype=bool), self.bits])
+            self.origin -= datetime.timedelta(days=shift)
+            offset += shift
+        if offset >= self.bits.size:
+            # Double the capacity so daily appends stay amortised O(1)
+            size = max(offset + 1, self.bits.size * 2, 7)
+            self.bits = np.concatenate(
+                [self.bits, np.zeros(size - self.bits.size, dtype=bool)]
+            )
+        self.bits[offset] = True
+
+    def any_between(self, first: int, stop: int) -> bool:
+        return bool(self.bits[max(first, 0) : max(stop, 0)].any())
+
+    def periods(self, weekly: bool) -> np.ndarray:
+        """Completed flag per day, or per ISO week when ``weekly``."""
+        if not weekly:
+            return self.bits
+        weeks = -(-self.bits.size // 7)
+        padded = np.zeros(weeks * 7, dtype=bool)
+        padded[: self.bits.size] = self.bits
+        return padded.reshape(weeks, 7).any(axis=1)
+
+
+class CompletionIndex:
+    """Per-habit bitmaps of completed local days, kept in process memory so
+    period checks and streaks need no query.
+
+    Only writes made through this process's ``HabitService`` reach the index,
+    so it is opt-in (``COMPLETION_INDEX=1``) and suits single-process
+    deployments. Until ``warm`` has run every lookup returns None and callers
+    fall back to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._habits: dict[int, _HabitDays] = {}
+        self.is_warm = False
+
+    def warm(self, db_session: Session):
+        """Load every habit and completed local day, archived ones included,
+        from the database."""
+        habits = {}
+        for habit_id, created_at in db_session.query(
+            models.Habit.id, models.Habit.created_at
+        ):
+            habits[habit_id] = _HabitDays(created_at.date())
+        tables = [models.Completion.__table__, *archive.archive_tables(db_session)]
+        for table in tables:
+            for habit_id, day in db_session.execute(
+                select(table.c.habit_id, table.c.local_date)
+                .where(table.c.local_date.isnot(None))
+                .distinct()
+            ):
+                habits[habit_id].add(day)
+        with self._lock:
+            self._habits = habits
+            self.is_warm = True
+
+    def reset(self):
+        """Drop all state and go cold."""
+        with self._lock:
+            self._habits = {}
+            self.is_warm = False
+
+    def track(self, habit_id: int, created: datetime.date):
+        """Register a new habit with no completions."""
+        with self._lock:
+            if self.is_warm:
+                self._habits[habit_id] = _HabitDays(created)
+
+    def add(self, habit_id: int, day: datetime.date):
+        """Record a completion on a local day."""
+        with self._lock:
+            if self.is_warm:
+                self._habits.setdefault(habit_id, _HabitDays(day)).add(day)
+
+    def discard(self, habit_id: int):
+        """Forget a deleted habit."""
+        with self._lock:
+            self._habits.pop(habit_id, None)
+
+    def completed_in_period(
+        self, habit_id: int, periodicity: models.Periodicity, day: datetime.date
+    ) -> bool | None:
+        """Whether the habit was completed in the day or ISO week containing
+        ``day``, or None when the index cannot tell."""
+        with self._lock:
+            days = self._habits.get(habit_id) if self.is_warm else None
+            if days is None:
+                return None
+            offset = days.offset(day)
+            if periodicity == models.Periodicity.WEEKLY:
+                first = offset - day.weekday()
+                return days.any_between(first, first + 7)
+            return days.any_between(offset, offset + 1)
+
+    def streaks(
+        self, habit_id: int, periodicity: models.Periodicity, today: datetime.date
+    ) -> dict | None:
+        """Longest and current streak as ``AnalyticsService.calculate_streaks``
+        computes them, or None when the index cannot tell."""
+        weekly = periodicity == models.Periodicity.WEEKLY
+        with self._lock:
+            days = self._habits.get(habit_id) if self.is_warm else None
+            if days is None:
+                return None
+            completed = np.flatnonzero(days.periods(weekly))
+            today_index = days.offset(today) // 7 if weekly else days.offset(today)
+
+        if completed.size == 0:
+            return {"longest_streak": 0, "current_streak": 0}
+        # A new run starts wherever consecutive periods are not adjacent
+        starts = np.flatnonzero(np.diff(completed, prepend=completed[0] - 2) != 1)
+        lengths = np.diff(np.append(starts, completed.size))
+        current = int(lengths[-1]) if today_index - completed[-1] <= 1 else 0
+        return {"longest_streak": int(lengths.max()), "current_streak": current}
+
+
+completion_index = CompletionIndex()
@@ -1,14 +1,34 @@
 import os
 
 from flask import g
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Connection, create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Pooled connections per process for file databases. Enough for the
+# threaded server plus the job queue and ASGI executor threads; SQLite
+# serializes writers anyway, so a bigger pool only adds open files.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
 
 
 def create_database_engine(db_url):
     """Create and configure a SQLAlchemy engine with proper settings."""
-    if db_url.startswith("sqlite"):
-        engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    if db_url.startswith("sqlite") and (":memory:" in db_url or "///" not in db_url):
+        # An in-memory database lives in its connection, so every checkout
+        # must get the same one.
+        engine = create_engine(
+            db_url, connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+    elif db_url.startswith("sqlite"):
+        engine = create_engine(
+            db_url,
+            connect_args={"check_same_thread": False},
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+        )
     else:
         engine = create_engine(db_url)
 
@@ -23,9 +43,54 @@ def create_database_engine(db_url):
     return engine
 
 
+def create_async_database_engine(db_url):
+    """Create an async engine for the given URL; SQLite URLs use aiosqlite."""
+    if db_url.startswith("sqlite:"):
+        db_url = "sqlite+aiosqlite:" + db_url[len("sqlite:") :]
+    engine = create_async_engine(db_url)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        if "sqlite" in db_url:
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+    return engine
+
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///habittracker.db")
 engine = create_database_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after commit: sessions live for one request, and
+# reloading every written row straight after writing it doubled the
+# statements per write.
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
+
+
+def is_shared(db_session: Session) -> bool:
+    """Whether other connections see the session's committed rows.
+
+    In-memory databases live in one connection, and a session bound to a
+    connection (as in the test suite) commits into that connection's outer
+    transaction, so work using either must stay on the same connection.
+    """
+    bind = db_session.get_bind()
+    if isinstance(bind, Connection):
+        return False
+    return bind.url.database not in (None, "", ":memory:")
+
+
+def upsert_insert(db_session: Session, model):
+    """An INSERT into ``model`` supporting ``on_conflict_do_update`` and
+    ``on_conflict_do_nothing`` on the session's backend."""
+    dialect = db_session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"No upsert support for {dialect} databases")
 
 
 def get_db():
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import queue
+import threading
+
+# How long an idle stream waits before sending a keep-alive comment, so
+# proxies do not drop the connection.
+KEEPALIVE_SECONDS = 15
+
+
+class Subscription:
+    """A single client's queue of pending events."""
+
+    def __init__(self, user_id: int | None, max_pending: int):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_pending)
+
+    def get(self, timeout: float | None = None) -> dict:
+        """Block until the next event arrives, raising queue.Empty on timeout."""
+        return self.queue.get(timeout=timeout)
+
+    def put(self, event: dict):
+        """Queue an event, collapsing the backlog into a resync if it overflows."""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A client this far behind is better served by reloading its
+            # state than by replaying every delta it missed.
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait({"type": "resync", "data": {}})
+
+
+class AsyncSubscription(Subscription):
+    """A subscription read on an event loop. Publishers hand events to the
+    loop, so a waiting client costs nothing until one arrives."""
+
+    def __init__(
+        self, user_id: int | None, max_pending: int, loop: asyncio.AbstractEventLoop
+    ):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    async def get(self) -> dict:
+        """Wait for the next event."""
+        return await self.queue.get()
+
+    def put(self, event: dict):
+        """Queue an event from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The loop has closed, and the stream with it
+
+    def _put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "data": {}})
+
+
+class EventBroker:
+    """Fans out change events to the subscribers of this process.
+
+    Events only reach clients connected to the same worker process.
+    """
+
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self, user_id: int | None, loop: asyncio.AbstractEventLoop | None = None
+    ) -> Subscription:
+        """Registers a new subscription for a user's events, read on ``loop``
+        if given."""
+        if loop is None:
+            subscription = Subscription(user_id, self.max_pending)
+        else:
+            subscription = AsyncSubscription(user_id, self.max_pending, loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Removes a subscription; further events are no longer queued for it."""
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self, user_id: int | None) -> bool:
+        """Returns whether anyone is listening for a user's events."""
+        with self._lock:
+            return any(s.user_id == user_id for s in self._subscriptions)
+
+    def publish(self, user_id: int | None, event_type: str, data: dict):
+        """Queues an event for every subscription belonging to ``user_id``."""
+        event = {"type": event_type, "data": data}
+        with self._lock:
+            targets = [s for s in self._subscriptions if s.user_id == user_id]
+        for subscription in targets:
+            subscription.put(event)
+
+
+def format_sse(event: dict) -> str:
+    """Encodes an event in the text/event-stream wire format."""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+# Process-wide broker shared by the services and the /api/events stream.
+broker = EventBroker()
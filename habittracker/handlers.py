@@ -0,0 +1,62 @@
+from sqlalchemy.orm import Session
+
+from .serializers import serialize_completion, serialize_habit
+from .services import HabitAlreadyCompletedError, HabitService
+
+# Handlers of the routes served by both the Flask API and its ASGI variant.
+# Each returns the JSON payload and status code, so both APIs answer alike.
+
+HABIT_NOT_FOUND = {"error": "Habit not found"}, 404
+ALREADY_COMPLETED = {"error": "Habit already completed for this period"}, 409
+
+
+def parse_habit_ids(value: str | None) -> list[int] | None:
+    """Parses a comma-separated ``ids`` filter; None means every habit.
+    Raises ValueError with a client-facing message on bad input."""
+    if not value:
+        return None
+    try:
+        return [int(i) for i in value.split(",")]
+    except ValueError:
+        raise ValueError("ids must be comma-separated integers") from None
+
+
+def list_habits(db_session: Session, user_id: int):
+    habits = HabitService(db_session, user_id).get_all_habits()
+    return [serialize_habit(h) for h in habits], 200
+
+
+def get_habit(db_session: Session, user_id: int, habit_id: int):
+    habit = HabitService(db_session, user_id).get_habit_by_id(habit_id)
+    if not habit:
+        return HABIT_NOT_FOUND
+    return serialize_habit(habit), 200
+
+
+def check_off_habit(
+    db_session: Session, user_id: int, habit_id: int, defer_updates: bool = False
+):
+    """Checks a habit off; see ``HabitService.check_off_habit`` for
+    ``defer_updates``."""
+    habit_service = HabitService(db_session, user_id)
+    try:
+        completion = habit_service.check_off_habit(habit_id, defer_updates)
+    except HabitAlreadyCompletedError:
+        return ALREADY_COMPLETED
+    if not completion:
+        return HABIT_NOT_FOUND
+    return serialize_completion(completion), 201
+
+
+def is_habit_completed(db_session: Session, user_id: int, habit_id: int):
+    completed = HabitService(db_session, user_id).is_habit_completed_today(habit_id)
+    return {"completed": completed}, 200
+
+
+def completion_status(db_session: Session, user_id: int, ids: str | None):
+    try:
+        habit_ids = parse_habit_ids(ids)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    status = HabitService(db_session, user_id).get_completion_status(habit_ids)
+    return {str(habit_id): done for habit_id, done in status.items()}, 200
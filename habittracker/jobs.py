@@ -0,0 +1,301 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import database, models
+from .analytics import AnalyticsService
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ("struggled", "completion-rates", "report")
+
+# How long finished results are kept and handed to identical requests.
+JOB_TTL_SECONDS = 300
+
+# Seconds a job may stay queued or running before it counts as abandoned
+# and identical requests stop waiting on it.
+JOB_TIMEOUT_SECONDS = int(os.getenv("JOB_TIMEOUT_SECONDS", "600"))
+
+PENDING = ("queued", "running")
+
+# Inserts a submit tries when identical jobs keep finishing in between.
+SUBMIT_ATTEMPTS = 3
+
+
+def worker_name() -> str:
+    """This process, as recorded on the jobs its thread pool holds."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_alive(worker: str | None) -> bool:
+    """Whether the process holding a job may still run it. Processes on
+    other hosts, or where that cannot be checked, are assumed to."""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def job_key(user_id: int | None, kind: str, params: dict) -> str:
+    """Identify a computation so identical requests can share it."""
+    payload = json.dumps([user_id, kind, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_analytics_job(
+    db_session: Session, user_id: int | None, kind: str, params: dict
+):
+    """Compute a job's result; ``params`` holds ISO ``from``/``to`` dates,
+    ``granularity``, ``threshold`` and ``quartile``."""
+    service = AnalyticsService(db_session, user_id)
+    start, end = (
+        datetime.date.fromisoformat(params[name]) if params.get(name) else None
+        for name in ("from", "to")
+    )
+    if kind == "struggled":
+        return service.identify_struggled_habits(
+            threshold=params["threshold"],
+            quartile=params["quartile"],
+            start=start,
+            end=end,
+        ).to_dict("records")
+    if kind == "completion-rates":
+        if params.get("granularity"):
+            rates = service.completion_rate_series(
+                params["granularity"], start=start, end=end
+            )
+        else:
+            rates = service.overall_completion_rate(start=start, end=end)
+        return rates.to_dict("records")
+    if kind == "report":
+        return service.dashboard(
+            threshold=params["threshold"],
+            quartile=params["quartile"],
+            start=start,
+            end=end,
+        )
+    raise ValueError(f"Unknown job kind: {kind}")
+
+
+class JobQueue:
+    """Runs analytics jobs on a local thread pool, tracked in
+    ``analytics_jobs`` so any request can poll for the result.
+
+    Jobs run inline when other connections cannot see the submitting
+    session's rows (see ``database.is_shared``), e.g. on an in-memory
+    SQLite database. Jobs still pending after ``timeout_seconds``, or held
+    by a process that has exited, are failed so identical requests queue
+    them again.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker | None = None,
+        max_workers: int = 2,
+        ttl_seconds: int = JOB_TTL_SECONDS,
+        timeout_seconds: int = JOB_TIMEOUT_SECONDS,
+    ):
+        self.session_factory = session_factory or database.SessionLocal
+        self.max_workers = max_workers
+        self.ttl = datetime.timedelta(seconds=ttl_seconds)
+        self.timeout = datetime.timedelta(seconds=timeout_seconds)
+        self._executor = None
+        self._recovered = False
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="analytics-job"
+            )
+        return self._executor
+
+    @staticmethod
+    def _abandon(jobs: list[models.AnalyticsJob], reason: str, now):
+        for job in jobs:
+            job.status = "failed"
+            job.error = reason
+            job.finished_at = job.expires_at = now
+
+    def _fail_abandoned(self, db_session: Session, now):
+        """Fail pending jobs that outlived the timeout, so identical requests
+        queue a new one instead of waiting forever."""
+        cutoff = now - self.timeout
+        stale = db_session.query(models.AnalyticsJob).filter(
+            or_(
+                and_(
+                    models.AnalyticsJob.status == "queued",
+                    models.AnalyticsJob.created_at < cutoff,
+                ),
+                and_(
+                    models.AnalyticsJob.status == "running",
+                    models.AnalyticsJob.started_at < cutoff,
+                ),
+            )
+        )
+        self._abandon(stale.all(), "abandoned: timed out", now)
+
+    def recover(self, db_session: Session):
+        """Fail the pending jobs of processes on this host that are gone,
+        e.g. after a crash or restart, and of any that timed out."""
+        now = models.utc_timestamp()
+        pending = db_session.query(models.AnalyticsJob).filter(
+            models.AnalyticsJob.status.in_(PENDING)
+        )
+        orphans = [job for job in pending if not _worker_alive(job.worker)]
+        self._abandon(orphans, "abandoned: its process exited", now)
+        self._fail_abandoned(db_session, now)
+        db_session.commit()
+        self._recovered = True
+
+    def _find(self, db_session: Session, key: str, now):
+        return (
+            db_session.query(models.AnalyticsJob)
+            .filter(
+                models.AnalyticsJob.key == key,
+                or_(
+                    models.AnalyticsJob.status.in_(PENDING),
+                    and_(
+                        models.AnalyticsJob.status == "done",
+                        models.AnalyticsJob.expires_at >= now,
+                    ),
+                ),
+            )
+            .order_by(models.AnalyticsJob.created_at.desc())
+            .first()
+        )
+
+    def submit(
+        self, db_session: Session, user_id: int | None, kind: str, params: dict
+    ) -> models.AnalyticsJob:
+        """Queue a job, or return the pending or unexpired identical one.
+
+        The first submit of a queue also recovers jobs orphaned by earlier
+        processes (see ``recover``).
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if not self._recovered:
+            self.recover(db_session)
+        now = models.utc_timestamp()
+        key = job_key(user_id, kind, params)
+
+        db_session.query(models.AnalyticsJob).filter(
+            models.AnalyticsJob.expires_at < now
+        ).delete(synchronize_session="fetch")
+        self._fail_abandoned(db_session, now)
+
+        # The unique index on pending keys makes the check and the insert
+        # one step: of concurrent identical submits, one inserts. The others
+        # find its job, unless it already finished and failed; then they try
+        # again.
+        for _ in range(SUBMIT_ATTEMPTS):
+            job = self._find(db_session, key, now)
+            if job is not None:
+                db_session.commit()
+                return job
+
+            job_id = uuid.uuid4().hex
+            inserted = db_session.execute(
+                database.upsert_insert(db_session, models.AnalyticsJob)
+                .values(
+                    id=job_id,
+                    user_id=user_id,
+                    kind=kind,
+                    params=json.dumps(params, sort_keys=True),
+                    key=key,
+                    status="queued",
+                    created_at=now,
+                    worker=worker_name(),
+                )
+                .on_conflict_do_nothing(
+                    index_elements=["key"],
+                    index_where=models.AnalyticsJob.status.in_(PENDING),
+                )
+            ).rowcount
+            db_session.commit()
+            if inserted:
+                break
+        else:
+            raise RuntimeError(
+                f"Could not queue or find a {kind} job after {SUBMIT_ATTEMPTS} "
+                "attempts"
+            )
+
+        job = db_session.get(models.AnalyticsJob, job_id)
+        if database.is_shared(db_session):
+            self._pool().submit(self.run, job.id)
+        else:
+            self.run(job.id)
+            db_session.refresh(job)
+        return job
+
+    def get(
+        self, db_session: Session, job_id: str, user_id: int | None
+    ) -> models.AnalyticsJob | None:
+        """Return a job of the given user, failed if it timed out."""
+        job = (
+            db_session.query(models.AnalyticsJob)
+            .filter(
+                models.AnalyticsJob.id == job_id,
+                models.AnalyticsJob.user_id == user_id,
+            )
+            .first()
+        )
+        if job is not None and job.status in PENDING:
+            now = models.utc_timestamp()
+            if (job.started_at or job.created_at) < now - self.timeout:
+                self._abandon([job], "abandoned: timed out", now)
+                db_session.commit()
+        return job
+
+    def run(self, job_id: str):
+        """Compute a queued job and store its result or error."""
+        with self.session_factory() as db_session:
+            job = db_session.get(models.AnalyticsJob, job_id)
+            if job is None or job.status != "queued":
+                # Given up on while it waited; a newer job may have its key
+                return
+            job.status = "running"
+            job.started_at = models.utc_timestamp()
+            job.worker = worker_name()
+            db_session.commit()
+            try:
+                result = run_analytics_job(
+                    db_session, job.user_id, job.kind, json.loads(job.params)
+                )
+                job.result = json.dumps(result)
+                job.status = "done"
+            except Exception as e:
+                logger.exception("Analytics job %s failed", job_id)
+                db_session.rollback()
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = models.utc_timestamp()
+            # Failed jobs expire at once so the next request retries
+            job.expires_at = job.finished_at + (
+                self.ttl if job.status == "done" else datetime.timedelta(0)
+            )
+            db_session.commit()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+job_queue = JobQueue()
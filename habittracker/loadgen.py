@@ -0,0 +1,357 @@
+import argparse
+import datetime
+import http.client
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from . import periods
+from .app import create_app
+from .database import create_database_engine
+from .models import (
+    Base,
+    Completion,
+    Habit,
+    HabitStats,
+    Periodicity,
+    User,
+    stale_stats_row,
+)
+
+# Requests of each mix category, as method and path template; ``{habit}``
+# takes one of the user's habits, drawn by Zipfian popularity.
+OPERATIONS = {
+    "checkoff": [("POST", "/api/habits/{habit}/checkoff")],
+    "list": [
+        ("GET", "/api/habits"),
+        ("GET", "/api/habits/{habit}"),
+        ("GET", "/api/habits/completed-status"),
+    ],
+    "analytics": [
+        ("GET", "/api/dashboard"),
+        ("GET", "/api/analytics/habits/completion-rates"),
+        ("GET", "/api/analytics/habits/struggled"),
+        ("GET", "/api/analytics/habits/leaderboard"),
+        ("GET", "/api/analytics/habits/{habit}/streaks"),
+    ],
+}
+
+# Relative weight of each category in the generated traffic
+DEFAULT_MIX = {"checkoff": 2, "list": 6, "analytics": 2}
+
+# Habit ``k`` of a user is requested in proportion to 1 / k ** exponent.
+ZIPF_EXPONENT = 1.1
+
+
+def parse_mix(text: str) -> dict:
+    """Parse ``checkoff=2,list=6,analytics=2`` into weights per category."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise ValueError(f"mix categories are {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("mix needs a positive weight")
+    return mix
+
+
+def zipf_weights(n: int, exponent: float = ZIPF_EXPONENT) -> list[float]:
+    """Popularity of ranks 1 to ``n`` under Zipf's law."""
+    return [1 / rank**exponent for rank in range(1, n + 1)]
+
+
+def generate(
+    habits_by_user: dict[str, list[int]],
+    count: int,
+    mix: dict = DEFAULT_MIX,
+    exponent: float = ZIPF_EXPONENT,
+    seed: int = 0,
+) -> list[dict]:
+    """``count`` requests from users picked uniformly, categories picked by
+    ``mix`` and habits by Zipfian popularity in id order.
+
+    Each request is a dict of ``method``, ``path``, ``user`` and ``route``,
+    the path template its latency is reported under.
+    """
+    rng = random.Random(seed)
+    users = sorted(user for user, ids in habits_by_user.items() if ids)
+    if not users:
+        raise ValueError("no user has habits to request")
+    categories = list(mix)
+    weights = [mix[category] for category in categories]
+    popularity = {
+        user: zipf_weights(len(habits_by_user[user]), exponent) for user in users
+    }
+
+    requests = []
+    for _ in range(count):
+        user = rng.choice(users)
+        category = rng.choices(categories, weights)[0]
+        method, route = rng.choice(OPERATIONS[category])
+        habit = rng.choices(habits_by_user[user], popularity[user])[0]
+        requests.append(
+            {
+                "method": method,
+                "path": route.format(habit=habit),
+                "user": user,
+                "route": f"{method} {route}",
+            }
+        )
+    return requests
+
+
+class TestClientTransport:
+    """Sends requests to a Flask app in-process, through one test client per
+    worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method: str, path: str, user: str) -> tuple[int, bytes]:
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        response = self._local.client.open(
+            path, method=method, headers={"X-User": user}
+        )
+        return response.status_code, response.get_data()
+
+
+class HttpTransport:
+    """Sends requests to a running server, over one keep-alive connection
+    per worker thread that is reopened when the server closes it."""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, method: str, path: str, user: str) -> tuple[int, bytes]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, self.timeout)
+            self._local.conn = conn
+        try:
+            conn.request(method, path, headers={"X-User": user})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.will_close:
+            conn.close()
+            self._local.conn = None
+        return response.status, body
+
+
+def discover(transport, users: list[str]) -> dict[str, list[int]]:
+    """Each user's habit ids, as the API lists them."""
+    habits_by_user = {}
+    for user in users:
+        status, body = transport.send("GET", "/api/habits", user)
+        if status != 200:
+            raise RuntimeError(f"listing habits of {user} failed with {status}")
+        habits_by_user[user] = sorted(habit["id"] for habit in json.loads(body))
+    return habits_by_user
+
+
+def replay(transport, requests: list[dict], concurrency: int = 8) -> dict:
+    """Send ``requests`` from ``concurrency`` threads and return the latency
+    (seconds) of every request and the number of server errors (5xx or no
+    response) per route, with the wall time taken."""
+    latencies, errors = defaultdict(list), defaultdict(int)
+    lock = threading.Lock()
+
+    def send(request: dict):
+        started = time.perf_counter()
+        try:
+            status, _ = transport.send(
+                request["method"], request["path"], request["user"]
+            )
+        except (OSError, http.client.HTTPException):
+            status = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[request["route"]].append(elapsed)
+            if status is None or status >= 500:
+                errors[request["route"]] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    return {
+        "latencies": dict(latencies),
+        "errors": dict(errors),
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def _percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] * 1000
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000
+
+
+def format_report(result: dict) -> str:
+    """Throughput and p50/p95/p99 latency per route and in total."""
+    rows = sorted(result["latencies"].items())
+    rows.append(("total", [v for _, values in rows for v in values]))
+    width = max(len(route) for route, _ in rows)
+    lines = [
+        f"{'route':{width}} {'requests':>8} {'req/s':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    ]
+    for route, values in rows:
+        errors = (
+            sum(result["errors"].values())
+            if route == "total"
+            else result["errors"].get(route, 0)
+        )
+        lines.append(
+            f"{route:{width}} {len(values):8d} {len(values) / result['elapsed']:8.1f} "
+            f"{_percentile(values, 50):8.1f} {_percentile(values, 95):8.1f} "
+            f"{_percentile(values, 99):8.1f} {errors:7d}"
+        )
+    return "\n".join(lines)
+
+
+def seed(db_url: str, users: int, habits: int, history_days: int) -> list[str]:
+    """Fill an empty database with ``users`` users of ``habits`` habits each,
+    completed on random days of the last ``history_days``, and return the
+    usernames."""
+    rng = random.Random(0)
+    today = datetime.date.today()
+    engine = create_database_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    usernames = [f"loadgen-{i}" for i in range(users)]
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"id": i + 1, "username": u} for i, u in enumerate(usernames)],
+        )
+        created = datetime.datetime.combine(
+            today - datetime.timedelta(days=history_days), datetime.time()
+        )
+        conn.execute(
+            Habit.__table__.insert(),
+            [
+                {
+                    "id": user * habits + i + 1,
+                    "name": f"Habit {i}",
+                    "periodicity": (
+                        Periodicity.WEEKLY if i % 4 == 3 else Periodicity.DAILY
+                    ),
+                    "created_at": created,
+                    "user_id": user + 1,
+                }
+                for user in range(users)
+                for i in range(habits)
+            ],
+        )
+        conn.execute(
+            HabitStats.__table__.insert(),
+            [
+                stale_stats_row(habit_id, (habit_id - 1) // habits + 1)
+                for habit_id in range(1, users * habits + 1)
+            ],
+        )
+        completions = []
+        for habit_id in range(1, users * habits + 1):
+            # Habits are kept up with to different degrees
+            rate = rng.random()
+            for ago in range(1, history_days + 1):
+                if rng.random() < rate:
+                    day = today - datetime.timedelta(days=ago)
+                    completions.append(
+                        {
+                            "habit_id": habit_id,
+                            "user_id": (habit_id - 1) // habits + 1,
+                            "completed_at": datetime.datetime.combine(
+                                day, datetime.time(8)
+                            ),
+                            "local_date": day,
+                            "iso_week": periods.iso_week_key(day),
+                            "day_ordinal": periods.day_ordinal(day),
+                            "iso_week_ordinal": periods.iso_week_ordinal(day),
+                        }
+                    )
+        if completions:
+            conn.execute(Completion.__table__.insert(), completions)
+    engine.dispose()
+    return usernames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a mix of API traffic and report latency per route.",
+        epilog="Without --url or --db-url the app runs in-process on a seeded "
+        "throwaway database.",
+    )
+    parser.add_argument("--url", help="Base URL of a running server to load.")
+    parser.add_argument("--db-url", help="Database for an in-process app.")
+    parser.add_argument(
+        "--users", help="Comma-separated usernames (default: the seeded users)."
+    )
+    parser.add_argument("--seed-users", type=int, default=20)
+    parser.add_argument("--habits-per-user", type=int, default=8)
+    parser.add_argument("--history-days", type=int, default=120)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help="Category weights, e.g. checkoff=2,list=6,analytics=2.",
+    )
+    parser.add_argument("--zipf", type=float, default=ZIPF_EXPONENT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", help="Replay requests from this JSON lines file.")
+    parser.add_argument("--save", help="Write the generated requests here.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        users = args.users.split(",") if args.users else ["default"]
+        if args.url:
+            transport = HttpTransport(args.url)
+        else:
+            db_url = args.db_url
+            if db_url is None:
+                db_url = f"sqlite:///{Path(tmp) / 'loadgen.db'}"
+                seeded = seed(
+                    db_url, args.seed_users, args.habits_per_user, args.history_days
+                )
+                users = args.users.split(",") if args.users else seeded
+            transport = TestClientTransport(create_app(db_url))
+
+        if args.trace:
+            with open(args.trace) as f:
+                requests = [json.loads(line) for line in f if line.strip()]
+        else:
+            requests = generate(
+                discover(transport, users),
+                args.requests,
+                args.mix,
+                args.zipf,
+                args.seed,
+            )
+        if args.save:
+            with open(args.save, "w") as f:
+                f.writelines(json.dumps(request) + "\n" for request in requests)
+
+        result = replay(transport, requests, args.concurrency)
+        print(f"{len(requests)} requests from {args.concurrency} threads")
+        print(format_report(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+from alembic import op
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Rows per data migration batch. Each batch is its own short transaction,
+# so writers wait at most one batch for the database lock.
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "50000"))
+
+# Seconds to wait between batches. SQLite has no lock queue, and writers
+# retrying on a busy database back off for up to 100ms, so without a pause
+# back-to-back batches starve them.
+BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", "0.1"))
+
+# Last key processed by each unfinished data migration, so a migration that
+# is interrupted resumes where it stopped instead of starting over.
+PROGRESS_TABLE = "data_migration_progress"
+
+Step = Callable[[Connection, int, int], int]
+
+
+def run_batched(
+    name: str,
+    table: str,
+    step: str | Step,
+    key: str = "id",
+    batch_size: int | None = None,
+    pause: float | None = None,
+):
+    """Apply a data migration to ``table`` in batches of ``key`` values.
+
+    ``step`` is SQL with ``:lo`` and ``:hi`` bounds on ``key`` (inclusive),
+    or a function ``step(connection, lo, hi)`` returning the rows it
+    changed. Each batch commits together with a checkpoint under ``name``,
+    so an interrupted migration resumes after its last committed batch.
+
+    The block commits the migration's earlier schema changes, which stay
+    applied if the migration is then interrupted, so those changes must be
+    safe to run again (``if_not_exists``, ``if_exists``, ``has_column``).
+    """
+    batch_size = batch_size or BATCH_SIZE
+    pause = BATCH_PAUSE if pause is None else pause
+    if isinstance(step, str):
+        statement = sa.text(step)
+
+        def step(connection, lo, hi):
+            return connection.execute(statement, {"lo": lo, "hi": hi}).rowcount
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        _ensure_progress_table(connection)
+        bounds = connection.execute(
+            sa.text(f"SELECT MIN({key}), MAX({key}) FROM {table}")
+        ).one()
+        if bounds[0] is None:
+            _clear_progress(connection, name)
+            return
+        first, last = bounds
+        done = connection.execute(
+            sa.text(f"SELECT last_key FROM {PROGRESS_TABLE} WHERE name = :name"),
+            {"name": name},
+        ).scalar()
+        lo = first if done is None else done + 1
+        if done is not None:
+            logger.info("%s: resuming after %s = %s", name, key, done)
+
+        started = time.monotonic()
+        changed = 0
+        while lo <= last:
+            hi = lo + batch_size - 1
+            with _transaction(connection):
+                changed += step(connection, lo, hi) or 0
+                _save_progress(connection, name, hi)
+            elapsed = time.monotonic() - started
+            logger.info(
+                "%s: %s %d/%d (%.0f%%), %d rows changed, %.1fs",
+                name,
+                key,
+                min(hi, last),
+                last,
+                100 * (min(hi, last) - first + 1) / (last - first + 1),
+                changed,
+                elapsed,
+            )
+            lo = hi + 1
+            if lo <= last:
+                time.sleep(pause)
+        _clear_progress(connection, name)
+
+
+def create_index_online(
+    index_name: str, table: str, columns: list, unique: bool = False
+):
+    """Create an index outside the migration transaction.
+
+    PostgreSQL builds it concurrently, without blocking writes. SQLite has
+    no concurrent builds, so the index is built in its own transaction,
+    which at least keeps the migration's other work from holding the lock
+    for the length of the build. An index left by an interrupted run is
+    kept.
+    """
+    with op.get_context().autocommit_block():
+        op.create_index(
+            index_name,
+            table,
+            columns,
+            unique=unique,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def has_column(table: str, column: str) -> bool:
+    """Whether ``table`` already has ``column``, e.g. from an interrupted
+    run of the migration adding it."""
+    columns = sa.inspect(op.get_bind()).get_columns(table)
+    return any(c["name"] == column for c in columns)
+
+
+@contextmanager
+def _transaction(connection: Connection):
+    """An explicit transaction inside an autocommit block. SQLite takes the
+    write lock up front, so a batch that reads first waits for other writers
+    instead of failing with "database is locked"."""
+    immediate = connection.dialect.name == "sqlite"
+    connection.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield
+    except BaseException:
+        connection.exec_driver_sql("ROLLBACK")
+        raise
+    connection.exec_driver_sql("COMMIT")
+
+
+def _ensure_progress_table(connection: Connection):
+    connection.execute(
+        sa.text(
+            f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} "
+            "(name VARCHAR PRIMARY KEY, last_key BIGINT NOT NULL)"
+        )
+    )
+
+
+def _save_progress(connection: Connection, name: str, last_key: int):
+    updated = connection.execute(
+        sa.text(f"UPDATE {PROGRESS_TABLE} SET last_key = :key WHERE name = :name"),
+        {"name": name, "key": last_key},
+    ).rowcount
+    if not updated:
+        connection.execute(
+            sa.text(
+                f"INSERT INTO {PROGRESS_TABLE} (name, last_key) VALUES (:name, :key)"
+            ),
+            {"name": name, "key": last_key},
+        )
+
+
+def _clear_progress(connection: Connection, name: str):
+    connection.execute(
+        sa.text(f"DELETE FROM {PROGRESS_TABLE} WHERE name = :name"), {"name": name}
+    )
+    # The table only exists while a data migration is unfinished
+    if not connection.execute(
+        sa.text(f"SELECT COUNT(*) FROM {PROGRESS_TABLE}")
+    ).scalar():
+        connection.execute(sa.text(f"DROP TABLE {PROGRESS_TABLE}"))
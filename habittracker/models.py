@@ -1,9 +1,25 @@
 import datetime
 import enum
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+    select,
+    text,
+)
 from sqlalchemy.orm import declarative_base, relationship
 
+from . import periods
+
 Base = declarative_base()
 
 
@@ -12,45 +28,235 @@ def utc_now():
     return datetime.datetime.now(datetime.timezone.utc)
 
 
+def utc_timestamp():
+    """Return current UTC time as a naive datetime, the form the database
+    stores and returns, so objects kept loaded after commit hold the same
+    values a query would."""
+    return utc_now().replace(tzinfo=None)
+
+
 class Periodicity(enum.Enum):
     DAILY = "daily"
     WEEKLY = "weekly"
 
 
+class User(Base):
+    """Represents an account that owns habits and preferences."""
+
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String, nullable=False, unique=True)
+    created_at = Column(DateTime, default=utc_timestamp)
+
+    habits = relationship("Habit", back_populates="user", cascade="all, delete-orphan")
+
+
 class Habit(Base):
     """Represents a habit tracked by the user."""
 
     __tablename__ = "habits"
+    __table_args__ = (Index("ix_habits_user_periodicity", "user_id", "periodicity"),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     periodicity = Column(Enum(Periodicity), nullable=False)
-    created_at = Column(DateTime, default=utc_now)
+    created_at = Column(DateTime, default=utc_timestamp)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
+    user = relationship("User", back_populates="habits")
     completions = relationship(
         "Completion", back_populates="habit", cascade="all, delete-orphan"
     )
+    stats = relationship(
+        "HabitStats",
+        back_populates="habit",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
 
 
 class Completion(Base):
     """Represents a single completion event for a habit."""
 
     __tablename__ = "completions"
+    __table_args__ = (
+        Index(
+            "ix_completions_user_habit_completed_at",
+            "user_id",
+            "habit_id",
+            "completed_at",
+        ),
+        Index("ix_completions_habit_iso_week_ordinal", "habit_id", "iso_week_ordinal"),
+        # Serves date-windowed analytics scans for one user
+        Index("ix_completions_user_day_ordinal", "user_id", "day_ordinal"),
+    )
 
     id = Column(Integer, primary_key=True)
-    completed_at = Column(DateTime, default=utc_now)
+    completed_at = Column(DateTime, default=utc_timestamp)
     habit_id = Column(Integer, ForeignKey("habits.id"), nullable=False)
+    # Denormalized from the owning habit so per-user scans never join habits.
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Period keys in the owner's timezone, computed once at write time so
+    # period checks and analytics group on them instead of on timestamps.
+    local_date = Column(Date, nullable=True)
+    iso_week = Column(String(8), nullable=True)
+    # The same keys as integers (``periods.day_ordinal``/``iso_week_ordinal``),
+    # which period checks, uniqueness and analytics compare and group on.
+    day_ordinal = Column(Integer, nullable=True)
+    iso_week_ordinal = Column(Integer, nullable=True)
 
     habit = relationship("Habit", back_populates="completions")
 
 
+class CompletionArchive(Base):
+    """A year of completions moved out of ``completions`` into its own
+    ``completions_archive_<year>`` table."""
+
+    __tablename__ = "completion_archives"
+
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    # Every row in the year's table has a local date before this one.
+    archived_before = Column(Date, nullable=False)
+    completions = Column(Integer, default=0, nullable=False)
+    archived_at = Column(DateTime, default=utc_timestamp, onupdate=utc_timestamp)
+
+
+class CompletionRollup(Base):
+    """Archived completions per habit and month, kept in the hot tables so
+    all-time totals never read the archives."""
+
+    __tablename__ = "completion_rollups"
+    __table_args__ = (Index("ix_completion_rollups_user", "user_id"),)
+
+    habit_id = Column(Integer, ForeignKey("habits.id"), primary_key=True)
+    # Local month as YYYY-MM, the label month-granularity analytics use.
+    month = Column(String(7), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    completed = Column(Integer, default=0, nullable=False)
+
+
+# ``HabitStats.as_of`` of rows whose figures must be recomputed before use
+STALE_AS_OF = datetime.date.min
+
+
+class HabitStats(Base):
+    """Maintained 30-day completion figures per habit, indexed for ranking."""
+
+    __tablename__ = "habit_stats"
+    __table_args__ = (
+        Index("ix_habit_stats_user_rate", "user_id", "completion_rate_30d"),
+        # Finds a user's stale rows without visiting the fresh ones
+        Index("ix_habit_stats_user_as_of", "user_id", "as_of"),
+    )
+
+    habit_id = Column(Integer, ForeignKey("habits.id"), primary_key=True)
+    # Denormalized from the owning habit so rankings are one index range scan.
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    completions_30d = Column(Integer, default=0, nullable=False)
+    expected_30d = Column(Float, nullable=False)
+    completion_rate_30d = Column(Float, default=0.0, nullable=False)
+    current_streak = Column(Integer, default=0, nullable=False)
+    longest_streak = Column(Integer, default=0, nullable=False)
+    last_completed = Column(Date, nullable=True)
+    # The UTC day the figures were computed for; older rows are stale.
+    as_of = Column(Date, nullable=False)
+
+    habit = relationship("Habit", back_populates="stats")
+
+
+class AnalyticsJob(Base):
+    """A background analytics computation and, once finished, its result."""
+
+    __tablename__ = "analytics_jobs"
+    __table_args__ = (
+        Index("ix_analytics_jobs_key_status", "key", "status"),
+        # At most one queued or running job per computation
+        Index(
+            "uq_analytics_jobs_pending_key",
+            "key",
+            unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    kind = Column(String, nullable=False)
+    params = Column(Text, nullable=False)
+    # Hash of user, kind and params; identical requests share one job.
+    key = Column(String(64), nullable=False)
+    status = Column(String(16), nullable=False, default="queued")
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=utc_timestamp)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
+    # ``host:pid`` of the process whose thread pool holds the job
+    worker = Column(String(64), nullable=True)
+
+
 class UserPreferences(Base):
     """Stores user preferences for analytics and other settings."""
 
     __tablename__ = "user_preferences"
 
     id = Column(Integer, primary_key=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id"), nullable=True, unique=True, index=True
+    )
     struggle_threshold = Column(Float, default=0.75, nullable=False)
     show_bottom_percent = Column(Float, default=0.25, nullable=False)
-    created_at = Column(DateTime, default=utc_now)
-    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
+    timezone = Column(String, default=periods.DEFAULT_TIMEZONE, nullable=False)
+    created_at = Column(DateTime, default=utc_timestamp)
+    updated_at = Column(DateTime, default=utc_timestamp, onupdate=utc_timestamp)
+
+
+def stale_stats_row(habit_id: int, user_id: int | None) -> dict:
+    """Column values of a ``habit_stats`` row due for computing."""
+    return {
+        "habit_id": habit_id,
+        "user_id": user_id,
+        "completions_30d": 0,
+        "expected_30d": 0.0,
+        "completion_rate_30d": 0.0,
+        "current_streak": 0,
+        "longest_streak": 0,
+        "as_of": STALE_AS_OF,
+    }
+
+
+@event.listens_for(Habit, "after_insert")
+def _add_stale_stats(mapper, connection, target):
+    """Give each new habit a stats row due for computing, so rankings find
+    every habit needing work by ``as_of`` alone. Habits inserted without the
+    ORM need the row added alongside."""
+    connection.execute(
+        HabitStats.__table__.insert(), stale_stats_row(target.id, target.user_id)
+    )
+
+
+@event.listens_for(Completion, "before_insert")
+def _fill_derived_columns(mapper, connection, target):
+    """Fill the owner and period keys of completions inserted without them."""
+    if target.user_id is None and target.habit_id is not None:
+        target.user_id = connection.scalar(
+            select(Habit.user_id).where(Habit.id == target.habit_id)
+        )
+    if target.local_date is None:
+        if target.completed_at is None:
+            target.completed_at = utc_timestamp()
+        tz_name = connection.scalar(
+            select(UserPreferences.timezone).where(
+                UserPreferences.user_id == target.user_id
+            )
+        )
+        target.local_date = periods.local_date(target.completed_at, tz_name)
+    if target.iso_week is None:
+        target.iso_week = periods.iso_week_key(target.local_date)
+    if target.day_ordinal is None:
+        target.day_ordinal = periods.day_ordinal(target.local_date)
+    if target.iso_week_ordinal is None:
+        target.iso_week_ordinal = periods.iso_week_ordinal(target.local_date)
@@ -0,0 +1,58 @@
+import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+def get_zone(tz_name: str | None) -> ZoneInfo:
+    """Return the ZoneInfo for a timezone name, raising ValueError if unknown."""
+    try:
+        return ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {tz_name}")
+
+
+def local_date(moment: datetime.datetime, tz_name: str | None) -> datetime.date:
+    """Return the calendar date of a moment in the given timezone.
+
+    Naive datetimes are treated as UTC, which is how they are stored.
+    """
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.astimezone(get_zone(tz_name)).date()
+
+
+def local_today(tz_name: str | None) -> datetime.date:
+    """Return today's date in the given timezone."""
+    return local_date(datetime.datetime.now(datetime.timezone.utc), tz_name)
+
+
+def iso_week_key(day: datetime.date) -> str:
+    """Return the ISO week containing a date, e.g. ``2024-W01``.
+
+    Keys sort lexicographically in chronological order.
+    """
+    year, week, _ = day.isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def iso_week_start(key: str) -> datetime.date:
+    """Return the Monday of the ISO week identified by ``key``."""
+    year, week = key.split("-W")
+    return datetime.date.fromisocalendar(int(year), int(week), 1)
+
+
+def day_ordinal(day: datetime.date) -> int:
+    """Return a date's proleptic Gregorian ordinal (0001-01-01 is day 1).
+
+    Consecutive days differ by one, so period checks and day ranges compare
+    integers instead of ISO date text.
+    """
+    return day.toordinal()
+
+
+def iso_week_ordinal(day: datetime.date) -> int:
+    """Return the ISO week containing a date as a number that increases by
+    one per week."""
+    # Day 1 (0001-01-01) is a Monday, so whole weeks counted from it are ISO weeks
+    return (day.toordinal() - 1) // 7
@@ -0,0 +1,102 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+
+# Report formats: a cProfile breakdown ranked by cumulative time, or sampled
+# stacks in the collapsed form flamegraph.pl and speedscope read.
+FORMATS = ("stats", "collapsed")
+
+# Profiling API requests is off unless the server sets PROFILE_REQUESTS=1 and
+# a PROFILE_TOKEN, which requests then send in the ``X-Profile-Token`` header.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS") == "1"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+TOKEN_HEADER = "X-Profile-Token"
+
+# Functions listed in a ``stats`` report
+STATS_LIMIT = 40
+
+# Seconds between stack samples of a ``collapsed`` profile
+SAMPLE_INTERVAL = 0.001
+
+
+def token_matches(token: str) -> bool:
+    """Whether ``token`` is the configured ``PROFILE_TOKEN``, compared in
+    constant time. Never true while no token is configured."""
+    if not PROFILE_TOKEN:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Profiles the thread that starts it until it is stopped.
+
+    ``stats`` runs cProfile; ``collapsed`` samples the thread's stack every
+    ``SAMPLE_INTERVAL`` seconds from a helper thread, which costs far less
+    than tracing every call but misses work shorter than the interval.
+    """
+
+    def __init__(self, fmt: str = "stats"):
+        if fmt not in FORMATS:
+            raise ValueError(f"profile format must be one of {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self._profile = None
+        self._sampler = None
+        self._stopped = threading.Event()
+        self._stacks = Counter()
+
+    def start(self):
+        if self.fmt == "stats":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = threading.Thread(
+                target=self._sample,
+                args=(threading.get_ident(),),
+                name="profiler-sampler",
+                daemon=True,
+            )
+            self._sampler.start()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample(self, thread_id: int):
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def report(self) -> str:
+        """The profile of the stopped run, as text."""
+        if self.fmt == "collapsed":
+            return "".join(f"{stack} {n}\n" for stack, n in self._stacks.items())
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(STATS_LIMIT)
+        return stream.getvalue()
@@ -0,0 +1,280 @@
+import datetime
+
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import database, models, periods
+from .analytics import AnalyticsService
+from .singleflight import coalesce
+
+RANK_ORDERS = ("top", "bottom")
+
+
+def period_number(day: datetime.date, periodicity: models.Periodicity) -> int:
+    """Number days or ISO weeks so that consecutive periods differ by one."""
+    if periodicity == models.Periodicity.WEEKLY:
+        return periods.iso_week_ordinal(day)
+    return periods.day_ordinal(day)
+
+
+def streak_lapsed(
+    last_completed: datetime.date,
+    periodicity: models.Periodicity,
+    today: datetime.date,
+) -> bool:
+    """Whether a streak last extended on ``last_completed`` has ended by local
+    ``today``, having missed the whole previous period."""
+    return (
+        period_number(today, periodicity) - period_number(last_completed, periodicity)
+        > 1
+    )
+
+
+class RankingService:
+    """Keeps ``habit_stats`` current so completion-rate rankings and streaks
+    are read from stored rows instead of recomputed on each request.
+
+    Rows are valid for the UTC day in ``as_of``; the rollover job refreshes
+    them ahead of each new day, and reads refresh any that are still stale.
+    Every habit gets a row, due for computing, when it is created.
+    """
+
+    def __init__(self, db_session: Session, user_id: int | None = None):
+        self.db = db_session
+        self.user_id = user_id
+
+    @staticmethod
+    def _now(now) -> pd.Timestamp:
+        return now or pd.Timestamp.utcnow().tz_localize(None)
+
+    def refresh(self, now: pd.Timestamp | None = None, habit_ids=None) -> int:
+        """Recompute the stats of all habits (or the given ids) for ``now``
+        and return how many rows were written."""
+        now = self._now(now)
+        analytics = AnalyticsService(self.db, self.user_id)
+        rates = analytics.window_completion_rates(now, habit_ids)
+        # Streaks follow the owner's local calendar
+        streaks = analytics.streak_figures(now.tz_localize("UTC"), habit_ids).set_index(
+            "habit_id"
+        )
+        rows = []
+        for row in rates.itertuples():
+            values = {
+                "habit_id": row.id,
+                "user_id": None if pd.isna(row.user_id) else int(row.user_id),
+                "completions_30d": int(row.completed),
+                "expected_30d": float(row.expected),
+                "completion_rate_30d": float(row.completion_rate),
+                "current_streak": 0,
+                "longest_streak": 0,
+                "last_completed": None,
+                "as_of": now.date(),
+            }
+            if row.id in streaks.index:
+                values["current_streak"] = int(streaks.at[row.id, "current_streak"])
+                values["longest_streak"] = int(streaks.at[row.id, "longest_streak"])
+                values["last_completed"] = streaks.at[row.id, "last_completed"].date()
+            rows.append(values)
+        if rows:
+            # One upsert, so concurrent refreshes of a habit cannot both try
+            # to insert its row
+            stmt = database.upsert_insert(self.db, models.HabitStats)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["habit_id"],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in rows[0]
+                    if column != "habit_id"
+                },
+            )
+            self.db.execute(stmt, rows)
+            # Rows already loaded in the session would keep their old figures
+            for stats in list(self.db.identity_map.values()):
+                if isinstance(stats, models.HabitStats):
+                    self.db.expire(stats)
+        self.db.commit()
+        return len(rates)
+
+    def record_completion(
+        self,
+        habit: models.Habit,
+        day: datetime.date,
+        now: pd.Timestamp | None = None,
+    ):
+        """Count a completion on local ``day`` towards the habit's stats,
+        recomputing them only if they are missing or from an earlier day."""
+        now = self._now(now)
+        stats = self.db.get(models.HabitStats, habit.id)
+        if stats is None or stats.as_of != now.date():
+            self.refresh(now, [habit.id])
+            return
+        stats.completions_30d += 1
+        stats.completion_rate_30d = min(1.0, stats.completions_30d / stats.expected_30d)
+
+        period = period_number(day, habit.periodicity)
+        if stats.last_completed is None:
+            stats.current_streak = 1
+        else:
+            gap = period - period_number(stats.last_completed, habit.periodicity)
+            if gap == 1:
+                stats.current_streak += 1
+            elif gap > 1:
+                stats.current_streak = 1
+        if stats.last_completed is None or day > stats.last_completed:
+            stats.last_completed = day
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+        self.db.commit()
+
+    def mark_stale(self, habit_ids: list[int]):
+        """Have the next read or rollover recompute the habits' stats."""
+        self.db.query(models.HabitStats).filter(
+            models.HabitStats.habit_id.in_(habit_ids)
+        ).update({"as_of": models.STALE_AS_OF}, synchronize_session="fetch")
+        self.db.commit()
+
+    def break_streaks(self, today: datetime.date) -> int:
+        """Zero current streaks whose last completion is more than one period
+        before local ``today``; returns how many were reset."""
+        rows = (
+            self._stats_query()
+            .join(models.HabitStats.habit)
+            .filter(models.HabitStats.current_streak > 0)
+            .with_entities(models.HabitStats, models.Habit.periodicity)
+        )
+        broken = 0
+        for stats, periodicity in rows:
+            if streak_lapsed(stats.last_completed, periodicity, today):
+                stats.current_streak = 0
+                broken += 1
+        self.db.commit()
+        return broken
+
+    def streaks(self, habit_id: int, now: pd.Timestamp | None = None) -> dict:
+        """Stored longest and current streak of a habit, refreshing its row
+        first if it is missing or stale.
+
+        Rows are refreshed per UTC day, so a streak whose period ended at the
+        owner's local midnight since then reads as 0 until the rollover
+        resets it.
+        """
+        now = self._now(now)
+        stats = (
+            self._stats_query().filter(models.HabitStats.habit_id == habit_id).first()
+        )
+        if stats is None or stats.as_of != now.date():
+            self.refresh(now, [habit_id])
+            stats = (
+                self._stats_query()
+                .filter(models.HabitStats.habit_id == habit_id)
+                .first()
+            )
+        if stats is None:
+            return {"longest_streak": 0, "current_streak": 0}
+        current = stats.current_streak
+        if current and stats.last_completed is not None:
+            today = periods.local_date(now.to_pydatetime(), self._timezone(stats))
+            if streak_lapsed(stats.last_completed, stats.habit.periodicity, today):
+                current = 0
+        return {"longest_streak": stats.longest_streak, "current_streak": current}
+
+    def _timezone(self, stats: models.HabitStats) -> str:
+        tz_name = (
+            self.db.query(models.UserPreferences.timezone)
+            .filter(models.UserPreferences.user_id == stats.user_id)
+            .scalar()
+        )
+        return tz_name or periods.DEFAULT_TIMEZONE
+
+    def _stats_query(self):
+        query = self.db.query(models.HabitStats)
+        if self.user_id is not None:
+            query = query.filter(models.HabitStats.user_id == self.user_id)
+        return query
+
+    def _stale(self, today: datetime.date):
+        """Stats rows from before ``today``; a seek on the ``as_of`` index."""
+        return (
+            self._stats_query()
+            .with_entities(models.HabitStats.habit_id)
+            .filter(models.HabitStats.as_of < today)
+        )
+
+    def ensure_fresh(self, now: pd.Timestamp | None = None):
+        """Refresh if any habit's stats are from an earlier day.
+
+        New habits get a stale row when they are inserted, so one index
+        lookup finds any work; reads of fresh stats never visit the habits.
+        """
+        now = self._now(now)
+        if self._stale(now.date()).first() is not None:
+            self.refresh(now)
+
+    @coalesce
+    def ranked(
+        self,
+        order: str = "bottom",
+        limit: int = 10,
+        threshold: float | None = None,
+        now: pd.Timestamp | None = None,
+    ) -> list[dict]:
+        """The ``limit`` best (``top``) or worst (``bottom``) habits by 30-day
+        completion rate, optionally only those at or above (top) or below
+        (bottom) ``threshold``."""
+        self.ensure_fresh(now)
+        return self._ranked(order, limit, threshold)
+
+    def _ranked(self, order: str, limit: int, threshold: float | None) -> list[dict]:
+        rate = models.HabitStats.completion_rate_30d
+        query = (
+            self._stats_query()
+            .join(models.HabitStats.habit)
+            .with_entities(
+                models.HabitStats.habit_id,
+                models.Habit.name,
+                rate,
+                models.HabitStats.completions_30d,
+            )
+        )
+        if order == "top":
+            if threshold is not None:
+                query = query.filter(rate >= threshold)
+            query = query.order_by(rate.desc(), models.HabitStats.habit_id)
+        else:
+            if threshold is not None:
+                query = query.filter(rate < threshold)
+            query = query.order_by(rate, models.HabitStats.habit_id)
+        return [
+            {
+                "id": habit_id,
+                "name": name,
+                "completion_rate": completion_rate,
+                "completions_30d": completions,
+            }
+            for habit_id, name, completion_rate, completions in query.limit(limit)
+        ]
+
+    @coalesce
+    def struggled(
+        self,
+        threshold: float = 0.75,
+        quartile: float = 0.25,
+        now: pd.Timestamp | None = None,
+    ) -> list[dict]:
+        """The struggled habits of ``identify_struggled_habits``, read from
+        the ranking index."""
+        self.ensure_fresh(now)
+        below = (
+            self._stats_query()
+            .with_entities(func.count())
+            .filter(models.HabitStats.completion_rate_30d < threshold)
+            .scalar()
+        )
+        if not below:
+            return []
+        # Return specified portion of underperforming habits (minimum 1)
+        portion_size = max(1, int(below * quartile))
+        rows = self._ranked("bottom", portion_size, threshold)
+        return [
+            {key: row[key] for key in ("id", "name", "completion_rate")} for row in rows
+        ]
@@ -0,0 +1,71 @@
+import sys
+from collections.abc import Iterable
+
+import pandas as pd
+
+# Output formats of an analytics report. JSON is written as JSON lines, one
+# object per habit, so it can be streamed out and read back the same way.
+REPORT_FORMATS = ("csv", "json", "parquet")
+
+
+def check_output(fmt: str, path: str):
+    """Raise ``ValueError`` unless a ``fmt`` report can be written to ``path``,
+    before any of it is computed."""
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"report format must be one of {', '.join(REPORT_FORMATS)}")
+    if fmt != "parquet":
+        return
+    if path == "-":
+        raise ValueError("Parquet reports must be written to a file")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ValueError(
+            'Parquet reports need pyarrow: pip install -e ".[reports]"'
+        ) from None
+
+
+def write_report(frames: Iterable[pd.DataFrame], path: str, fmt: str) -> int:
+    """Write report ``frames`` to ``path`` (``-`` for stdout) as each one
+    arrives, and return the number of rows written.
+
+    Parquet needs the optional ``pyarrow`` dependency and a file path; every
+    frame becomes one row group.
+    """
+    check_output(fmt, path)
+    if fmt == "parquet":
+        return _write_parquet(frames, path)
+
+    rows = 0
+    out = sys.stdout if path == "-" else open(path, "w", newline="")
+    try:
+        for i, frame in enumerate(frames):
+            if fmt == "csv":
+                frame.to_csv(out, header=i == 0, index=False)
+            elif not frame.empty:
+                frame.to_json(
+                    out, orient="records", lines=True, date_format="iso", date_unit="s"
+                )
+            rows += len(frame)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return rows
+
+
+def _write_parquet(frames: Iterable[pd.DataFrame], path: str) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows, writer = 0, None
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
@@ -0,0 +1,97 @@
+import logging
+import threading
+
+import pandas as pd
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models, periods
+from .ranking import RankingService
+
+logger = logging.getLogger(__name__)
+
+# How often the scheduler wakes up. Hourly runs catch every timezone's
+# midnight within the hour; runs with nothing stale are two cheap queries.
+ROLLOVER_INTERVAL_SECONDS = 3600
+
+
+def run_rollover(db_session: Session, now: pd.Timestamp | None = None) -> dict:
+    """Bring every user's ``habit_stats`` up to date for the current day.
+
+    Rows from an earlier UTC day get their 30-day windows, expected counts
+    and streaks recomputed; streaks that ended at a user's local midnight
+    are reset. Returns how many habits were refreshed and streaks reset.
+    """
+    now = now or pd.Timestamp.utcnow().tz_localize(None)
+
+    stale_users = (
+        db_session.query(models.Habit.user_id)
+        .outerjoin(models.HabitStats)
+        .filter(
+            or_(
+                models.HabitStats.habit_id.is_(None),
+                models.HabitStats.as_of != now.date(),
+            )
+        )
+        .distinct()
+        .all()
+    )
+    refreshed = 0
+    for (user_id,) in stale_users:
+        refreshed += RankingService(db_session, user_id).refresh(now)
+
+    timezones = dict(
+        db_session.query(
+            models.UserPreferences.user_id, models.UserPreferences.timezone
+        ).all()
+    )
+    broken = 0
+    for (user_id,) in db_session.query(models.HabitStats.user_id).distinct().all():
+        today = periods.local_date(
+            now.to_pydatetime(), timezones.get(user_id, periods.DEFAULT_TIMEZONE)
+        )
+        broken += RankingService(db_session, user_id).break_streaks(today)
+
+    return {"refreshed": refreshed, "streaks_reset": broken}
+
+
+class RolloverScheduler:
+    """Runs ``run_rollover`` in a background thread of this process."""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        interval: float = ROLLOVER_INTERVAL_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Run a rollover now and then every ``interval`` seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="habit-rollover", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """Ask the thread to finish and wait for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self) -> dict:
+        with self.session_factory() as db_session:
+            return run_rollover(db_session)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                result = self.run_once()
+                logger.info("Rollover finished: %s", result)
+            except Exception:
+                # Keep the schedule alive; the next run retries
+                logger.exception("Rollover failed")
+            self._stop.wait(self.interval)
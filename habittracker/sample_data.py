@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from .models import Completion, Habit, Periodicity
+from .services import DEFAULT_USERNAME, HabitService
+
+
+def _build_habit_payloads(now: datetime):
+    today = now.date()
+    start_of_week = today - timedelta(days=today.weekday())
+
+    def daily_completion_dates(offsets):
+        return [today - timedelta(days=offset) for offset in offsets]
+
+    two_weeks_ago = now - timedelta(days=14)
+    weekly_created_at = now - timedelta(days=21)
+    week_one_start = start_of_week - timedelta(days=21)
+    week_one_completion = week_one_start + timedelta(days=2)
+
+    return [
+        {
+            "name": "Morning hydration",
+            "periodicity": Periodicity.DAILY,
+            "created_at": two_weeks_ago,
+            "completion_dates": daily_completion_dates(
+                [1, 2, 3, 5, 6, 8, 9, 11, 12, 13]
+            ),
+        },
+        {
+            "name": "Evening journaling",
+            "periodicity": Periodicity.DAILY,
+            "created_at": two_weeks_ago,
+            "completion_dates": daily_completion_dates([1, 3, 4, 6, 8, 10, 12, 13]),
+        },
+        {
+            "name": "Midday stretch break",
+            "periodicity": Periodicity.DAILY,
+            "created_at": two_weeks_ago,
+            "completion_dates": daily_completion_dates([2, 4, 5, 7, 9, 10, 12]),
+        },
+        {
+            "name": "Lunchtime walk outside",
+            "periodicity": Periodicity.DAILY,
+            "created_at": two_weeks_ago,
+            "completion_dates": daily_completion_dates([1, 2, 4, 5, 7, 9, 11, 13]),
+        },
+        {
+            "name": "Weekly budget review",
+            "periodicity": Periodicity.WEEKLY,
+            "created_at": weekly_created_at,
+            "completion_dates": [week_one_completion],
+        },
+    ]
+
+
+def add_sample_habits(db: Session) -> int:
+    """Add the predefined habits and their recent completions for the default
+    user, and return the number of habits added."""
+    user = HabitService(db).get_or_create_user(DEFAULT_USERNAME)
+    now = datetime.now(timezone.utc)
+    habit_payloads = _build_habit_payloads(now)
+
+    habits_with_schedule = []
+    for payload in habit_payloads:
+        habit = Habit(
+            name=payload["name"],
+            periodicity=payload["periodicity"],
+            created_at=payload["created_at"],
+            user_id=user.id,
+        )
+        db.add(habit)
+        habits_with_schedule.append((habit, payload["completion_dates"]))
+    db.flush()
+
+    for habit, completion_dates in habits_with_schedule:
+        for completion_date in completion_dates:
+            db.add(
+                Completion(
+                    habit_id=habit.id,
+                    user_id=user.id,
+                    completed_at=datetime.combine(completion_date, datetime.min.time()),
+                )
+            )
+    db.commit()
+    return len(habit_payloads)
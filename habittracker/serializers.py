@@ -1,3 +1,5 @@
+import json
+
 from . import models
 
 
@@ -16,16 +18,32 @@ def serialize_completion(completion: models.Completion):
     return {
         "id": completion.id,
         "completed_at": completion.completed_at.isoformat(),
+        "local_date": completion.local_date.isoformat(),
         "habit_id": completion.habit_id,
     }
 
 
+def serialize_analytics_job(job: models.AnalyticsJob):
+    """Converts an AnalyticsJob SQLAlchemy object into a python dictionary."""
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": json.loads(job.params),
+        "status": job.status,
+        "result": json.loads(job.result) if job.result is not None else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
 def serialize_user_preferences(preferences: models.UserPreferences):
     """Converts a UserPreferences SQLAlchemy object into a python dictionary."""
     return {
         "id": preferences.id,
         "struggle_threshold": preferences.struggle_threshold,
         "show_bottom_percent": preferences.show_bottom_percent,
+        "timezone": preferences.timezone,
         "created_at": preferences.created_at.isoformat(),
         "updated_at": preferences.updated_at.isoformat(),
     }
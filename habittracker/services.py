@@ -1,8 +1,25 @@
 import datetime
+import logging
 
+from sqlalchemy import and_, delete, func, or_
 from sqlalchemy.orm import Session
 
-from . import models
+from . import archive, models, periods
+from .analytics import AnalyticsService
+from .completion_index import completion_index
+from .events import broker
+from .ranking import RankingService
+from .serializers import serialize_completion, serialize_habit
+
+logger = logging.getLogger(__name__)
+
+# Requests without a user header belong to this account, which keeps
+# single-user installs working unchanged.
+DEFAULT_USERNAME = "default"
+
+# Reads by a username without an account resolve to this id, which owns no
+# rows, so unauthenticated reads never create users.
+NO_USER_ID = 0
 
 
 class HabitAlreadyCompletedError(Exception):
@@ -12,35 +29,77 @@ class HabitAlreadyCompletedError(Exception):
 class HabitService:
     """Manages business logic for habits and completions."""
 
-    def __init__(self, db_session: Session):
-        """Initializes the service with a database session."""
+    def __init__(self, db_session: Session, user_id: int | None = None):
+        """Initializes the service with a database session.
+
+        When ``user_id`` is given every query is scoped to that user's rows;
+        ``None`` keeps the unscoped single-user behaviour.
+        """
         self.db = db_session
+        self.user_id = user_id
+
+    def _habits_query(self):
+        query = self.db.query(models.Habit)
+        if self.user_id is not None:
+            query = query.filter(models.Habit.user_id == self.user_id)
+        return query
+
+    def get_user(self, username: str):
+        """Returns the user with the given username, or None."""
+        return (
+            self.db.query(models.User).filter(models.User.username == username).first()
+        )
+
+    def get_or_create_user(self, username: str):
+        """Returns the user with the given username, creating it if needed."""
+        user = self.get_user(username)
+        if not user:
+            user = models.User(username=username)
+            self.db.add(user)
+            self.db.commit()
+        return user
 
     def get_all_habits(self):
         """Returns a list of all habits."""
-        return self.db.query(models.Habit).all()
+        return self._habits_query().all()
 
     def get_habit_by_id(self, habit_id: int):
         """Returns a single habit by its ID."""
-        return self.db.query(models.Habit).filter(models.Habit.id == habit_id).first()
+        return self._habits_query().filter(models.Habit.id == habit_id).first()
 
     def create_habit(self, name: str, periodicity: str):
         """Creates a new habit."""
         # This will raise a ValueError if periodicity is invalid, which is good.
         periodicity_enum = models.Periodicity(periodicity)
 
-        new_habit = models.Habit(name=name, periodicity=periodicity_enum)
+        new_habit = models.Habit(
+            name=name, periodicity=periodicity_enum, user_id=self.user_id
+        )
         self.db.add(new_habit)
         self.db.commit()
-        self.db.refresh(new_habit)
+        completion_index.track(new_habit.id, new_habit.created_at.date())
+        broker.publish(new_habit.user_id, "habit_created", serialize_habit(new_habit))
         return new_habit
 
     def delete_habit(self, habit_id: int):
         """Deletes a habit by its ID."""
         habit_to_delete = self.get_habit_by_id(habit_id)
         if habit_to_delete:
-            self.db.delete(habit_to_delete)
+            owner_id = habit_to_delete.user_id
+            # Bulk deletes instead of the ORM cascade, which loads every
+            # completion before deleting it row by row.
+            for table in archive.archive_tables(self.db):
+                self.db.execute(delete(table).where(table.c.habit_id == habit_id))
+            for model, column in (
+                (models.Completion, models.Completion.habit_id),
+                (models.CompletionRollup, models.CompletionRollup.habit_id),
+                (models.HabitStats, models.HabitStats.habit_id),
+                (models.Habit, models.Habit.id),
+            ):
+                self.db.execute(delete(model).where(column == habit_id))
             self.db.commit()
+            completion_index.discard(habit_id)
+            broker.publish(owner_id, "habit_deleted", {"id": habit_id})
         return habit_to_delete
 
     def update_habit(self, habit_id: int, name: str = None, periodicity: str = None):
@@ -57,30 +116,51 @@ class HabitService:
             habit.periodicity = periodicity_enum
 
         self.db.commit()
-        self.db.refresh(habit)
+        if periodicity is not None:
+            # Expected completions depend on the periodicity
+            RankingService(self.db, habit.user_id).refresh(habit_ids=[habit.id])
+        broker.publish(habit.user_id, "habit_updated", serialize_habit(habit))
         return habit
 
-    def check_off_habit(self, habit_id: int):
+    def check_off_habit(self, habit_id: int, defer_updates: bool = False):
         """Creates a completion record for a given habit,
-        preventing duplicates within the same period."""
+        preventing duplicates within the same period.
+
+        With ``defer_updates`` the caller runs ``after_check_off`` itself,
+        e.g. off an event loop.
+        """
         habit = self.get_habit_by_id(habit_id)
         if not habit:
             return None
+        completion = self.save_check_off(habit)
+        if not defer_updates:
+            self.after_check_off(habit, completion)
+        return completion
 
-        today = datetime.datetime.now(datetime.timezone.utc).date()
+    def save_check_off(self, habit: models.Habit):
+        """Commits a completion for ``habit`` without the follow-up work of
+        ``after_check_off``."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        today = periods.local_date(now, self._timezone_for(habit.user_id))
 
         # Check if already completed in the current period
-        if self._already_completed_in_period(habit_id, habit.periodicity, today):
+        if self._already_completed_in_period(habit.id, habit.periodicity, today):
             raise HabitAlreadyCompletedError(
                 "Habit has already been completed for the current period."
             )
 
-        new_completion = models.Completion(habit_id=habit_id)
+        new_completion = models.Completion(
+            habit_id=habit.id,
+            user_id=habit.user_id,
+            completed_at=now.replace(tzinfo=None),
+            local_date=today,
+            iso_week=periods.iso_week_key(today),
+            day_ordinal=periods.day_ordinal(today),
+            iso_week_ordinal=periods.iso_week_ordinal(today),
+        )
         self.db.add(new_completion)
         try:
             self.db.commit()
-            self.db.refresh(new_completion)
-            return new_completion
         except Exception as e:
             self.db.rollback()
             # If unique constraint violation, treat as already completed
@@ -89,50 +169,97 @@ class HabitService:
                     "Habit has already been completed for the current period."
                 )
             raise  # Re-raise other database errors
+        return new_completion
+
+    def after_check_off(self, habit: models.Habit, completion: models.Completion):
+        """Index the committed completion, count it towards the habit's stats
+        and push it to listeners.
+
+        The check-off is saved by now, so a failing step is logged rather
+        than failing the request: the index forgets the habit, falling back
+        to the database, and the stats are marked stale to be recomputed.
+        """
+        today = completion.local_date
+        steps = (
+            lambda: completion_index.add(habit.id, today),
+            lambda: RankingService(self.db, habit.user_id).record_completion(
+                habit, today
+            ),
+            lambda: self._publish_completion(habit, completion),
+        )
+        failed = False
+        for step in steps:
+            try:
+                step()
+            except Exception:
+                logger.exception("Post check-off update of habit %s failed", habit.id)
+                failed = True
+        if not failed:
+            return
+        completion_index.discard(habit.id)
+        try:
+            self.db.rollback()
+            RankingService(self.db, habit.user_id).mark_stale([habit.id])
+        except Exception:
+            logger.exception("Marking stats of habit %s stale failed", habit.id)
+
+    def _publish_completion(self, habit: models.Habit, completion: models.Completion):
+        """Pushes a completion and the habit's refreshed streaks to listeners."""
+        # Streaks cost a query, so skip them when nobody is listening.
+        if not broker.has_subscribers(habit.user_id):
+            return
+        streaks = AnalyticsService(self.db, habit.user_id).calculate_streaks(habit.id)
+        broker.publish(
+            habit.user_id,
+            "completion_added",
+            {
+                "habit_id": habit.id,
+                "completion": serialize_completion(completion),
+                "completed": True,
+                **streaks,
+            },
+        )
+
+    def _timezone_for(self, user_id: int | None) -> str:
+        """Return the timezone name configured for a user, defaulting to UTC."""
+        tz_name = (
+            self.db.query(models.UserPreferences.timezone)
+            .filter(models.UserPreferences.user_id == user_id)
+            .scalar()
+        )
+        return tz_name or periods.DEFAULT_TIMEZONE
 
     def _already_completed_in_period(
         self, habit_id: int, periodicity: models.Periodicity, target_date: datetime.date
     ) -> bool:
-        """Check if habit was already completed in the current period."""
+        """Check if habit was already completed in the period containing
+        ``target_date``, a date in the owner's timezone."""
+        cached = completion_index.completed_in_period(
+            habit_id, periodicity, target_date
+        )
+        if cached is not None:
+            return cached
+
         if periodicity == models.Periodicity.DAILY:
-            # Check if completed today
-            start_of_day = datetime.datetime.combine(target_date, datetime.time.min)
-            end_of_day = datetime.datetime.combine(target_date, datetime.time.max)
-
-            existing = (
-                self.db.query(models.Completion)
-                .filter(
-                    models.Completion.habit_id == habit_id,
-                    models.Completion.completed_at >= start_of_day,
-                    models.Completion.completed_at <= end_of_day,
-                )
-                .first()
+            # Check if completed on the same local day
+            period_filter = models.Completion.day_ordinal == periods.day_ordinal(
+                target_date
             )
-
         elif periodicity == models.Periodicity.WEEKLY:
             # Check if completed this week (Monday to Sunday - ISO week standard)
             # This ensures Saturday and Sunday are in the same week for better UX
-            days_since_monday = target_date.weekday()  # Monday = 0, Sunday = 6
-            start_of_week = target_date - datetime.timedelta(days=days_since_monday)
-            end_of_week = start_of_week + datetime.timedelta(days=6)
-
-            start_of_week_dt = datetime.datetime.combine(
-                start_of_week, datetime.time.min
-            )
-            end_of_week_dt = datetime.datetime.combine(end_of_week, datetime.time.max)
-
-            existing = (
-                self.db.query(models.Completion)
-                .filter(
-                    models.Completion.habit_id == habit_id,
-                    models.Completion.completed_at >= start_of_week_dt,
-                    models.Completion.completed_at <= end_of_week_dt,
-                )
-                .first()
+            period_filter = (
+                models.Completion.iso_week_ordinal
+                == periods.iso_week_ordinal(target_date)
             )
         else:
-            existing = None
+            return False
 
+        existing = (
+            self.db.query(models.Completion.id)
+            .filter(models.Completion.habit_id == habit_id, period_filter)
+            .first()
+        )
         return existing is not None
 
     def is_habit_completed_today(self, habit_id: int) -> bool:
@@ -142,25 +269,85 @@ class HabitService:
         if not habit:
             return False
 
-        today = datetime.datetime.now(datetime.timezone.utc).date()
+        today = periods.local_today(self._timezone_for(habit.user_id))
         return self._already_completed_in_period(habit_id, habit.periodicity, today)
 
+    def get_completion_status(
+        self,
+        habit_ids: list[int] | None = None,
+        target_date: datetime.date | None = None,
+    ) -> dict[int, bool]:
+        """Map each habit (all, or the given ids) to whether it is completed in
+        the period containing ``target_date`` (default: today), in one query.
+
+        Dates follow this service's user's timezone.
+        """
+        if target_date is None:
+            target_date = periods.local_today(self._timezone_for(self.user_id))
+
+        # Same period keys as _already_completed_in_period, matched per habit
+        in_period = and_(
+            models.Completion.habit_id == models.Habit.id,
+            or_(
+                and_(
+                    models.Habit.periodicity == models.Periodicity.DAILY,
+                    models.Completion.day_ordinal == periods.day_ordinal(target_date),
+                ),
+                and_(
+                    models.Habit.periodicity == models.Periodicity.WEEKLY,
+                    models.Completion.iso_week_ordinal
+                    == periods.iso_week_ordinal(target_date),
+                ),
+            ),
+        )
+        query = (
+            self._habits_query()
+            .with_entities(models.Habit.id, func.count(models.Completion.id))
+            .outerjoin(models.Completion, in_period)
+            .group_by(models.Habit.id)
+        )
+        if habit_ids is not None:
+            query = query.filter(models.Habit.id.in_(habit_ids))
+        return {habit_id: count > 0 for habit_id, count in query.all()}
+
     def get_user_preferences(self):
         """Get user preferences, creating default if none exist."""
-        preferences = self.db.query(models.UserPreferences).first()
+        preferences = (
+            self.db.query(models.UserPreferences)
+            .filter(models.UserPreferences.user_id == self.user_id)
+            .first()
+        )
+        if not preferences and self.user_id == NO_USER_ID:
+            # Nobody to save them for, so hand back the defaults unsaved
+            columns = models.UserPreferences.__table__.c
+            now = models.utc_timestamp()
+            return models.UserPreferences(
+                struggle_threshold=columns.struggle_threshold.default.arg,
+                show_bottom_percent=columns.show_bottom_percent.default.arg,
+                timezone=columns.timezone.default.arg,
+                created_at=now,
+                updated_at=now,
+            )
         if not preferences:
-            preferences = models.UserPreferences()
+            preferences = models.UserPreferences(user_id=self.user_id)
             self.db.add(preferences)
             self.db.commit()
-            self.db.refresh(preferences)
         return preferences
 
     def update_user_preferences(
-        self, struggle_threshold: float = None, show_bottom_percent: float = None
+        self,
+        struggle_threshold: float = None,
+        show_bottom_percent: float = None,
+        timezone: str = None,
     ):
         """Update user preferences."""
         preferences = self.get_user_preferences()
 
+        if timezone is not None:
+            # Raises ValueError for unknown timezone names
+            periods.get_zone(timezone)
+            preferences.timezone = timezone
+
         if struggle_threshold is not None:
             # Clamp between 0.1 and 1.0
             preferences.struggle_threshold = max(0.1, min(1.0, struggle_threshold))
@@ -170,5 +357,4 @@ class HabitService:
             preferences.show_bottom_percent = max(0.1, min(1.0, show_bottom_percent))
 
         self.db.commit()
-        self.db.refresh(preferences)
         return preferences
@@ -0,0 +1,108 @@
+import functools
+import threading
+
+
+class _Call:
+    """One in-flight computation and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key share one computation.
+
+    Only calls that overlap in time are coalesced; nothing is cached once
+    the computation finishes. Coalescing is per worker process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self._counts: dict[str, list[int]] = {}
+
+    def do(self, key: str, fn, name: str = "default"):
+        """Return ``fn()``, or the result of an identical call in flight."""
+        with self._lock:
+            counts = self._counts.setdefault(name, [0, 0])
+            counts[0] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                counts[1] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def metrics(self) -> dict:
+        """Calls, coalesced calls and hit rate, overall and per name."""
+        with self._lock:
+            by_name = {
+                name: {
+                    "calls": calls,
+                    "coalesced": coalesced,
+                    "hit_rate": coalesced / calls if calls else 0.0,
+                }
+                for name, (calls, coalesced) in self._counts.items()
+            }
+            in_flight = len(self._calls)
+        calls = sum(m["calls"] for m in by_name.values())
+        coalesced = sum(m["coalesced"] for m in by_name.values())
+        return {
+            "calls": calls,
+            "coalesced": coalesced,
+            "hit_rate": coalesced / calls if calls else 0.0,
+            "in_flight": in_flight,
+            "by_method": by_name,
+        }
+
+    def reset(self):
+        """Clear the counters."""
+        with self._lock:
+            self._counts = {}
+
+
+analytics_flights = SingleFlight()
+
+
+def coalesce(method):
+    """Share the result of concurrent identical calls of a service method.
+
+    Calls match on the method, the service's database and user, and the
+    arguments. Coalesced callers receive the same object, so results must
+    be treated as read-only.
+    """
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = repr(
+            (
+                name,
+                str(self.db.get_bind().engine.url),
+                self.user_id,
+                args,
+                sorted(kwargs.items()),
+            )
+        )
+        return analytics_flights.do(key, lambda: method(self, *args, **kwargs), name)
+
+    return wrapper
@@ -0,0 +1,47 @@
+import base64
+
+import numpy as np
+
+# One bit per day of a (leap) year, Jan 1 first; 46 bytes per habit-year.
+YEAR_BITS = 366
+
+ENCODINGS = ("bitmap", "rle")
+
+
+def year_bitmap(days) -> bytes:
+    """Pack zero-based days of the year into a 366-bit, most significant
+    bit first bitmap."""
+    bits = np.zeros(YEAR_BITS, dtype=bool)
+    bits[np.asarray(days, dtype=np.int64)] = True
+    return np.packbits(bits).tobytes()
+
+
+def encode_bitmap(days) -> str:
+    """Base64 text of ``year_bitmap(days)``."""
+    return base64.b64encode(year_bitmap(days)).decode("ascii")
+
+
+def decode_bitmap(encoded: str) -> list[int]:
+    """Zero-based days of the year set in an ``encode_bitmap`` string."""
+    packed = np.frombuffer(base64.b64decode(encoded), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed)[:YEAR_BITS]).tolist()
+
+
+def run_lengths(days) -> list[list[int]]:
+    """``[first_day, length]`` for every run of consecutive days."""
+    days = np.unique(np.asarray(days, dtype=np.int64))
+    if days.size == 0:
+        return []
+    # A run starts wherever a day does not follow the previous one
+    starts = np.flatnonzero(np.diff(days, prepend=days[0] - 2) != 1)
+    lengths = np.diff(np.append(starts, days.size))
+    return [[int(days[s]), int(n)] for s, n in zip(starts, lengths)]
+
+
+def encode_days(days, encoding: str):
+    """Encode zero-based days of the year as named by ``ENCODINGS``."""
+    if encoding == "bitmap":
+        return encode_bitmap(days)
+    if encoding == "rle":
+        return run_lengths(days)
+    raise ValueError(f"Unknown encoding: {encoding}")
@@ -0,0 +1,179 @@
+"""Compare request latency of the Flask (WSGI) and ASGI servers.
+
+Starts each server on a throwaway SQLite database seeded with a few habits,
+opens ``--connections`` concurrent clients that each send ``--requests`` GET
+requests over a keep-alive connection (reconnecting when the server closes
+it), and prints latency percentiles per server:
+
+    pip install -e ".[async]"
+    python loadtest.py --connections 1000 --requests 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from habittracker.database import create_database_engine
+from habittracker.models import Base, Completion, Habit, Periodicity, User
+
+PATHS = ("/api/habits", "/api/habits/1", "/api/habits/completed-status")
+
+
+def seed(db_url: str, habits: int):
+    engine = create_database_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"username": "default"}])
+        conn.execute(
+            Habit.__table__.insert(),
+            [
+                {"name": f"Habit {i}", "periodicity": Periodicity.DAILY, "user_id": 1}
+                for i in range(habits)
+            ],
+        )
+        conn.execute(Completion.__table__.insert(), [{"habit_id": 1, "user_id": 1}])
+    engine.dispose()
+
+
+def start_server(kind: str, db_url: str, port: int) -> subprocess.Popen:
+    if kind == "flask":
+        command = [
+            sys.executable,
+            "-m",
+            "flask",
+            "--app",
+            f"habittracker.app:create_app('{db_url}')",
+            "run",
+            "--with-threads",
+            "--port",
+            str(port),
+        ]
+    else:
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "--factory",
+            "habittracker.asgi:create_asgi_app",
+            "--port",
+            str(port),
+            "--backlog",
+            "4096",
+            "--log-level",
+            "warning",
+        ]
+    return subprocess.Popen(
+        command,
+        env={**os.environ, "DATABASE_URL": db_url},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_ready(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+async def read_response(reader: asyncio.StreamReader):
+    """Read one response; returns its status and whether the connection can
+    be reused (the Werkzeug server closes after every response)."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length, keep_alive = 0, True
+    for line in head.lower().split(b"\r\n"):
+        if line.startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+        elif line == b"connection: close":
+            keep_alive = False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def client(port: int, requests: int, latencies: list, errors: list, index: int):
+    writer = None
+    try:
+        for i in range(requests):
+            path = PATHS[(index + i) % len(PATHS)]
+            started = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii")
+            )
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+    except (OSError, asyncio.IncompleteReadError) as e:
+        errors.append(e)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def run_load(port: int, connections: int, requests: int):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(port, requests, latencies, errors, i) for i in range(connections))
+    )
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(values: list, q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--habits", type=int, default=20)
+    parser.add_argument("--servers", nargs="+", default=["flask", "asgi"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{Path(tmp) / 'loadtest.db'}"
+        seed(db_url, args.habits)
+        print(f"{args.connections} connections x {args.requests} requests")
+        print(
+            f"{'server':8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>7}"
+        )
+        for port, kind in enumerate(args.servers, start=18100):
+            server = start_server(kind, db_url, port)
+            try:
+                asyncio.run(wait_until_ready(port))
+                latencies, errors, elapsed = asyncio.run(
+                    run_load(port, args.connections, args.requests)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+            print(
+                f"{kind:8} {len(latencies) / elapsed:8.0f} "
+                f"{percentile(latencies, 50):8.1f} {percentile(latencies, 95):8.1f} "
+                f"{percentile(latencies, 99):8.1f} {len(errors):7d}"
+            )
+
+
+if __name__ == "__main__":
+    main()
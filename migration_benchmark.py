@@ -0,0 +1,124 @@
+"""Benchmark the completion migrations on a synthetic database.
+
+Builds a database at the revision before the completion clean-up, fills it
+with ``--rows`` completions (about 1% of them same-day duplicates), then
+times ``alembic upgrade head`` while another connection keeps writing, and
+reports the longest that writer waited for the database lock:
+
+    python migration_benchmark.py --rows 10000000
+    python migration_benchmark.py --rows 10000000 --batch-size 100000000
+
+The second run uses a single batch, which locks like the old migrations.
+Table rebuilds (``batch_alter_table``) still hold the lock throughout.
+"""
+
+import argparse
+import datetime
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from alembic.config import Config
+
+from alembic import command
+from habittracker import migrations
+
+START_REVISION = "2dff08cdcd78"
+
+
+def build(path: Path, rows: int, habits: int):
+    config = _config(path)
+    command.upgrade(config, START_REVISION)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executemany(
+        "INSERT INTO habits (id, name, periodicity, created_at) VALUES (?, ?, ?, ?)",
+        [
+            (i, f"Habit {i}", "DAILY", "2000-01-01 00:00:00")
+            for i in range(1, habits + 1)
+        ],
+    )
+    rng = random.Random(0)
+    start = datetime.datetime(2000, 1, 1)
+    per_habit = rows // habits
+    chunk = []
+    for i in range(rows):
+        habit_id = i % habits + 1
+        day = i // habits
+        if rng.random() < 0.01:
+            day = max(0, day - 1)  # a second completion on the previous day
+        moment = start + datetime.timedelta(days=day % (per_habit + 1), hours=8)
+        chunk.append((habit_id, moment.isoformat(" ")))
+        if len(chunk) == 100_000:
+            conn.executemany(
+                "INSERT INTO completions (habit_id, completed_at) VALUES (?, ?)", chunk
+            )
+            chunk.clear()
+    if chunk:
+        conn.executemany(
+            "INSERT INTO completions (habit_id, completed_at) VALUES (?, ?)", chunk
+        )
+    conn.execute("CREATE TABLE benchmark_probe (at TEXT)")
+    conn.commit()
+    conn.close()
+
+
+def probe(path: Path, stop: threading.Event, waits: list):
+    """Write once every 100ms and record how long each write took."""
+    conn = sqlite3.connect(path, timeout=3600)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("INSERT INTO benchmark_probe (at) VALUES (CURRENT_TIMESTAMP)")
+        conn.commit()
+        waits.append(time.perf_counter() - started)
+        stop.wait(0.1)
+    conn.close()
+
+
+def _config(path: Path) -> Config:
+    config = Config(str(Path(__file__).with_name("alembic.ini")))
+    config.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--habits", type=int, default=1_000)
+    parser.add_argument("--batch-size", type=int, default=migrations.BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=migrations.BATCH_PAUSE)
+    args = parser.parse_args()
+    migrations.BATCH_SIZE = args.batch_size
+    migrations.BATCH_PAUSE = args.pause
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "benchmark.db"
+        started = time.perf_counter()
+        build(path, args.rows, args.habits)
+        print(
+            f"built {args.rows:,} completions in {time.perf_counter() - started:.1f}s"
+        )
+
+        stop, waits = threading.Event(), []
+        writer = threading.Thread(target=probe, args=(path, stop, waits))
+        writer.start()
+        started = time.perf_counter()
+        try:
+            command.upgrade(_config(path), "head")
+        finally:
+            elapsed = time.perf_counter() - started
+            stop.set()
+            writer.join()
+        print(
+            f"upgrade to head: {elapsed:.1f}s with batch size {args.batch_size:,}; "
+            f"concurrent writes: {len(waits)}, longest wait {max(waits):.2f}s, "
+            f"writes waiting over 1s: {sum(w > 1 for w in waits)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measure cold start of the Flask server to its first served request.
+
+Times, from launching the first process until ``GET /api/habits`` returns
+200, the old container start (``alembic upgrade head`` and ``seed.py`` in
+their own interpreters, then the server) and the boot routine of
+``create_app`` on a fresh database and on an up-to-date one:
+
+    python startup_benchmark.py --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+PORT = 18200
+
+
+def run_server(cwd: Path, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "flask", "run", "--port", str(PORT)],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for_first_request(timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{PORT}/api/habits") as r:
+                if r.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    raise RuntimeError("Server did not serve a request")
+
+
+def cold_start(cwd: Path, env: dict, legacy: bool) -> float:
+    started = time.perf_counter()
+    if legacy:
+        config = str(ROOT / "alembic.ini")
+        alembic = [sys.executable, "-m", "alembic", "-c", config, "upgrade", "head"]
+        for command in (alembic, [sys.executable, str(ROOT / "seed.py")]):
+            subprocess.run(command, cwd=cwd, env=env, check=True, capture_output=True)
+    server = run_server(cwd, env)
+    try:
+        wait_for_first_request()
+        return time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = {
+        **os.environ,
+        "FLASK_APP": "habittracker.app:create_app",
+        "PYTHONPATH": str(ROOT),
+    }
+    boot_env = {**env, "AUTO_MIGRATE": "1", "SEED_SAMPLE_DATA": "1"}
+    scenarios = (
+        ("alembic + seed.py + server", env, True, True),
+        ("boot, fresh database", boot_env, False, True),
+        ("boot, up-to-date database", boot_env, False, False),
+    )
+    print(f"{'start':28} {'median s':>9} {'max s':>7}")
+    for name, scenario_env, legacy, fresh in scenarios:
+        timings = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for _ in range(args.runs):
+                if fresh:
+                    (Path(tmp) / "habittracker.db").unlink(missing_ok=True)
+                timings.append(cold_start(Path(tmp), scenario_env, legacy))
+        print(f"{name:28} {statistics.median(timings):9.2f} {max(timings):7.2f}")
+
+
+if __name__ == "__main__":
+    main()
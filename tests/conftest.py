@@ -1,45 +1,77 @@
+import os
+
 import pytest
+from sqlalchemy import event
 
 from habittracker import database
 from habittracker.app import create_app
 from habittracker.models import Base
 
 
+def _enable_savepoints(engine):
+    """Let pysqlite run SAVEPOINTs: SQLAlchemy emits BEGIN itself instead of
+    the driver starting transactions implicitly."""
+
+    @event.listens_for(engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
 @pytest.fixture(scope="session")
-def app():
-    """Fixture to create a Flask app instance for the test session."""
-    app = create_app(db_url="sqlite:///:memory:")
+def app(tmp_path_factory):
+    """Fixture to create a Flask app instance for the test session.
+
+    The schema is created once. Parallel workers (pytest-xdist) each get
+    their own database file; a single process uses an in-memory database.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker:
+        db_url = f"sqlite:///{tmp_path_factory.mktemp('db') / f'{worker}.db'}"
+    else:
+        db_url = "sqlite:///:memory:"
+    app = create_app(db_url=db_url)
     app.config.update({"TESTING": True})
+    _enable_savepoints(database.engine)
+    Base.metadata.create_all(bind=database.engine)
     return app
 
 
 @pytest.fixture(scope="function")
-def db_session(app):
+def connection(app):
+    """
+    Run the test inside a transaction that is rolled back afterwards.
+    Sessions from ``SessionLocal``, including the request sessions from
+    ``get_db``, join it through a SAVEPOINT, so their commits and rollbacks
+    stay inside the test.
+    """
+    connection = database.engine.connect()
+    transaction = connection.begin()
+    database.SessionLocal.configure(
+        bind=connection, join_transaction_mode="create_savepoint"
+    )
+
+    yield connection
+
+    database.SessionLocal.configure(bind=database.engine)
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def db_session(app, connection):
     """Create a database session for testing."""
     with app.app_context():
-        # Create all tables using the app's configured engine
-        Base.metadata.create_all(bind=database.engine)
-
         session = database.SessionLocal()
         yield session
-
-        session.rollback()  # Rollback any changes
         session.close()
-        # Drop all tables after the test is done
-        Base.metadata.drop_all(bind=database.engine)
 
 
 @pytest.fixture(scope="function")
-def client(app):
-    """
-    A test client for the app. This fixture also handles creating
-    and dropping database tables for each test.
-    """
+def client(app, connection):
+    """A test client for the app, isolated by the ``connection`` fixture."""
     with app.app_context():
-        # Create all tables using the app's configured engine
-        Base.metadata.create_all(bind=database.engine)
-
         yield app.test_client()  # The tests run here
-
-        # Drop all tables after the test is done
-        Base.metadata.drop_all(bind=database.engine)
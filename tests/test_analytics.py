@@ -1,8 +1,16 @@
+import datetime
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import pytest
+from sqlalchemy.orm import sessionmaker
 
+from habittracker import analytics, periods, timeseries
 from habittracker.analytics import AnalyticsService
-from habittracker.models import Completion, Habit, Periodicity
+from habittracker.database import create_database_engine
+from habittracker.models import Base, Completion, Habit, Periodicity, User
 
 
 class TestAnalyticsService:
@@ -20,6 +28,22 @@ class TestAnalyticsService:
         assert daily_df.shape[0] == 1
         assert daily_df.iloc[0]["name"] == "Exercise"
 
+    def test_frames_use_compact_dtypes(self, db_session):
+        habit = Habit(name="Read", periodicity=Periodicity.WEEKLY)
+        db_session.add(habit)
+        db_session.commit()
+        db_session.add(Completion(habit_id=habit.id))
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        habits = service.list_habits()
+        assert habits["id"].dtype == "int32"
+        assert isinstance(habits["periodicity"].dtype, pd.CategoricalDtype)
+        assert habits["created_at"].dtype == "datetime64[s]"
+        counts = service._completion_counts()
+        assert counts["habit_id"].dtype == "int32"
+        assert counts["local_date"].dtype == "datetime64[s]"
+
     def test_calculate_streaks(self, db_session):
         habit = Habit(name="Meditate", periodicity=Periodicity.DAILY)
         db_session.add(habit)
@@ -279,3 +303,531 @@ class TestAnalyticsService:
             today=today, threshold=0.75, quartile=0.25
         )
         assert len(struggled) == 0
+
+    def test_user_scoping(self, db_session):
+        alice = User(username="alice")
+        bob = User(username="bob")
+        db_session.add_all([alice, bob])
+        db_session.commit()
+
+        h1 = Habit(name="Run", periodicity=Periodicity.DAILY, user_id=alice.id)
+        h2 = Habit(name="Swim", periodicity=Periodicity.DAILY, user_id=bob.id)
+        db_session.add_all([h1, h2])
+        db_session.commit()
+        db_session.add(
+            Completion(habit_id=h2.id, completed_at=pd.Timestamp("2024-01-01"))
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session, alice.id)
+        assert list(service.list_habits()["name"]) == ["Run"]
+        assert list(service.overall_completion_rate()["name"]) == ["Run"]
+        assert service.calculate_streaks(h2.id) == {
+            "longest_streak": 0,
+            "current_streak": 0,
+        }
+
+    def test_calculate_streaks_weekly_uses_iso_weeks(self, db_session):
+        habit = Habit(name="Shop", periodicity=Periodicity.WEEKLY)
+        db_session.add(habit)
+        db_session.commit()
+
+        # Monday of week 1, Sunday of week 2, then a skipped week
+        dates = [
+            pd.Timestamp("2024-01-01"),
+            pd.Timestamp("2024-01-14"),
+            pd.Timestamp("2024-01-22"),
+        ]
+        db_session.add_all(
+            [Completion(habit_id=habit.id, completed_at=d) for d in dates]
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        result = service.calculate_streaks(habit.id, today=pd.Timestamp("2024-02-02"))
+        assert result["longest_streak"] == 2
+        assert result["current_streak"] == 1
+
+    def test_best_and_worst_day_uses_local_dates(self, db_session):
+        habit = Habit(name="Weekly", periodicity=Periodicity.WEEKLY)
+        db_session.add(habit)
+        db_session.commit()
+
+        # Late Sunday evening UTC, but recorded as Monday in the user's zone
+        db_session.add(
+            Completion(
+                habit_id=habit.id,
+                completed_at=pd.Timestamp("2024-01-07 23:30"),
+                local_date=pd.Timestamp("2024-01-08").date(),
+            )
+        )
+        db_session.commit()
+
+        res = AnalyticsService(db_session).best_and_worst_day(habit.id)
+        assert res["best_day"] == "Monday"
+
+    def test_dashboard_matches_individual_analytics(self, db_session):
+        today = pd.Timestamp("2024-01-31")
+        daily = Habit(
+            name="Daily",
+            periodicity=Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-01"),
+        )
+        weekly = Habit(
+            name="Weekly",
+            periodicity=Periodicity.WEEKLY,
+            created_at=pd.Timestamp("2023-12-01"),
+        )
+        idle = Habit(
+            name="Idle",
+            periodicity=Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-20"),
+        )
+        db_session.add_all([daily, weekly, idle])
+        db_session.commit()
+
+        daily_dates = ["2024-01-02", "2024-01-03", "2024-01-30", "2024-01-31"]
+        weekly_dates = ["2024-01-01", "2024-01-03", "2024-01-10", "2024-01-29"]
+        db_session.add_all(
+            [
+                Completion(habit_id=daily.id, completed_at=pd.Timestamp(d))
+                for d in daily_dates
+            ]
+            + [
+                Completion(habit_id=weekly.id, completed_at=pd.Timestamp(d))
+                for d in weekly_dates
+            ]
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        dashboard = service.dashboard(today=today, threshold=0.75, quartile=1.0)
+
+        rates = service.overall_completion_rate(today=today).set_index("id")
+        struggled = service.identify_struggled_habits(
+            today=today, threshold=0.75, quartile=1.0
+        )
+        assert dashboard["struggled"] == struggled.to_dict("records")
+
+        by_id = {h["id"]: h for h in dashboard["habits"]}
+        for habit in (daily, weekly, idle):
+            row = by_id[habit.id]
+            streaks = service.calculate_streaks(habit.id, today=today)
+            days = service.best_and_worst_day(habit.id)
+            assert row["current_streak"] == streaks["current_streak"]
+            assert row["longest_streak"] == streaks["longest_streak"]
+            assert row["best_day"] == days["best_day"]
+            assert row["worst_day"] == days["worst_day"]
+            assert row["completion_rate"] == pytest.approx(
+                rates.at[habit.id, "completion_rate"]
+            )
+
+        assert by_id[daily.id]["completed"] is True
+        assert by_id[weekly.id]["completed"] is True
+        assert by_id[idle.id]["completed"] is False
+        assert dashboard["summary"]["total_habits"] == 3
+        assert dashboard["summary"]["longest_streak"] == 2
+
+    def test_dashboard_empty(self, db_session):
+        dashboard = AnalyticsService(db_session).dashboard()
+        assert dashboard == {
+            "habits": [],
+            "struggled": [],
+            "summary": {
+                "total_habits": 0,
+                "average_completion_rate": 0.0,
+                "longest_streak": 0,
+            },
+        }
+
+    def test_calculate_streaks_within_window(self, db_session):
+        habit = Habit(name="Stretch", periodicity=Periodicity.DAILY)
+        db_session.add(habit)
+        db_session.commit()
+
+        dates = pd.date_range("2024-01-01", "2024-01-05").append(
+            pd.DatetimeIndex(["2024-01-09", "2024-01-10"])
+        )
+        db_session.add_all(
+            [Completion(habit_id=habit.id, completed_at=d) for d in dates]
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        result = service.calculate_streaks(
+            habit.id,
+            today=pd.Timestamp("2024-02-01"),
+            start=datetime.date(2024, 1, 4),
+            end=datetime.date(2024, 1, 10),
+        )
+        # Only Jan 4-5 of the first run fall inside the window, and the
+        # current streak is measured as of the window's end
+        assert result == {"longest_streak": 2, "current_streak": 2}
+
+    def test_calculate_streaks_monthly_granularity(self, db_session):
+        habit = Habit(name="Budget", periodicity=Periodicity.WEEKLY)
+        db_session.add(habit)
+        db_session.commit()
+
+        dates = ["2024-01-03", "2024-02-20", "2024-03-01", "2024-05-02"]
+        db_session.add_all(
+            [Completion(habit_id=habit.id, completed_at=pd.Timestamp(d)) for d in dates]
+        )
+        db_session.commit()
+
+        result = AnalyticsService(db_session).calculate_streaks(
+            habit.id, today=pd.Timestamp("2024-05-10"), granularity="month"
+        )
+        assert result == {"longest_streak": 3, "current_streak": 1}
+
+    def test_identify_struggled_habits_custom_window(self, db_session):
+        created = pd.Timestamp("2024-01-01")
+        early = Habit(name="Early", periodicity=Periodicity.DAILY, created_at=created)
+        late = Habit(name="Late", periodicity=Periodicity.DAILY, created_at=created)
+        db_session.add_all([early, late])
+        db_session.commit()
+
+        # Early only completed in the first week, Late only in the last
+        db_session.add_all(
+            [
+                Completion(habit_id=early.id, completed_at=d)
+                for d in pd.date_range("2024-01-01", "2024-01-07")
+            ]
+            + [
+                Completion(habit_id=late.id, completed_at=d)
+                for d in pd.date_range("2024-01-24", "2024-01-30")
+            ]
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        df = service.identify_struggled_habits(
+            today=pd.Timestamp("2024-01-31"),
+            quartile=1.0,
+            start=datetime.date(2024, 1, 1),
+            end=datetime.date(2024, 1, 7),
+        )
+        assert list(df["name"]) == ["Late"]
+
+    def test_overall_completion_rate_within_window(self, db_session):
+        habit = Habit(
+            name="Walk",
+            periodicity=Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-01"),
+        )
+        db_session.add(habit)
+        db_session.commit()
+        db_session.add_all(
+            [
+                Completion(habit_id=habit.id, completed_at=d)
+                for d in pd.date_range("2024-01-01", "2024-01-03")
+            ]
+        )
+        db_session.commit()
+
+        df = AnalyticsService(db_session).overall_completion_rate(
+            today=pd.Timestamp("2024-02-01"),
+            start=datetime.date(2024, 1, 3),
+            end=datetime.date(2024, 1, 6),
+        )
+        # One completion in the four days Jan 3-6
+        assert df["completion_rate"].iloc[0] == pytest.approx(1 / 3, rel=1e-3)
+
+    def test_overall_completion_rate_of_habit_created_after_window(self, db_session):
+        habit = Habit(
+            name="New",
+            periodicity=Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-10"),
+        )
+        db_session.add(habit)
+        db_session.commit()
+
+        df = AnalyticsService(db_session).overall_completion_rate(
+            today=pd.Timestamp("2024-02-01"), end=datetime.date(2024, 1, 6)
+        )
+        rate = df["completion_rate"].iloc[0]
+        assert rate == 0 and math.copysign(1, rate) == 1
+
+    def test_completion_rate_series(self, db_session):
+        daily = Habit(
+            name="Daily",
+            periodicity=Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-01"),
+        )
+        weekly = Habit(
+            name="Weekly",
+            periodicity=Periodicity.WEEKLY,
+            created_at=pd.Timestamp("2024-01-01"),
+        )
+        db_session.add_all([daily, weekly])
+        db_session.commit()
+        db_session.add_all(
+            [
+                Completion(habit_id=daily.id, completed_at=pd.Timestamp("2024-01-02")),
+                Completion(habit_id=daily.id, completed_at=pd.Timestamp("2024-01-09")),
+                Completion(habit_id=weekly.id, completed_at=pd.Timestamp("2024-01-03")),
+            ]
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        weeks = service.completion_rate_series(
+            "week",
+            today=pd.Timestamp("2024-02-01"),
+            start=datetime.date(2024, 1, 1),
+            end=datetime.date(2024, 1, 14),
+        )
+        rows = {(r["name"], r["period"]): r for r in weeks.to_dict("records")}
+        assert set(rows) == {
+            ("Daily", "2024-W01"),
+            ("Daily", "2024-W02"),
+            ("Weekly", "2024-W01"),
+            ("Weekly", "2024-W02"),
+        }
+        assert rows[("Daily", "2024-W01")]["completed"] == 1
+        assert rows[("Daily", "2024-W01")]["expected"] == pytest.approx(7)
+        assert rows[("Weekly", "2024-W01")]["completion_rate"] == pytest.approx(1.0)
+        assert rows[("Weekly", "2024-W02")]["completion_rate"] == 0
+
+        months = service.completion_rate_series(
+            "month",
+            today=pd.Timestamp("2024-02-01"),
+            start=datetime.date(2024, 1, 1),
+            end=datetime.date(2024, 1, 31),
+        )
+        daily_row = months[months["name"] == "Daily"].iloc[0]
+        assert daily_row["period"] == "2024-01"
+        assert daily_row["completion_rate"] == pytest.approx(2 / 31, rel=1e-3)
+
+        days = service.completion_rate_series(
+            "day",
+            today=pd.Timestamp("2024-02-01"),
+            start=datetime.date(2024, 1, 2),
+            end=datetime.date(2024, 1, 2),
+        )
+        daily_row = days[days["name"] == "Daily"].iloc[0]
+        assert daily_row["period"] == "2024-01-02"
+        assert daily_row["completion_rate"] == 1.0
+
+    def test_completion_timeseries(self, db_session):
+        h1 = Habit(name="Run", periodicity=Periodicity.DAILY)
+        h2 = Habit(name="Idle", periodicity=Periodicity.DAILY)
+        db_session.add_all([h1, h2])
+        db_session.commit()
+        dates = ["2023-12-31", "2024-01-01", "2024-01-02", "2024-01-05"]
+        db_session.add_all(
+            [Completion(habit_id=h1.id, completed_at=pd.Timestamp(d)) for d in dates]
+        )
+        db_session.commit()
+
+        service = AnalyticsService(db_session)
+        series = service.completion_timeseries()
+        assert [s["habit_id"] for s in series] == [h1.id, h2.id]
+        assert series[1]["years"] == {}
+        years = series[0]["years"]
+        assert timeseries.decode_bitmap(years["2023"]) == [364]
+        assert timeseries.decode_bitmap(years["2024"]) == [0, 1, 4]
+
+        rle = service.completion_timeseries(
+            [h1.id], start=datetime.date(2024, 1, 1), encoding="rle"
+        )
+        assert rle == [
+            {"habit_id": h1.id, "encoding": "rle", "years": {"2024": [[0, 2], [4, 1]]}}
+        ]
+
+    def test_batch_habit_analytics_serial(self, db_session):
+        daily = Habit(name="Daily", periodicity=Periodicity.DAILY)
+        weekly = Habit(name="Weekly", periodicity=Periodicity.WEEKLY)
+        db_session.add_all([daily, weekly])
+        db_session.commit()
+        db_session.add_all(
+            [
+                Completion(habit_id=weekly.id, completed_at=pd.Timestamp(d))
+                for d in ["2024-01-01", "2024-01-08", "2024-01-16"]
+            ]
+        )
+        db_session.commit()
+
+        df = AnalyticsService(db_session).batch_habit_analytics(
+            today=pd.Timestamp("2024-01-17"), workers=4
+        )
+        assert df.to_dict("records") == [
+            {
+                "id": daily.id,
+                "longest_streak": 0,
+                "current_streak": 0,
+                "best_day": None,
+                "worst_day": None,
+            },
+            {
+                "id": weekly.id,
+                "longest_streak": 3,
+                "current_streak": 3,
+                "best_day": "Monday",
+                "worst_day": "Tuesday",
+            },
+        ]
+
+
+def test_batch_habit_analytics_in_worker_processes(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        habits = [
+            Habit(
+                name=f"H{i}",
+                periodicity=Periodicity.WEEKLY if i % 3 else Periodicity.DAILY,
+            )
+            for i in range(12)
+        ]
+        session.add_all(habits)
+        session.commit()
+        session.add_all(
+            [
+                Completion(habit_id=habit.id, completed_at=day)
+                for habit in habits
+                for day in pd.date_range("2024-01-01", periods=habit.id * 2, freq="2D")
+            ]
+        )
+        session.commit()
+
+        service = AnalyticsService(session)
+        today = pd.Timestamp("2024-02-01")
+        parallel = service.batch_habit_analytics(today=today, workers=2, chunk_size=5)
+        serial = service.batch_habit_analytics(today=today, workers=1)
+    engine.dispose()
+
+    assert parallel.to_dict("records") == serial.to_dict("records")
+    assert len(parallel) == 12
+
+
+def test_habit_report_in_worker_processes(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'report.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        habits = [
+            Habit(
+                name=f"H{i}",
+                periodicity=Periodicity.WEEKLY if i % 3 else Periodicity.DAILY,
+                created_at=pd.Timestamp("2023-12-01"),
+            )
+            for i in range(12)
+        ]
+        session.add_all(habits)
+        session.commit()
+        session.add_all(
+            [
+                Completion(habit_id=habit.id, completed_at=day)
+                for habit in habits
+                for day in pd.date_range("2024-01-01", periods=habit.id * 2, freq="2D")
+            ]
+        )
+        session.commit()
+
+        service = AnalyticsService(session)
+        today = pd.Timestamp("2024-02-01")
+        parallel = list(service.habit_report(today, workers=2, chunk_size=5))
+        serial = pd.concat(service.habit_report(today, workers=1), ignore_index=True)
+    engine.dispose()
+
+    assert [len(frame) for frame in parallel] == [5, 5, 2]
+    pd.testing.assert_frame_equal(pd.concat(parallel, ignore_index=True), serial)
+
+
+def test_chunked_analytics_match_a_single_pass(db_session, monkeypatch):
+    today = pd.Timestamp("2024-03-31 12:00")
+    habits = [
+        Habit(
+            name=f"H{i}",
+            periodicity=Periodicity.WEEKLY if i % 3 else Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-01") + pd.Timedelta(days=i),
+        )
+        for i in range(8)
+    ]
+    db_session.add_all(habits)
+    db_session.commit()
+    db_session.add_all(
+        [
+            Completion(habit_id=habit.id, completed_at=day)
+            for habit in habits[1:]
+            for day in pd.date_range("2024-01-10", periods=habit.id * 3, freq="2D")
+        ]
+    )
+    db_session.commit()
+
+    service = AnalyticsService(db_session)
+
+    def results():
+        return (
+            service.dashboard(today, quartile=0.5),
+            service.overall_completion_rate(
+                today, start=datetime.date(2024, 2, 1)
+            ).to_dict("records"),
+            service.completion_rate_series("week", today).to_dict("records"),
+            service.completion_timeseries(encoding="rle"),
+            service.batch_habit_analytics(today, workers=1).to_dict("records"),
+        )
+
+    single_pass = results()
+    monkeypatch.setattr(analytics, "ANALYTICS_MEMORY_BUDGET_MB", 0)
+    monkeypatch.setattr(analytics, "MIN_CHUNK_ROWS", 5)
+    assert results() == single_pass
+
+
+def _dashboard_rss_growth(db_url: str, budget_mb: int) -> int:
+    """Peak RSS growth (in KiB on Linux) of one dashboard computation, run in
+    a fresh worker process so earlier peaks cannot hide it."""
+    import resource
+
+    analytics.ANALYTICS_MEMORY_BUDGET_MB = budget_mb
+    engine = create_database_engine(db_url)
+    with sessionmaker(bind=engine)() as session:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        AnalyticsService(session).dashboard(pd.Timestamp("2024-08-01"))
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    engine.dispose()
+    return after - before
+
+
+def _fill(db_url: str, habits: int, days: int):
+    engine = create_database_engine(db_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            Habit.__table__.insert(),
+            [
+                {"id": i, "name": f"H{i}", "periodicity": Periodicity.DAILY}
+                for i in range(1, habits + 1)
+            ],
+        )
+        for day in pd.date_range("2024-01-01", periods=days).date:
+            conn.execute(
+                Completion.__table__.insert(),
+                [
+                    {
+                        "habit_id": i,
+                        "completed_at": day,
+                        "local_date": day,
+                        "iso_week": periods.iso_week_key(day),
+                        "day_ordinal": periods.day_ordinal(day),
+                        "iso_week_ordinal": periods.iso_week_ordinal(day),
+                    }
+                    for i in range(1, habits + 1)
+                ],
+            )
+    engine.dispose()
+
+
+def test_dashboard_peak_memory_is_bounded_as_data_grows(tmp_path):
+    pytest.importorskip("resource")
+    budget_mb = 4
+    context = multiprocessing.get_context("spawn")
+    growth = []
+    for habits in (100, 1_000):
+        db_url = f"sqlite:///{tmp_path / f'{habits}.db'}"
+        _fill(db_url, habits, days=100)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            growth.append(pool.submit(_dashboard_rss_growth, db_url, budget_mb))
+    small, large = (future.result() for future in growth)
+    # Ten times the completions may not cost more than another budget's worth
+    assert large < small + budget_mb * 1024
@@ -1,3 +1,12 @@
+import datetime
+
+from sqlalchemy import event
+
+from habittracker import database, timeseries
+from habittracker.models import STALE_AS_OF, HabitStats, User, UserPreferences
+from habittracker.ranking import RankingService
+
+
 def test_get_all_habits(client):
     """Test that the API returns all habits successfully."""
     response = client.get("/api/habits")
@@ -172,6 +181,26 @@ def test_check_off_habit_conflict_when_already_completed(client):
     assert second_checkoff.json["error"] == "Habit already completed for this period"
 
 
+def test_check_off_survives_failing_post_commit_updates(client, monkeypatch):
+    """Test that a saved check-off is not failed by a stats update error, and
+    that the habit's stats are left stale for the next read."""
+    response = client.post(
+        "/api/habits", json={"name": "Stretch", "periodicity": "daily"}
+    )
+    habit_id = response.json["id"]
+    client.get("/api/analytics/habits/leaderboard")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("stats unavailable")
+
+    monkeypatch.setattr(RankingService, "record_completion", fail)
+    assert client.post(f"/api/habits/{habit_id}/checkoff").status_code == 201
+    assert client.post(f"/api/habits/{habit_id}/checkoff").status_code == 409
+    with database.SessionLocal() as db_session:
+        stats = db_session.get(HabitStats, habit_id)
+        assert stats.as_of == STALE_AS_OF
+
+
 def test_habit_completion_status_not_completed(client):
     """Test that completion status API returns false for uncompleted habit."""
     # Create a habit
@@ -452,3 +481,300 @@ def test_struggled_habits_query_param_override(client):
     # Override with query parameters
     response = client.get("/api/analytics/habits/struggled?threshold=0.8&quartile=0.25")
     assert response.status_code == 200
+
+
+def test_habits_are_scoped_to_user_header(client):
+    """Test that the X-User header isolates habits between users."""
+    response = client.post(
+        "/api/habits",
+        json={"name": "Alice Habit", "periodicity": "daily"},
+        headers={"X-User": "alice"},
+    )
+    habit_id = response.json["id"]
+    client.post(
+        "/api/habits",
+        json={"name": "Default Habit", "periodicity": "daily"},
+    )
+
+    alice_habits = client.get("/api/habits", headers={"X-User": "alice"}).json
+    default_habits = client.get("/api/habits").json
+
+    assert [h["name"] for h in alice_habits] == ["Alice Habit"]
+    assert [h["name"] for h in default_habits] == ["Default Habit"]
+    assert client.get(f"/api/habits/{habit_id}").status_code == 404
+    assert (
+        client.get(f"/api/habits/{habit_id}", headers={"X-User": "alice"}).status_code
+        == 200
+    )
+
+
+def test_reads_do_not_create_users(client):
+    """Test that reads by an unknown X-User see nothing and add no user."""
+    client.post("/api/habits", json={"name": "Mine", "periodicity": "daily"})
+    stranger = {"X-User": "stranger"}
+
+    assert client.get("/api/habits", headers=stranger).json == []
+    assert client.get("/api/habits/1", headers=stranger).status_code == 404
+    assert client.get("/api/dashboard", headers=stranger).status_code == 200
+    preferences = client.get("/api/preferences", headers=stranger).json
+    assert preferences["struggle_threshold"] == 0.75
+    assert preferences["timezone"] == "UTC"
+    with database.SessionLocal() as db_session:
+        assert db_session.query(User).filter_by(username="stranger").count() == 0
+        assert db_session.query(UserPreferences).count() == 0
+
+    client.post(
+        "/api/habits", json={"name": "Theirs", "periodicity": "daily"}, headers=stranger
+    )
+    assert [h["name"] for h in client.get("/api/habits", headers=stranger).json] == [
+        "Theirs"
+    ]
+
+
+def test_analytics_are_scoped_to_user_header(client):
+    """Test that analytics only include the requesting user's habits."""
+    client.post(
+        "/api/habits",
+        json={"name": "Alice Habit", "periodicity": "daily"},
+        headers={"X-User": "alice"},
+    )
+    client.post("/api/habits", json={"name": "Bob Habit", "periodicity": "daily"})
+
+    response = client.get(
+        "/api/analytics/habits/completion-rates", headers={"X-User": "alice"}
+    )
+    assert [h["name"] for h in response.json] == ["Alice Habit"]
+
+
+def test_update_preferences_timezone(client):
+    """Test that the timezone preference can be set and is validated."""
+    response = client.put("/api/preferences", json={"timezone": "Europe/Zagreb"})
+    assert response.status_code == 200
+    assert response.json["timezone"] == "Europe/Zagreb"
+
+    response = client.put("/api/preferences", json={"timezone": "Nowhere/Land"})
+    assert response.status_code == 400
+
+
+def test_get_dashboard(client):
+    """Test that the dashboard returns habits with status and analytics."""
+    daily = client.post(
+        "/api/habits", json={"name": "Daily Habit", "periodicity": "daily"}
+    ).json
+    client.post("/api/habits", json={"name": "Weekly Habit", "periodicity": "weekly"})
+    client.post(f"/api/habits/{daily['id']}/checkoff")
+
+    response = client.get("/api/dashboard")
+    assert response.status_code == 200
+
+    habits = {h["name"]: h for h in response.json["habits"]}
+    assert habits["Daily Habit"]["completed"] is True
+    assert habits["Daily Habit"]["current_streak"] == 1
+    assert habits["Daily Habit"]["best_day"] is None
+    assert habits["Weekly Habit"]["completed"] is False
+    assert habits["Weekly Habit"]["periodicity"] == "weekly"
+    assert response.json["summary"]["total_habits"] == 2
+    assert isinstance(response.json["struggled"], list)
+
+
+def test_get_completion_status_bulk(client):
+    """Test that completion status for many habits comes back in one call."""
+    done = client.post(
+        "/api/habits", json={"name": "Done", "periodicity": "daily"}
+    ).json["id"]
+    open_ = client.post(
+        "/api/habits", json={"name": "Open", "periodicity": "weekly"}
+    ).json["id"]
+    client.post(f"/api/habits/{done}/checkoff")
+
+    response = client.get("/api/habits/completed-status")
+    assert response.status_code == 200
+    assert response.json == {str(done): True, str(open_): False}
+
+    response = client.get(f"/api/habits/completed-status?ids={open_}")
+    assert response.json == {str(open_): False}
+
+    response = client.get("/api/habits/completed-status?ids=abc")
+    assert response.status_code == 400
+
+
+def test_analytics_time_window_parameters(client):
+    """Test that analytics routes accept from/to/granularity and reject bad ones."""
+    habit_id = client.post(
+        "/api/habits", json={"name": "Windowed", "periodicity": "daily"}
+    ).json["id"]
+    client.post(f"/api/habits/{habit_id}/checkoff")
+    today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    response = client.get(
+        f"/api/analytics/habits/completion-rates?from={today}&granularity=day"
+    )
+    assert response.status_code == 200
+    assert response.json[0]["period"] == today
+    assert response.json[0]["completed"] == 1
+
+    for route in (
+        f"/api/analytics/habits/{habit_id}/streaks",
+        f"/api/analytics/habits/{habit_id}/best-worst-day",
+        "/api/analytics/habits/struggled",
+        "/api/analytics/habits/completion-rates",
+        "/api/dashboard",
+    ):
+        assert client.get(f"{route}?from=2024-01-01&to=2024-01-31").status_code == 200
+        assert client.get(f"{route}?from=yesterday").status_code == 400
+        assert client.get(f"{route}?from=2024-02-01&to=2024-01-01").status_code == 400
+
+    response = client.get("/api/analytics/habits/completion-rates?granularity=year")
+    assert response.status_code == 400
+
+
+def test_get_timeseries(client):
+    """Test that completion history comes back as per-year bitmaps or runs."""
+    habit_id = client.post(
+        "/api/habits", json={"name": "Charted", "periodicity": "daily"}
+    ).json["id"]
+    client.post(f"/api/habits/{habit_id}/checkoff")
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    day = today.timetuple().tm_yday - 1
+
+    response = client.get(f"/api/analytics/habits/{habit_id}/timeseries")
+    assert response.status_code == 200
+    assert response.json["habit_id"] == habit_id
+    bitmap = response.json["years"][str(today.year)]
+    assert timeseries.decode_bitmap(bitmap) == [day]
+
+    response = client.get("/api/analytics/habits/timeseries?encoding=rle")
+    assert response.status_code == 200
+    assert response.json == [
+        {
+            "habit_id": habit_id,
+            "encoding": "rle",
+            "years": {str(today.year): [[day, 1]]},
+        }
+    ]
+
+    response = client.get("/api/analytics/habits/timeseries?encoding=json")
+    assert response.status_code == 400
+
+    response = client.get("/api/analytics/habits/999/timeseries")
+    assert response.status_code == 404
+    response = client.get(
+        f"/api/analytics/habits/{habit_id}/timeseries", headers={"X-User": "mallory"}
+    )
+    assert response.status_code == 404
+
+
+def test_get_leaderboard(client):
+    """Test that the leaderboard ranks habits by 30-day completion rate."""
+    done = client.post(
+        "/api/habits", json={"name": "Done", "periodicity": "daily"}
+    ).json["id"]
+    open_ = client.post(
+        "/api/habits", json={"name": "Open", "periodicity": "daily"}
+    ).json["id"]
+    client.post(f"/api/habits/{done}/checkoff")
+
+    response = client.get("/api/analytics/habits/leaderboard")
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json] == [done, open_]
+    assert response.json[0]["completion_rate"] == 1.0
+
+    response = client.get("/api/analytics/habits/leaderboard?order=bottom&limit=1")
+    assert [row["id"] for row in response.json] == [open_]
+
+    assert client.get("/api/analytics/habits/leaderboard?order=up").status_code == 400
+    assert client.get("/api/analytics/habits/leaderboard?limit=0").status_code == 400
+
+
+def test_analytics_jobs(client):
+    """Test that analytics jobs can be queued, polled and are deduplicated."""
+    client.post("/api/habits", json={"name": "Queued", "periodicity": "daily"})
+
+    response = client.post(
+        "/api/analytics/jobs",
+        json={"kind": "struggled", "params": {"threshold": 0.9, "quartile": 1.0}},
+    )
+    assert response.status_code == 202
+    job_id = response.json["id"]
+    assert response.json["params"]["threshold"] == 0.9
+
+    response = client.get(f"/api/analytics/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json["status"] == "done"
+    assert [r["name"] for r in response.json["result"]] == ["Queued"]
+
+    again = client.post(
+        "/api/analytics/jobs",
+        json={"kind": "struggled", "params": {"quartile": 1.0, "threshold": 0.9}},
+    )
+    assert again.json["id"] == job_id
+
+    # Other users can neither see nor share the job
+    assert (
+        client.get(f"/api/analytics/jobs/{job_id}", headers={"X-User": "bob"})
+    ).status_code == 404
+
+    assert client.post("/api/analytics/jobs", json={"kind": "x"}).status_code == 400
+    assert (
+        client.post(
+            "/api/analytics/jobs",
+            json={"kind": "report", "params": {"from": "soon"}},
+        ).status_code
+        == 400
+    )
+
+
+def _statements(client, method, path, **kwargs):
+    """Return the SQL verbs a request executes."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # SAVEPOINTs come from the test transaction, not the application
+        if not statement.startswith(("SAVEPOINT", "RELEASE")):
+            statements.append(statement.split()[0])
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    try:
+        response = client.open(path, method=method, **kwargs)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record)
+    assert response.status_code < 300
+    return statements
+
+
+def test_write_endpoints_skip_refresh_queries(client):
+    """Test that writes do not re-read the rows they have just written."""
+    # Create the user and preferences outside the measured requests
+    client.put("/api/preferences", json={"struggle_threshold": 0.75})
+
+    # The habit and its stats row, due for computing
+    assert _statements(
+        client, "POST", "/api/habits", json={"name": "Run", "periodicity": "daily"}
+    ) == ["INSERT", "INSERT"]
+    assert _statements(client, "PUT", "/api/habits/1", json={"name": "Jog"}) == [
+        "SELECT",
+        "UPDATE",
+    ]
+    # Habit, timezone, period check, insert, stats row, stats update; the
+    # leaderboard creates the stats row so it is updated rather than rebuilt
+    client.get("/api/analytics/habits/leaderboard")
+    assert _statements(client, "POST", "/api/habits/1/checkoff") == [
+        "SELECT",
+        "SELECT",
+        "SELECT",
+        "INSERT",
+        "SELECT",
+        "UPDATE",
+    ]
+    assert _statements(
+        client, "PUT", "/api/preferences", json={"struggle_threshold": 0.5}
+    ) == ["SELECT", "UPDATE"]
+    # Habit, archive years, then completions, rollups, stats and the habit
+    assert _statements(client, "DELETE", "/api/habits/1") == [
+        "SELECT",
+        "SELECT",
+        "DELETE",
+        "DELETE",
+        "DELETE",
+        "DELETE",
+    ]
@@ -0,0 +1,117 @@
+import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from habittracker import archive
+from habittracker.analytics import AnalyticsService
+from habittracker.models import (
+    Completion,
+    CompletionArchive,
+    CompletionRollup,
+    Habit,
+    Periodicity,
+)
+from habittracker.services import HabitService
+
+TODAY = pd.Timestamp("2024-06-01 12:00")
+CUTOFF = datetime.date(2022, 1, 2)
+
+
+@pytest.fixture
+def habit(db_session):
+    habit = Habit(
+        name="Read",
+        periodicity=Periodicity.DAILY,
+        created_at=pd.Timestamp("2021-12-01"),
+    )
+    db_session.add(habit)
+    db_session.commit()
+    days = list(pd.date_range("2021-12-29", "2022-01-04"))
+    days += list(pd.date_range("2024-05-20", "2024-05-31"))
+    db_session.add_all(
+        [Completion(habit_id=habit.id, completed_at=day) for day in days]
+    )
+    db_session.commit()
+    return habit
+
+
+def _count(db_session, table):
+    return db_session.scalar(select(func.count()).select_from(table))
+
+
+class TestArchiveCompletions:
+    def test_moves_old_completions_into_per_year_tables(self, db_session, habit):
+        assert archive.archive_completions(db_session, CUTOFF) == 4
+
+        assert _count(db_session, archive.archive_table(2021)) == 3
+        assert _count(db_session, archive.archive_table(2022)) == 1
+        assert _count(db_session, Completion.__table__) == 15
+        assert {(r.month, r.completed) for r in db_session.query(CompletionRollup)} == {
+            ("2021-12", 3),
+            ("2022-01", 1),
+        }
+        assert db_session.get(CompletionArchive, 2022).archived_before == CUTOFF
+
+    def test_later_runs_add_to_existing_years(self, db_session, habit):
+        archive.archive_completions(db_session, CUTOFF)
+        assert archive.archive_completions(db_session, datetime.date(2022, 1, 4)) == 2
+        assert _count(db_session, archive.archive_table(2022)) == 3
+        rollup = db_session.get(CompletionRollup, (habit.id, "2022-01"))
+        assert rollup.completed == 3
+
+    def test_keeps_recent_completions_hot(self, db_session):
+        with pytest.raises(ValueError):
+            archive.archive_completions(db_session, archive.utc_today())
+
+    def test_only_windows_before_the_cutoff_read_archives(self, db_session, habit):
+        archive.archive_completions(db_session, CUTOFF)
+        assert archive.archive_tables(db_session, since=CUTOFF) == []
+        assert archive.archive_tables(db_session, since=datetime.date(2022, 1, 1)) == [
+            archive.archive_table(2022)
+        ]
+        assert archive.archive_tables(db_session) == [
+            archive.archive_table(2021),
+            archive.archive_table(2022),
+        ]
+
+    def test_analytics_are_unchanged_by_archiving(self, db_session, habit):
+        service = AnalyticsService(db_session)
+
+        def results():
+            return (
+                service.overall_completion_rate(TODAY).to_dict("records"),
+                service.overall_completion_rate(
+                    TODAY, start=datetime.date(2021, 12, 30)
+                ).to_dict("records"),
+                service.calculate_streaks(habit.id, TODAY),
+                service.completion_rate_series(
+                    "month", TODAY, start=datetime.date(2021, 12, 1)
+                ).to_dict("records"),
+                service.completion_timeseries(encoding="rle"),
+                service.dashboard(TODAY),
+            )
+
+        before = results()
+        archive.archive_completions(db_session, CUTOFF)
+        assert results() == before
+
+    def test_delete_habit_removes_archived_completions(self, db_session, habit):
+        archive.archive_completions(db_session, CUTOFF)
+        HabitService(db_session).delete_habit(habit.id)
+
+        assert _count(db_session, archive.archive_table(2021)) == 0
+        assert db_session.query(CompletionRollup).count() == 0
+
+
+def test_archive_cli(app, db_session, habit):
+    """Test that `flask archive` moves completions older than the horizon."""
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["archive", "--horizon-days", "1"])
+    assert result.exit_code != 0
+
+    horizon = (archive.utc_today() - CUTOFF).days
+    result = runner.invoke(args=["archive", "--horizon-days", str(horizon)])
+    assert result.exit_code == 0
+    assert "Archived 4 completions" in result.output
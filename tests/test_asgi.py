@@ -0,0 +1,226 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from habittracker import database  # noqa: E402
+from habittracker.asgi import create_asgi_app  # noqa: E402
+from habittracker.events import broker  # noqa: E402
+from habittracker.models import Base, HabitStats, User  # noqa: E402
+from habittracker.ranking import RankingService  # noqa: E402
+
+
+@pytest.fixture
+def asgi(tmp_path):
+    """An ASGI app on a file database, restoring the test engine afterwards."""
+    original_engine = database.engine
+    # Keep create_app from disposing the shared test database
+    database.engine = None
+    app = create_asgi_app(f"sqlite:///{tmp_path / 'asgi.db'}")
+    Base.metadata.create_all(bind=database.engine)
+    loop = asyncio.new_event_loop()
+
+    def call(method, path, body=None, user=None):
+        return loop.run_until_complete(_request(app, method, path, body, user))
+
+    call.app, call.loop = app, loop
+    yield call
+
+    loop.run_until_complete(app.engine.dispose())
+    loop.close()
+    app.executor.shutdown()
+    database.engine.dispose()
+    database.engine = original_engine
+    database.SessionLocal.configure(bind=original_engine)
+
+
+async def _request(app, method, path, body=None, user=None):
+    path, _, query = path.partition("?")
+    headers = [(b"content-type", b"application/json")]
+    if user:
+        headers.append((b"x-user", user.encode()))
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": headers,
+    }
+    payload = json.dumps(body).encode() if body is not None else b""
+    messages = [{"type": "http.request", "body": payload}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    content = b"".join(m.get("body", b"") for m in sent[1:])
+    return sent[0]["status"], json.loads(content) if content else None
+
+
+def test_async_engine_uses_aiosqlite(tmp_path):
+    engine = database.create_async_database_engine(f"sqlite:///{tmp_path / 'a.db'}")
+    assert engine.url.drivername == "sqlite+aiosqlite"
+
+
+def test_rejects_in_memory_database():
+    with pytest.raises(ValueError):
+        create_asgi_app("sqlite:///:memory:")
+
+
+def test_native_routes(asgi):
+    # Creation goes through the Flask app
+    status, habit = asgi(
+        "POST", "/api/habits", {"name": "Read", "periodicity": "daily"}
+    )
+    assert status == 201
+
+    status, habits = asgi("GET", "/api/habits")
+    assert status == 200
+    assert [h["name"] for h in habits] == ["Read"]
+
+    assert asgi("GET", f"/api/habits/{habit['id']}") == (200, habit)
+    assert asgi("GET", "/api/habits/999")[0] == 404
+
+    assert asgi("GET", f"/api/habits/{habit['id']}/completed") == (
+        200,
+        {"completed": False},
+    )
+    status, completion = asgi("POST", f"/api/habits/{habit['id']}/checkoff")
+    assert status == 201
+    assert completion["habit_id"] == habit["id"]
+    assert asgi("POST", f"/api/habits/{habit['id']}/checkoff")[0] == 409
+    assert asgi("POST", "/api/habits/999/checkoff")[0] == 404
+
+    assert asgi("GET", f"/api/habits/{habit['id']}/completed")[1] == {"completed": True}
+    assert asgi("GET", "/api/habits/completed-status") == (
+        200,
+        {str(habit["id"]): True},
+    )
+    assert asgi("GET", "/api/habits/completed-status?ids=a")[0] == 400
+
+
+def test_check_off_stats_run_off_the_event_loop(asgi, monkeypatch):
+    _, habit = asgi("POST", "/api/habits", {"name": "Read", "periodicity": "daily"})
+    threads = []
+    record_completion = RankingService.record_completion
+
+    def recording(self, *args):
+        threads.append(threading.current_thread().name)
+        return record_completion(self, *args)
+
+    monkeypatch.setattr(RankingService, "record_completion", recording)
+    assert asgi("POST", f"/api/habits/{habit['id']}/checkoff")[0] == 201
+
+    assert len(threads) == 1 and threads[0].startswith("asgi-wsgi")
+    with database.SessionLocal() as db:
+        assert db.get(HabitStats, habit["id"]).current_streak == 1
+
+
+def test_event_stream(asgi):
+    asgi("PUT", "/api/preferences", {"timezone": "UTC"})
+    messages, sent = asyncio.Queue(), []
+
+    async def receive():
+        return await messages.get()
+
+    async def send(message):
+        sent.append(message.get("body", b"").decode())
+
+    async def until(condition):
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("timed out")
+
+    async def stream():
+        scope = {"type": "http", "method": "GET", "path": "/api/events"}
+        served = asyncio.ensure_future(asgi.app(scope, receive, send))
+        await until(lambda: len(sent) == 2)
+        assert sent[1].startswith("retry:")
+
+        # Published from a worker thread, as the Flask routes do
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, broker.publish, 1, "habit_created", {"id": 7})
+        await until(lambda: len(sent) == 3)
+        assert sent[2].startswith("event: habit_created")
+
+        await messages.put({"type": "http.disconnect"})
+        await asyncio.wait_for(served, timeout=1)
+
+    asgi.loop.run_until_complete(stream())
+    assert not broker.has_subscribers(1)
+
+
+def test_routes_are_scoped_to_x_user(asgi):
+    asgi("POST", "/api/habits", {"name": "Mine", "periodicity": "daily"}, user="ana")
+    assert asgi("GET", "/api/habits", user="ana")[1][0]["name"] == "Mine"
+    assert asgi("GET", "/api/habits", user="ben") == (200, [])
+
+
+def test_reads_do_not_create_users(asgi):
+    def users():
+        with database.SessionLocal() as db:
+            return [user.username for user in db.query(User)]
+
+    assert asgi("GET", "/api/habits", user="cat") == (200, [])
+    assert asgi("GET", "/api/habits/1/completed", user="cat")[0] == 200
+    assert users() == []
+
+    habit = {"name": "Nap", "periodicity": "daily"}
+    assert asgi("POST", "/api/habits", habit, user="cat")[0] == 201
+    assert [h["name"] for h in asgi("GET", "/api/habits", user="cat")[1]] == ["Nap"]
+    assert users() == ["cat"]
+
+
+def test_other_routes_are_served_by_flask(asgi):
+    _, habit = asgi("POST", "/api/habits", {"name": "Gym", "periodicity": "weekly"})
+    asgi("POST", f"/api/habits/{habit['id']}/checkoff")
+
+    status, dashboard = asgi("GET", "/api/dashboard")
+    assert status == 200
+    assert dashboard["habits"][0]["name"] == "Gym"
+    assert asgi("GET", "/api/analytics/habits/completion-rates?from=bad")[0] == 400
+    assert asgi("DELETE", f"/api/habits/{habit['id']}")[0] == 200
+    assert asgi("GET", "/api/habits") == (200, [])
+
+
+def test_flask_responses_are_streamed(asgi):
+    closed = []
+
+    class Body:
+        def __iter__(self):
+            yield b"one"
+            yield b""
+            yield b"two"
+
+        def close(self):
+            closed.append(True)
+
+    def wsgi_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return Body()
+
+    asgi.app.flask_app = wsgi_app
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/api/dashboard"}
+    asgi.loop.run_until_complete(asgi.app(scope, receive, send))
+
+    assert sent[0]["status"] == 200
+    assert [m["body"] for m in sent[1:]] == [b"one", b"two", b""]
+    assert sent[-1].get("more_body", False) is False
+    assert closed == [True]
@@ -0,0 +1,51 @@
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from habittracker import boot
+from habittracker.database import create_database_engine
+from habittracker.models import Habit
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'boot.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _habit_count(engine):
+    with Session(engine) as db_session:
+        return db_session.scalar(select(func.count(Habit.id)))
+
+
+def test_head_revision_matches_alembic():
+    script = ScriptDirectory.from_config(Config(str(boot.ALEMBIC_INI)))
+    assert boot.head_revision() == script.get_current_head()
+
+
+def test_prepare_database_migrates_a_fresh_database(engine):
+    assert boot.current_revision(engine) is None
+
+    boot.prepare_database(engine)
+
+    assert boot.current_revision(engine) == boot.head_revision()
+    # Sample data is opt-in
+    assert _habit_count(engine) == 0
+
+
+def test_prepare_database_skips_alembic_when_up_to_date(engine, monkeypatch):
+    boot.prepare_database(engine, seed=True)
+    seeded = _habit_count(engine)
+    assert seeded > 0
+
+    def fail(engine):
+        raise AssertionError("migrated an up-to-date database")
+
+    monkeypatch.setattr(boot, "upgrade", fail)
+    boot.prepare_database(engine, seed=True)
+
+    # Restarting never reseeds or clears existing habits
+    assert _habit_count(engine) == seeded
@@ -0,0 +1,137 @@
+import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+
+from habittracker import periods
+from habittracker.analytics import AnalyticsService
+from habittracker.completion_index import CompletionIndex, completion_index
+from habittracker.models import Completion, Habit, Periodicity
+from habittracker.services import HabitAlreadyCompletedError, HabitService
+
+
+@pytest.fixture
+def warm_index(db_session):
+    """The shared completion index, warmed from the test database."""
+    completion_index.warm(db_session)
+    yield completion_index
+    completion_index.reset()
+
+
+class TestCompletionIndex:
+    def test_cold_index_cannot_answer(self):
+        index = CompletionIndex()
+        index.add(1, datetime.date(2024, 1, 1))
+        day = datetime.date(2024, 1, 1)
+        assert index.completed_in_period(1, Periodicity.DAILY, day) is None
+        assert index.streaks(1, Periodicity.DAILY, day) is None
+
+    def test_period_checks(self, db_session):
+        index = CompletionIndex()
+        index.warm(db_session)
+        index.track(1, datetime.date(2024, 1, 3))
+        index.add(1, datetime.date(2024, 1, 10))  # a Wednesday
+
+        assert index.completed_in_period(
+            1, Periodicity.DAILY, datetime.date(2024, 1, 10)
+        )
+        assert not index.completed_in_period(
+            1, Periodicity.DAILY, datetime.date(2024, 1, 9)
+        )
+        for day in pd.date_range("2024-01-08", "2024-01-14"):
+            assert index.completed_in_period(1, Periodicity.WEEKLY, day.date())
+        assert not index.completed_in_period(
+            1, Periodicity.WEEKLY, datetime.date(2024, 1, 7)
+        )
+        assert (
+            index.completed_in_period(2, Periodicity.DAILY, datetime.date.today())
+            is None
+        )
+
+    def test_days_before_creation_and_far_ahead(self, db_session):
+        index = CompletionIndex()
+        index.warm(db_session)
+        index.track(1, datetime.date(2024, 6, 1))
+        index.add(1, datetime.date(2024, 1, 1))
+        index.add(1, datetime.date(2025, 1, 1))
+
+        for day in (datetime.date(2024, 1, 1), datetime.date(2025, 1, 1)):
+            assert index.completed_in_period(1, Periodicity.DAILY, day)
+        assert not index.completed_in_period(
+            1, Periodicity.DAILY, datetime.date(2024, 6, 1)
+        )
+
+    def test_streaks_match_analytics(self, db_session):
+        daily = Habit(name="Daily", periodicity=Periodicity.DAILY)
+        weekly = Habit(name="Weekly", periodicity=Periodicity.WEEKLY)
+        db_session.add_all([daily, weekly])
+        db_session.commit()
+        daily_dates = ["2024-01-01", "2024-01-02", "2024-01-04", "2024-01-05"]
+        weekly_dates = ["2024-01-01", "2024-01-14", "2024-01-22", "2024-01-29"]
+        db_session.add_all(
+            [
+                Completion(habit_id=daily.id, completed_at=pd.Timestamp(d))
+                for d in daily_dates
+            ]
+            + [
+                Completion(habit_id=weekly.id, completed_at=pd.Timestamp(d))
+                for d in weekly_dates
+            ]
+        )
+        db_session.commit()
+
+        index = CompletionIndex()
+        index.warm(db_session)
+        service = AnalyticsService(db_session)
+        for habit in (daily, weekly):
+            for today in ("2024-01-05", "2024-01-06", "2024-01-07", "2024-02-10"):
+                expected = service.calculate_streaks(
+                    habit.id, today=pd.Timestamp(today)
+                )
+                got = index.streaks(
+                    habit.id, habit.periodicity, pd.Timestamp(today).date()
+                )
+                assert got == expected
+
+
+class TestCompletionIndexWithServices:
+    def test_check_off_uses_and_updates_index(self, db_session, warm_index):
+        service = HabitService(db_session)
+        habit = service.create_habit("Indexed", "daily")
+        service.check_off_habit(habit.id)
+        today = periods.local_today("UTC")
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            # SAVEPOINTs come from the test transaction, not the service
+            if not statement.startswith(("SAVEPOINT", "RELEASE")):
+                statements.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            completed = service._already_completed_in_period(
+                habit.id, habit.periodicity, today
+            )
+            streaks = warm_index.streaks(habit.id, habit.periodicity, today)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert statements == []
+        assert completed is True
+        assert streaks == {"longest_streak": 1, "current_streak": 1}
+
+        with pytest.raises(HabitAlreadyCompletedError):
+            service.check_off_habit(habit.id)
+
+    def test_delete_forgets_habit(self, db_session, warm_index):
+        service = HabitService(db_session)
+        habit = service.create_habit("Gone", "weekly")
+        service.delete_habit(habit.id)
+        assert (
+            warm_index.completed_in_period(
+                habit.id, Periodicity.WEEKLY, datetime.date.today()
+            )
+            is None
+        )
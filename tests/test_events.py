@@ -0,0 +1,121 @@
+import asyncio
+import json
+import queue
+import threading
+
+import pytest
+
+from habittracker.events import EventBroker, broker, format_sse
+from habittracker.services import HabitService
+
+
+class TestEventBroker:
+    def test_publish_reaches_only_matching_user(self):
+        events = EventBroker()
+        alice = events.subscribe(1)
+        bob = events.subscribe(2)
+
+        events.publish(1, "habit_created", {"id": 7})
+
+        assert alice.get(timeout=0) == {"type": "habit_created", "data": {"id": 7}}
+        with pytest.raises(queue.Empty):
+            bob.get(timeout=0)
+
+    def test_unsubscribe_stops_delivery(self):
+        events = EventBroker()
+        subscription = events.subscribe(1)
+        events.unsubscribe(subscription)
+
+        events.publish(1, "habit_deleted", {"id": 7})
+
+        assert not events.has_subscribers(1)
+        with pytest.raises(queue.Empty):
+            subscription.get(timeout=0)
+
+    def test_overflow_collapses_into_resync(self):
+        events = EventBroker(max_pending=2)
+        subscription = events.subscribe(1)
+
+        for habit_id in range(3):
+            events.publish(1, "habit_created", {"id": habit_id})
+
+        assert subscription.get(timeout=0)["type"] == "resync"
+        with pytest.raises(queue.Empty):
+            subscription.get(timeout=0)
+
+    def test_async_subscription_receives_events_from_other_threads(self):
+        events = EventBroker(max_pending=2)
+        loop = asyncio.new_event_loop()
+        subscription = events.subscribe(1, loop)
+
+        def publish(count):
+            for habit_id in range(count):
+                events.publish(1, "habit_created", {"id": habit_id})
+
+        async def receive(count):
+            thread = threading.Thread(target=publish, args=(count,))
+            thread.start()
+            await asyncio.get_running_loop().run_in_executor(None, thread.join)
+            return await asyncio.wait_for(subscription.get(), timeout=1)
+
+        try:
+            assert loop.run_until_complete(receive(1))["data"] == {"id": 0}
+            assert loop.run_until_complete(receive(3))["type"] == "resync"
+            assert subscription.queue.empty()
+        finally:
+            loop.close()
+        # Publishing to a stream whose loop is gone is a no-op
+        publish(1)
+
+    def test_format_sse(self):
+        payload = format_sse({"type": "habit_deleted", "data": {"id": 3}})
+        assert payload.startswith("event: habit_deleted\n")
+        assert json.loads(payload.split("data: ")[1]) == {"id": 3}
+        assert payload.endswith("\n\n")
+
+
+class TestServiceEvents:
+    @pytest.fixture
+    def subscription(self):
+        subscription = broker.subscribe(None)
+        yield subscription
+        broker.unsubscribe(subscription)
+
+    def test_habit_lifecycle_publishes_deltas(self, db_session, subscription):
+        service = HabitService(db_session)
+        habit = service.create_habit("Run", "daily")
+        service.update_habit(habit.id, name="Jog")
+        service.check_off_habit(habit.id)
+        service.delete_habit(habit.id)
+
+        received = [subscription.get(timeout=0) for _ in range(4)]
+        assert [e["type"] for e in received] == [
+            "habit_created",
+            "habit_updated",
+            "completion_added",
+            "habit_deleted",
+        ]
+        assert received[1]["data"]["name"] == "Jog"
+        assert received[2]["data"]["habit_id"] == habit.id
+        assert received[2]["data"]["current_streak"] == 1
+        assert received[3]["data"] == {"id": habit.id}
+
+
+def test_events_stream(client):
+    """Test that /api/events streams changes made through the API."""
+    # Streams are per user, and reading does not create one
+    client.put("/api/preferences", json={"struggle_threshold": 0.75})
+    response = client.get("/api/events", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    chunks = response.iter_encoded()
+    assert next(chunks).startswith(b"retry:")
+
+    client.post("/api/habits", json={"name": "Streamed", "periodicity": "daily"})
+    chunk = next(chunks).decode()
+    assert chunk.startswith("event: habit_created")
+    assert json.loads(chunk.split("data: ")[1])["name"] == "Streamed"
+
+    response.close()
+    assert not broker.has_subscribers(1)
@@ -0,0 +1,196 @@
+import datetime
+import json
+import socket
+import subprocess
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from habittracker import database, models
+from habittracker.analytics import AnalyticsService
+from habittracker.database import create_database_engine
+from habittracker.jobs import JobQueue, job_key, run_analytics_job, worker_name
+from habittracker.models import AnalyticsJob, Base, Completion, Habit, Periodicity
+
+PARAMS = {
+    "from": None,
+    "to": None,
+    "granularity": None,
+    "threshold": 0.75,
+    "quartile": 1.0,
+}
+
+
+def _add_habits(db_session):
+    done = Habit(name="Done", periodicity=Periodicity.DAILY)
+    idle = Habit(name="Idle", periodicity=Periodicity.DAILY)
+    db_session.add_all([done, idle])
+    db_session.commit()
+    db_session.add(Completion(habit_id=done.id))
+    db_session.commit()
+    return done, idle
+
+
+class TestJobQueue:
+    def test_job_key_ignores_param_order(self):
+        reordered = dict(reversed(list(PARAMS.items())))
+        assert job_key(1, "struggled", PARAMS) == job_key(1, "struggled", reordered)
+        assert job_key(1, "struggled", PARAMS) != job_key(2, "struggled", PARAMS)
+
+    def test_run_analytics_job_kinds(self, db_session):
+        _add_habits(db_session)
+        service = AnalyticsService(db_session)
+
+        struggled = run_analytics_job(db_session, None, "struggled", PARAMS)
+        assert struggled == service.identify_struggled_habits(quartile=1.0).to_dict(
+            "records"
+        )
+        rates = run_analytics_job(db_session, None, "completion-rates", PARAMS)
+        assert [r["name"] for r in rates] == ["Done", "Idle"]
+        report = run_analytics_job(db_session, None, "report", PARAMS)
+        assert report["summary"]["total_habits"] == 2
+
+    def test_in_memory_jobs_run_inline_and_are_shared(self, db_session):
+        _add_habits(db_session)
+        queue = JobQueue(database.SessionLocal)
+
+        job = queue.submit(db_session, None, "struggled", PARAMS)
+        assert job.status == "done"
+        assert [r["name"] for r in json.loads(job.result)] == ["Idle"]
+
+        again = queue.submit(db_session, None, "struggled", dict(PARAMS))
+        assert again.id == job.id
+        other = queue.submit(db_session, None, "struggled", {**PARAMS, "quartile": 0.5})
+        assert other.id != job.id
+
+    def test_expired_results_are_recomputed(self, db_session):
+        _add_habits(db_session)
+        queue = JobQueue(database.SessionLocal)
+        job = queue.submit(db_session, None, "completion-rates", PARAMS)
+        job.expires_at = job.finished_at - datetime.timedelta(seconds=1)
+        expired_id = job.id
+        db_session.commit()
+
+        fresh = queue.submit(db_session, None, "completion-rates", PARAMS)
+        assert fresh.id != expired_id
+        assert db_session.query(AnalyticsJob).count() == 1
+
+    def test_failed_job_records_error(self, db_session, monkeypatch):
+        def explode(*args):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr("habittracker.jobs.run_analytics_job", explode)
+        job = JobQueue(database.SessionLocal).submit(db_session, None, "report", PARAMS)
+        assert job.status == "failed"
+        assert job.error == "boom"
+
+    def _pending(self, db_session, key, **columns):
+        job = AnalyticsJob(
+            id=uuid.uuid4().hex,
+            kind="report",
+            params=json.dumps(PARAMS, sort_keys=True),
+            key=key,
+            **columns,
+        )
+        db_session.add(job)
+        db_session.commit()
+        return job
+
+    def test_timed_out_jobs_are_failed_and_requeued(self, db_session):
+        _add_habits(db_session)
+        queue = JobQueue(database.SessionLocal, timeout_seconds=60)
+        queue.recover(db_session)
+        long_ago = models.utc_timestamp() - datetime.timedelta(minutes=5)
+        stuck = self._pending(
+            db_session,
+            job_key(None, "report", PARAMS),
+            status="running",
+            created_at=long_ago,
+            started_at=long_ago,
+        )
+        assert queue.get(db_session, stuck.id, None).status == "failed"
+
+        job = queue.submit(db_session, None, "report", PARAMS)
+        assert job.id != stuck.id
+        assert job.status == "done"
+
+    def test_recover_fails_jobs_of_exited_processes(self, db_session):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        dead = f"{socket.gethostname()}:{exited.pid}"
+        orphan = self._pending(db_session, "orphan", status="queued", worker=dead)
+        live = self._pending(db_session, "live", status="queued", worker=worker_name())
+
+        JobQueue(database.SessionLocal).recover(db_session)
+        assert orphan.status == "failed"
+        assert orphan.error == "abandoned: its process exited"
+        assert live.status == "queued"
+
+    def test_one_pending_job_per_key(self, db_session):
+        self._pending(db_session, "same", status="queued")
+        with pytest.raises(IntegrityError):
+            self._pending(db_session, "same", status="running")
+        db_session.rollback()
+        self._pending(db_session, "same", status="done")
+
+    def test_submit_gives_up_after_repeated_lost_inserts(self, db_session, monkeypatch):
+        queue = JobQueue(database.SessionLocal)
+        queue.recover(db_session)
+        self._pending(
+            db_session,
+            job_key(None, "report", PARAMS),
+            status="queued",
+            created_at=models.utc_timestamp(),
+            worker=worker_name(),
+        )
+        finds = []
+        monkeypatch.setattr(queue, "_find", lambda *args: finds.append(args))
+
+        with pytest.raises(RuntimeError, match="after 3 attempts"):
+            queue.submit(db_session, None, "report", PARAMS)
+        assert len(finds) == 3
+
+
+def test_concurrent_identical_submits_share_one_job(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    queue = JobQueue(sessions, max_workers=2)
+    with sessions() as session:
+        _add_habits(session)
+        queue.recover(session)
+    start = threading.Barrier(8)
+
+    def submit(_):
+        with sessions() as session:
+            start.wait()
+            return queue.submit(session, None, "report", PARAMS).id
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert len(set(pool.map(submit, range(8)))) == 1
+    queue.shutdown(wait=True)
+    engine.dispose()
+
+
+def test_jobs_run_on_worker_threads(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    queue = JobQueue(sessions, max_workers=2)
+    with sessions() as session:
+        _add_habits(session)
+        job = queue.submit(session, None, "report", PARAMS)
+        queue.shutdown(wait=True)
+
+        session.refresh(job)
+        assert job.status == "done"
+        report = json.loads(job.result)
+        assert report["summary"]["total_habits"] == 2
+        assert pd.Timestamp(job.finished_at) >= pd.Timestamp(job.created_at)
+    engine.dispose()
@@ -0,0 +1,50 @@
+from collections import Counter
+
+import pytest
+
+from habittracker import loadgen
+
+
+def test_parse_mix():
+    assert loadgen.parse_mix("checkoff=1,analytics=3") == {
+        "checkoff": 1.0,
+        "analytics": 3.0,
+    }
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("uploads=1")
+    with pytest.raises(ValueError):
+        loadgen.parse_mix("list=0")
+
+
+def test_generate_follows_mix_and_zipfian_popularity():
+    requests = loadgen.generate(
+        {"alice": [1, 2, 3, 4, 5], "bob": []}, 5_000, {"checkoff": 1, "list": 0}
+    )
+    assert {r["route"] for r in requests} == {"POST /api/habits/{habit}/checkoff"}
+    assert {r["user"] for r in requests} == {"alice"}
+
+    counts = Counter(r["path"] for r in requests)
+    ranked = [counts[f"/api/habits/{habit}/checkoff"] for habit in range(1, 6)]
+    assert ranked == sorted(ranked, reverse=True)
+    assert ranked[0] > 3 * ranked[4]
+
+    assert loadgen.generate({"alice": [1, 2]}, 50, seed=7) == loadgen.generate(
+        {"alice": [1, 2]}, 50, seed=7
+    )
+
+
+def test_replay_in_process_reports_every_route(app, client):
+    for name in ("Read", "Run", "Write"):
+        client.post("/api/habits", json={"name": name, "periodicity": "daily"})
+    transport = loadgen.TestClientTransport(app)
+    habits_by_user = loadgen.discover(transport, ["default"])
+    assert len(habits_by_user["default"]) == 3
+
+    requests = loadgen.generate(habits_by_user, 120)
+    result = loadgen.replay(transport, requests, concurrency=1)
+
+    assert result["errors"] == {}
+    assert sum(len(v) for v in result["latencies"].values()) == 120
+    report = loadgen.format_report(result)
+    assert "GET /api/dashboard" in report
+    assert report.splitlines()[-1].startswith("total")
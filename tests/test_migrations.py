@@ -0,0 +1,145 @@
+import pytest
+import sqlalchemy as sa
+from alembic.config import Config
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+
+from alembic import command
+from habittracker import boot, migrations
+from habittracker.database import create_database_engine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE items (id INTEGER PRIMARY KEY, n INTEGER)"))
+        conn.execute(
+            sa.text("INSERT INTO items (id, n) VALUES (:id, 0)"),
+            [{"id": i} for i in range(1, 101)],
+        )
+    yield engine
+    engine.dispose()
+
+
+def _migrate(engine, fn):
+    with engine.connect() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            fn()
+
+
+def test_run_batched_applies_sql_in_batches(engine):
+    _migrate(
+        engine,
+        lambda: migrations.run_batched(
+            "bump",
+            "items",
+            "UPDATE items SET n = n + 1 WHERE id BETWEEN :lo AND :hi",
+            batch_size=30,
+            pause=0,
+        ),
+    )
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT MIN(n), MAX(n) FROM items")).one() == (1, 1)
+        # The progress table is gone once no migration is unfinished
+        assert not sa.inspect(conn).has_table(migrations.PROGRESS_TABLE)
+
+
+def test_run_batched_resumes_after_interruption(engine):
+    batches = []
+
+    def step(conn, lo, hi):
+        if lo == 51 and "failed" not in batches:
+            batches.append("failed")
+            raise RuntimeError("interrupted")
+        batches.append((lo, hi))
+        return conn.execute(
+            sa.text("UPDATE items SET n = n + 1 WHERE id BETWEEN :lo AND :hi"),
+            {"lo": lo, "hi": hi},
+        ).rowcount
+
+    def run():
+        migrations.run_batched("bump", "items", step, batch_size=25, pause=0)
+
+    with pytest.raises(RuntimeError):
+        _migrate(engine, run)
+    _migrate(engine, run)
+
+    assert batches == [(1, 25), (26, 50), "failed", (51, 75), (76, 100)]
+    with engine.connect() as conn:
+        # Every row was updated exactly once
+        assert conn.execute(sa.text("SELECT MIN(n), MAX(n) FROM items")).one() == (1, 1)
+
+
+def test_create_index_online_is_idempotent(engine):
+    def create():
+        migrations.create_index_online("ix_items_n", "items", ["n"])
+
+    _migrate(engine, create)
+    _migrate(engine, create)
+    with engine.connect() as conn:
+        assert [i["name"] for i in sa.inspect(conn).get_indexes("items")] == [
+            "ix_items_n"
+        ]
+
+
+@pytest.mark.parametrize(
+    "backfill",
+    [
+        "assign completions to the default user",
+        "backfill completion period keys",
+        "backfill completions day ordinals",
+    ],
+)
+def test_interrupted_upgrade_resumes(engine, monkeypatch, backfill):
+    # The revision before per-user scoping, with a few days of completions
+    _upgrade_to(engine, "2867196b2955")
+    with engine.begin() as conn:
+        conn.execute(
+            sa.text(
+                "INSERT INTO habits (id, name, periodicity) VALUES (1, 'Read', 'DAILY')"
+            )
+        )
+        conn.execute(
+            sa.text(
+                "INSERT INTO completions (id, habit_id, completed_at) "
+                "VALUES (:id, 1, :day)"
+            ),
+            [{"id": i, "day": f"2026-10-0{i} 08:00:00"} for i in range(1, 6)],
+        )
+
+    monkeypatch.setattr(migrations, "BATCH_SIZE", 2)
+    monkeypatch.setattr(migrations, "BATCH_PAUSE", 0)
+    save_progress = migrations._save_progress
+
+    def interrupt(connection, name, last_key):
+        if name == backfill and last_key > 2:
+            raise RuntimeError("interrupted")
+        save_progress(connection, name, last_key)
+
+    monkeypatch.setattr(migrations, "_save_progress", interrupt)
+    with pytest.raises(RuntimeError):
+        _upgrade_to(engine, "head")
+    monkeypatch.setattr(migrations, "_save_progress", save_progress)
+    _upgrade_to(engine, "head")
+
+    with engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT username FROM users")).scalars().all() == [
+            "default"
+        ]
+        rows = conn.execute(
+            sa.text("SELECT user_id, local_date, day_ordinal FROM completions")
+        ).all()
+        assert len(rows) == 5
+        assert all(
+            user_id == 1 and local_date and day_ordinal
+            for user_id, local_date, day_ordinal in rows
+        )
+    assert boot.current_revision(engine) == boot.head_revision()
+
+
+def _upgrade_to(engine, revision):
+    config = Config(str(boot.ALEMBIC_INI))
+    config.attributes["configure_logger"] = False
+    config.set_main_option("sqlalchemy.url", engine.url.render_as_string(False))
+    command.upgrade(config, revision)
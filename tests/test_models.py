@@ -2,7 +2,7 @@ import datetime
 
 import pytest
 
-from habittracker.models import Completion, Habit, Periodicity
+from habittracker.models import Completion, Habit, Periodicity, User
 
 
 class TestPeriodicityEnum:
@@ -269,3 +269,40 @@ class TestModelIntegration:
                 assert len(habit.completions) == 5
             elif habit.name == "Habit 3":
                 assert len(habit.completions) == 0
+
+
+class TestUserModel:
+    """Test the User model and per-user ownership."""
+
+    def test_completion_inherits_habit_owner(self, db_session):
+        """Completions inserted without a user take the habit's user."""
+        user = User(username="alice")
+        db_session.add(user)
+        db_session.commit()
+
+        habit = Habit(name="Run", periodicity=Periodicity.DAILY, user_id=user.id)
+        db_session.add(habit)
+        db_session.commit()
+
+        completion = Completion(habit_id=habit.id)
+        db_session.add(completion)
+        db_session.commit()
+
+        assert completion.user_id == user.id
+
+    def test_username_is_unique(self, db_session):
+        db_session.add_all([User(username="alice"), User(username="alice")])
+
+        with pytest.raises(Exception):
+            db_session.commit()
+
+    def test_deleting_user_cascades_to_habits(self, db_session):
+        user = User(username="alice")
+        user.habits.append(Habit(name="Run", periodicity=Periodicity.DAILY))
+        db_session.add(user)
+        db_session.commit()
+
+        db_session.delete(user)
+        db_session.commit()
+
+        assert db_session.query(Habit).count() == 0
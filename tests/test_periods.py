@@ -0,0 +1,43 @@
+import datetime
+
+import pytest
+
+from habittracker import periods
+
+
+class TestPeriods:
+    def test_local_date_treats_naive_as_utc(self):
+        moment = datetime.datetime(2024, 1, 1, 23, 30)
+        assert periods.local_date(moment, "UTC") == datetime.date(2024, 1, 1)
+        assert periods.local_date(moment, "Europe/Zagreb") == datetime.date(2024, 1, 2)
+        assert periods.local_date(moment, "America/New_York") == datetime.date(
+            2024, 1, 1
+        )
+
+    def test_local_date_converts_aware_datetimes(self):
+        moment = datetime.datetime(
+            2024, 1, 2, 3, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=5))
+        )
+        assert periods.local_date(moment, "UTC") == datetime.date(2024, 1, 1)
+
+    def test_unknown_timezone_raises_value_error(self):
+        with pytest.raises(ValueError):
+            periods.get_zone("Mars/Olympus_Mons")
+
+    def test_iso_week_key_uses_iso_years(self):
+        assert periods.iso_week_key(datetime.date(2024, 1, 1)) == "2024-W01"
+        assert periods.iso_week_key(datetime.date(2021, 1, 3)) == "2020-W53"
+        assert periods.iso_week_start("2020-W53") == datetime.date(2020, 12, 28)
+
+    def test_iso_week_ordinal_changes_on_mondays(self):
+        sunday, monday = datetime.date(2021, 1, 3), datetime.date(2021, 1, 4)
+        assert periods.day_ordinal(monday) - periods.day_ordinal(sunday) == 1
+        assert periods.iso_week_ordinal(monday) - periods.iso_week_ordinal(sunday) == 1
+        # Every day of ISO week 2020-W53 shares one ordinal
+        week = {
+            periods.iso_week_ordinal(
+                datetime.date(2020, 12, 28) + datetime.timedelta(d)
+            )
+            for d in range(7)
+        }
+        assert len(week) == 1
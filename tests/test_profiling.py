@@ -0,0 +1,84 @@
+import pytest
+
+from habittracker import profiling
+from habittracker.profiling import Profiler
+
+
+def _work():
+    return sum(i * i for i in range(200_000))
+
+
+def test_stats_profile_ranks_functions_by_cumulative_time():
+    with Profiler("stats") as profiler:
+        _work()
+    report = profiler.report()
+    assert "cumulative" in report
+    assert "_work" in report
+
+
+def test_collapsed_profile_samples_stacks(monkeypatch):
+    monkeypatch.setattr(profiling, "SAMPLE_INTERVAL", 0.0005)
+    with Profiler("collapsed") as profiler:
+        for _ in range(20):
+            _work()
+    lines = profiler.report().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1
+    assert any("_work (test_profiling.py:" in line for line in lines)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        Profiler("svg")
+
+
+def test_profile_flag_needs_the_server_setting_and_token(client, monkeypatch):
+    token = {"X-Profile-Token": "s3cret"}
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    assert client.get("/api/dashboard?profile=1", headers=token).status_code == 403
+
+    monkeypatch.setattr(profiling, "PROFILE_REQUESTS", True)
+    assert client.get("/api/dashboard?profile=1").status_code == 403
+    response = client.get(
+        "/api/dashboard?profile=1",
+        headers={"X-Profile-Token": "guess", "X-User": "admin"},
+    )
+    assert response.status_code == 403
+
+    response = client.get("/api/dashboard?profile=1", headers=token)
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert "dashboard" in response.get_data(as_text=True)
+
+    response = client.get("/api/dashboard?profile=svg", headers=token)
+    assert response.status_code == 400
+
+
+def test_profiling_needs_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_REQUESTS", True)
+    response = client.get("/api/dashboard?profile=1", headers={"X-Profile-Token": ""})
+    assert response.status_code == 403
+
+
+def test_profile_analytics_cli(app, client, tmp_path):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["profile-analytics", "/api/dashboard"])
+    assert result.exit_code == 0
+    assert "GET /api/dashboard -> 200 OK" in result.output
+    assert "get_dashboard" in result.output
+
+    output = tmp_path / "dashboard.folded"
+    result = runner.invoke(
+        args=[
+            "profile-analytics",
+            "/api/analytics/habits/completion-rates",
+            "--format",
+            "collapsed",
+            "--output",
+            str(output),
+        ]
+    )
+    assert result.exit_code == 0
+    assert output.exists()
@@ -0,0 +1,177 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_mock_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from habittracker import database
+from habittracker.analytics import AnalyticsService
+from habittracker.database import create_database_engine
+from habittracker.models import (
+    STALE_AS_OF,
+    Base,
+    Completion,
+    Habit,
+    HabitStats,
+    Periodicity,
+)
+from habittracker.ranking import RankingService
+
+TODAY = pd.Timestamp("2024-01-31 12:00")
+
+
+def _add_habits(db_session, completed_days):
+    """Daily habits created 2024-01-01, each completed on the first N days."""
+    habits = [
+        Habit(
+            name=f"H{n}",
+            periodicity=Periodicity.DAILY,
+            created_at=pd.Timestamp("2024-01-01"),
+        )
+        for n in completed_days
+    ]
+    db_session.add_all(habits)
+    db_session.commit()
+    db_session.add_all(
+        [
+            Completion(habit_id=habit.id, completed_at=day)
+            for habit, n in zip(habits, completed_days)
+            for day in pd.date_range("2024-01-02", periods=n)
+        ]
+    )
+    db_session.commit()
+    return habits
+
+
+class TestRankingService:
+    def test_struggled_matches_analytics(self, db_session):
+        _add_habits(db_session, [3, 25, 10, 0, 29])
+
+        ranking = RankingService(db_session)
+        analytics = AnalyticsService(db_session)
+        for threshold, quartile in [(0.75, 0.25), (0.5, 1.0), (1.0, 0.5)]:
+            expected = analytics.identify_struggled_habits(
+                today=TODAY, threshold=threshold, quartile=quartile
+            )
+            assert ranking.struggled(threshold, quartile, now=TODAY) == expected[
+                ["id", "name", "completion_rate"]
+            ].to_dict("records")
+
+    def test_ranked_order_limit_and_threshold(self, db_session):
+        h3, h25, h10 = _add_habits(db_session, [3, 25, 10])
+
+        ranking = RankingService(db_session)
+        top = ranking.ranked("top", 2, now=TODAY)
+        assert [row["id"] for row in top] == [h25.id, h10.id]
+        assert top[0]["completions_30d"] == 25
+
+        bottom = ranking.ranked("bottom", 10, threshold=0.5, now=TODAY)
+        assert [row["id"] for row in bottom] == [h3.id, h10.id]
+
+    def test_record_completion_updates_incrementally(self, db_session):
+        (habit,) = _add_habits(db_session, [3])
+        ranking = RankingService(db_session)
+        ranking.refresh(TODAY)
+        before = db_session.get(HabitStats, habit.id).completion_rate_30d
+
+        ranking.record_completion(habit, TODAY.date(), now=TODAY)
+        stats = db_session.get(HabitStats, habit.id)
+        assert stats.completions_30d == 4
+        assert stats.completion_rate_30d == pytest.approx(before * 4 / 3)
+        # Jan 2-4 then Jan 31 is a new run
+        assert (stats.current_streak, stats.longest_streak) == (1, 3)
+
+    def test_record_completion_extends_streak(self, db_session):
+        (habit,) = _add_habits(db_session, [3])
+        ranking = RankingService(db_session)
+        now = pd.Timestamp("2024-01-05 12:00")
+        ranking.refresh(now)
+
+        ranking.record_completion(habit, now.date(), now=now)
+        stats = db_session.get(HabitStats, habit.id)
+        assert (stats.current_streak, stats.longest_streak) == (4, 4)
+        assert stats.last_completed == now.date()
+
+    def test_streaks_match_analytics(self, db_session):
+        habits = _add_habits(db_session, [3, 0, 29])
+        ranking = RankingService(db_session)
+        analytics = AnalyticsService(db_session)
+        for habit in habits:
+            assert ranking.streaks(habit.id, now=TODAY) == (
+                analytics.calculate_streaks(habit.id, today=TODAY)
+            )
+        assert ranking.streaks(999, now=TODAY) == {
+            "longest_streak": 0,
+            "current_streak": 0,
+        }
+
+    def test_stale_stats_are_refreshed_on_read(self, db_session):
+        (habit,) = _add_habits(db_session, [3])
+        ranking = RankingService(db_session)
+        ranking.refresh(pd.Timestamp("2024-01-10"))
+
+        ranking.ranked(now=TODAY)
+        stats = db_session.get(HabitStats, habit.id)
+        assert stats.as_of == TODAY.date()
+        assert stats.expected_30d == 30
+
+    def test_new_habits_are_found_stale_through_the_as_of_index(self, db_session):
+        (habit,) = _add_habits(db_session, [2])
+        assert db_session.get(HabitStats, habit.id).as_of == STALE_AS_OF
+
+        stale = RankingService(db_session, user_id=1)._stale(TODAY.date())
+        sql = stale.statement.compile(compile_kwargs={"literal_binds": True})
+        plan = db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        assert "INDEX ix_habit_stats_user_as_of" in plan[0][-1]
+
+        RankingService(db_session).ensure_fresh(TODAY)
+        assert db_session.get(HabitStats, habit.id).completions_30d == 2
+
+    def test_stats_are_deleted_with_habit(self, db_session):
+        (habit,) = _add_habits(db_session, [1])
+        RankingService(db_session).refresh(TODAY)
+        db_session.delete(habit)
+        db_session.commit()
+        assert db_session.query(HabitStats).count() == 0
+
+
+def test_concurrent_refreshes_of_a_new_habit(tmp_path):
+    """Refreshes racing to create a habit's stats row all succeed."""
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'ranking.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db_session:
+        (habit,) = _add_habits(db_session, [3])
+        habit_id = habit.id
+    start = threading.Barrier(8)
+
+    def refresh(_):
+        with sessions() as db_session:
+            start.wait()
+            return RankingService(db_session).refresh(TODAY, [habit_id])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(refresh, range(8))) == [1] * 8
+    with sessions() as db_session:
+        assert db_session.get(HabitStats, habit_id).completions_30d == 3
+    engine.dispose()
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "postgresql://"])
+def test_stats_upsert_uses_the_backend_dialect(url):
+    db_session = Session(bind=create_mock_engine(url, executor=None))
+    stmt = database.upsert_insert(db_session, HabitStats)
+    sql = str(
+        stmt.on_conflict_do_nothing(index_elements=["habit_id"]).compile(
+            dialect=db_session.get_bind().dialect
+        )
+    )
+    assert sql.endswith("ON CONFLICT (habit_id) DO NOTHING")
+
+
+def test_stats_upsert_rejects_other_backends():
+    db_session = Session(bind=create_mock_engine("mysql://", executor=None))
+    with pytest.raises(NotImplementedError):
+        database.upsert_insert(db_session, HabitStats)
@@ -0,0 +1,108 @@
+import json
+
+import pandas as pd
+import pytest
+
+from habittracker import reports
+from habittracker.analytics import REPORT_DTYPES, AnalyticsService
+from habittracker.models import Completion, Habit, Periodicity, User
+
+TODAY = pd.Timestamp("2024-01-17 12:00")
+
+
+@pytest.fixture
+def habits(db_session):
+    alice, bob = User(username="alice"), User(username="bob")
+    db_session.add_all([alice, bob])
+    db_session.commit()
+    daily = Habit(
+        name="Daily",
+        periodicity=Periodicity.DAILY,
+        created_at=pd.Timestamp("2024-01-01"),
+        user_id=alice.id,
+    )
+    weekly = Habit(
+        name="Weekly",
+        periodicity=Periodicity.WEEKLY,
+        created_at=pd.Timestamp("2024-01-01"),
+        user_id=bob.id,
+    )
+    db_session.add_all([daily, weekly])
+    db_session.commit()
+    db_session.add_all(
+        [
+            Completion(habit_id=weekly.id, user_id=bob.id, completed_at=day)
+            for day in pd.to_datetime(["2024-01-01", "2024-01-08", "2024-01-16"])
+        ]
+    )
+    db_session.commit()
+    return daily, weekly
+
+
+def test_habit_report_rows(db_session, habits):
+    daily, weekly = habits
+    frames = list(AnalyticsService(db_session).habit_report(TODAY, workers=1))
+    report = pd.concat(frames, ignore_index=True)
+
+    assert report.dtypes.astype(str).to_dict() == {
+        column: str(dtype) for column, dtype in REPORT_DTYPES.items()
+    }
+    assert report["habit_id"].tolist() == [daily.id, weekly.id]
+    row = report.iloc[1]
+    assert row["periodicity"] == "weekly"
+    assert row["completed_this_period"]
+    assert row["current_streak"] == row["longest_streak"] == 3
+    assert row["last_completed"] == pd.Timestamp("2024-01-16")
+    assert (row["best_day"], row["worst_day"]) == ("Monday", "Tuesday")
+    assert row["completion_rate"] == 1.0
+    assert report.iloc[0]["current_streak"] == 0
+    assert pd.isna(report.iloc[0]["last_completed"])
+
+
+def test_report_cli_writes_csv_and_json(app, habits, tmp_path):
+    daily, weekly = habits
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["analytics", "report", "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    lines = result.stdout.splitlines()
+    assert lines[0].startswith("habit_id,user_id,name,periodicity,created_at")
+    assert len(lines) == 3
+    assert "Wrote 2 habits." in result.stderr
+
+    output = tmp_path / "report.jsonl"
+    result = runner.invoke(
+        args=["analytics", "report", "--format", "json", "--output", str(output)]
+        + ["--user", "bob"]
+    )
+    assert result.exit_code == 0, result.output
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [row["habit_id"] for row in rows] == [weekly.id]
+    assert rows[0]["last_completed"] == "2024-01-16T00:00:00"
+    assert rows[0]["longest_streak"] == 3
+
+
+def test_report_cli_rejects_bad_output(app, habits):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["analytics", "report", "--user", "nobody"])
+    assert result.exit_code != 0
+    assert "no user 'nobody'" in result.output
+
+    result = runner.invoke(args=["analytics", "report", "--format", "parquet"])
+    assert result.exit_code != 0
+    assert "must be written to a file" in result.output
+
+
+def test_parquet_report_has_a_row_group_per_chunk(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    frame = pd.DataFrame({"habit_id": [1, 2], "best_day": ["Monday", None]}).astype(
+        {"habit_id": "int32", "best_day": "string"}
+    )
+    path = tmp_path / "report.parquet"
+
+    assert (
+        reports.write_report([frame, frame.iloc[:0], frame], str(path), "parquet") == 4
+    )
+    table = pq.ParquetFile(path)
+    assert table.metadata.num_row_groups == 3
+    assert table.read().column("best_day").to_pylist() == ["Monday", None] * 2
@@ -0,0 +1,108 @@
+import pandas as pd
+
+from habittracker.models import (
+    Completion,
+    Habit,
+    HabitStats,
+    Periodicity,
+    User,
+    UserPreferences,
+)
+from habittracker.ranking import RankingService
+from habittracker.rollover import RolloverScheduler, run_rollover
+
+
+def _habit_with_run(db_session, start, days, user_id=None):
+    habit = Habit(
+        name="Run",
+        periodicity=Periodicity.DAILY,
+        created_at=pd.Timestamp("2024-01-01"),
+        user_id=user_id,
+    )
+    db_session.add(habit)
+    db_session.commit()
+    db_session.add_all(
+        [
+            Completion(habit_id=habit.id, completed_at=day)
+            for day in pd.date_range(start, periods=days)
+        ]
+    )
+    db_session.commit()
+    return habit
+
+
+class TestRollover:
+    def test_refreshes_stale_and_missing_rows(self, db_session):
+        habit = _habit_with_run(db_session, "2024-01-01", 10)
+        RankingService(db_session).refresh(pd.Timestamp("2024-01-10 12:00"))
+        new = Habit(name="New", periodicity=Periodicity.WEEKLY)
+        db_session.add(new)
+        db_session.commit()
+
+        now = pd.Timestamp("2024-01-20 00:05")
+        result = run_rollover(db_session, now)
+        assert result["refreshed"] == 2
+
+        stats = db_session.get(HabitStats, habit.id)
+        assert stats.as_of == now.date()
+        assert stats.expected_30d == 19
+        assert stats.current_streak == 0
+        assert stats.longest_streak == 10
+        assert db_session.get(HabitStats, new.id) is not None
+
+        # A second run the same day has nothing left to do
+        assert run_rollover(db_session, now) == {"refreshed": 0, "streaks_reset": 0}
+
+    def test_resets_streaks_at_local_midnight(self, db_session):
+        user = User(username="la")
+        db_session.add(user)
+        db_session.commit()
+        db_session.add(UserPreferences(user_id=user.id, timezone="America/Los_Angeles"))
+        db_session.commit()
+        # Evenings in Los Angeles, stored as the next morning in UTC
+        habit = _habit_with_run(db_session, "2024-01-09 04:00", 3, user.id)
+
+        # 00:05 UTC on Jan 12 is still Jan 11 in Los Angeles, a day after the
+        # last local completion on Jan 10, so the refreshed streak is alive
+        result = run_rollover(db_session, pd.Timestamp("2024-01-12 00:05"))
+        assert result == {"refreshed": 1, "streaks_reset": 0}
+        assert db_session.get(HabitStats, habit.id).current_streak == 3
+
+        # Local midnight passes later the same UTC day
+        result = run_rollover(db_session, pd.Timestamp("2024-01-12 08:05"))
+        assert result == {"refreshed": 0, "streaks_reset": 1}
+        assert db_session.get(HabitStats, habit.id).current_streak == 0
+
+    def test_lapsed_streaks_read_as_zero_without_a_rollover(self, db_session):
+        user = User(username="la")
+        db_session.add(user)
+        db_session.commit()
+        db_session.add(UserPreferences(user_id=user.id, timezone="America/Los_Angeles"))
+        db_session.commit()
+        habit = _habit_with_run(db_session, "2024-01-09 04:00", 3, user.id)
+        ranking = RankingService(db_session, user.id)
+
+        now = pd.Timestamp("2024-01-12 00:05")
+        assert ranking.streaks(habit.id, now)["current_streak"] == 3
+        # Local midnight passes later the same UTC day, with no rollover run
+        later = pd.Timestamp("2024-01-12 08:05")
+        assert ranking.streaks(habit.id, later) == {
+            "longest_streak": 3,
+            "current_streak": 0,
+        }
+        assert db_session.get(HabitStats, habit.id).current_streak == 3
+
+    def test_scheduler_runs_once(self, db_session):
+        from habittracker import database
+
+        _habit_with_run(db_session, "2024-01-01", 1)
+        scheduler = RolloverScheduler(database.SessionLocal)
+        assert scheduler.run_once()["refreshed"] == 1
+
+
+def test_rollover_cli(app, client):
+    """Test that `flask rollover` refreshes stats and reports what it did."""
+    client.post("/api/habits", json={"name": "Cli", "periodicity": "daily"})
+    result = app.test_cli_runner().invoke(args=["rollover"])
+    assert result.exit_code == 0
+    assert "Refreshed 1 habits" in result.output
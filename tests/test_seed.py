@@ -0,0 +1,13 @@
+from habittracker.models import Habit, HabitStats
+from seed import seed_database
+
+
+def test_seeding_twice_replaces_the_sample_data(db_session, capsys):
+    seed_database()
+    habits = db_session.query(Habit).count()
+    assert habits > 0
+
+    seed_database()
+    assert "error" not in capsys.readouterr().out
+    assert db_session.query(Habit).count() == habits
+    assert db_session.query(HabitStats).count() == habits
@@ -1,7 +1,10 @@
+import datetime
 from unittest.mock import Mock, patch
 
 import pytest
+from sqlalchemy import event
 
+from habittracker import periods
 from habittracker.models import Completion, Habit, Periodicity, UserPreferences
 from habittracker.services import HabitAlreadyCompletedError, HabitService
 
@@ -517,18 +520,192 @@ class TestHabitServiceErrorHandling:
             with pytest.raises(Exception):
                 service.create_habit("Test", "daily")
 
-    def test_refresh_error_handling(self, db_session):
-        """Test handling of refresh errors."""
+    def test_writes_do_not_refresh(self, db_session):
+        """Written objects stay loaded after commit, so no refresh is issued."""
         service = HabitService(db_session)
 
-        # Create a habit normally
-        habit = Habit(name="Test", periodicity=Periodicity.DAILY)
+        with patch.object(
+            db_session, "refresh", side_effect=Exception("Refresh called")
+        ):
+            habit = service.create_habit("Test", "weekly")
+            service.update_habit(habit.id, name="Renamed")
+            service.check_off_habit(habit.id)
+            service.update_user_preferences(struggle_threshold=0.5)
+
+        assert habit.name == "Renamed"
+        assert habit.created_at.tzinfo is None
+
+
+class TestHabitServiceUserScoping:
+    """Test that HabitService only touches the configured user's rows."""
+
+    def test_get_or_create_user_is_idempotent(self, db_session):
+        service = HabitService(db_session)
+        first = service.get_or_create_user("alice")
+        second = service.get_or_create_user("alice")
+
+        assert first.id is not None
+        assert first.id == second.id
+
+    def test_habits_are_isolated_per_user(self, db_session):
+        service = HabitService(db_session)
+        alice = service.get_or_create_user("alice")
+        bob = service.get_or_create_user("bob")
+
+        alice_service = HabitService(db_session, alice.id)
+        bob_service = HabitService(db_session, bob.id)
+        alice_habit = alice_service.create_habit("Run", "daily")
+        bob_service.create_habit("Swim", "weekly")
+
+        assert [h.name for h in alice_service.get_all_habits()] == ["Run"]
+        assert [h.name for h in bob_service.get_all_habits()] == ["Swim"]
+        assert bob_service.get_habit_by_id(alice_habit.id) is None
+        assert bob_service.check_off_habit(alice_habit.id) is None
+        assert bob_service.delete_habit(alice_habit.id) is None
+
+    def test_check_off_denormalizes_user_onto_completion(self, db_session):
+        service = HabitService(db_session)
+        user = service.get_or_create_user("alice")
+        user_service = HabitService(db_session, user.id)
+        habit = user_service.create_habit("Run", "daily")
+
+        completion = user_service.check_off_habit(habit.id)
+
+        assert completion.user_id == user.id
+
+    def test_preferences_are_per_user(self, db_session):
+        service = HabitService(db_session)
+        alice = service.get_or_create_user("alice")
+        bob = service.get_or_create_user("bob")
+
+        HabitService(db_session, alice.id).update_user_preferences(
+            struggle_threshold=0.5
+        )
+        bob_preferences = HabitService(db_session, bob.id).get_user_preferences()
+
+        assert bob_preferences.struggle_threshold == 0.75
+        assert bob_preferences.user_id == bob.id
+
+
+class TestHabitServiceTimezones:
+    """Test that period checks follow the owner's timezone."""
+
+    def test_check_off_stores_local_period_keys(self, db_session):
+        service = HabitService(db_session)
+        user = service.get_or_create_user("alice")
+        user_service = HabitService(db_session, user.id)
+        user_service.update_user_preferences(timezone="Pacific/Kiritimati")
+        habit = user_service.create_habit("Run", "daily")
+
+        completion = user_service.check_off_habit(habit.id)
+
+        expected = periods.local_today("Pacific/Kiritimati")
+        assert completion.local_date == expected
+        assert completion.iso_week == periods.iso_week_key(expected)
+
+    def test_period_check_uses_local_date(self, db_session):
+        habit = Habit(name="Run", periodicity=Periodicity.DAILY)
         db_session.add(habit)
         db_session.commit()
+        # 23:30 UTC on Jan 1st is already Jan 2nd in Zagreb
+        db_session.add(
+            Completion(
+                habit_id=habit.id,
+                completed_at=datetime.datetime(2024, 1, 1, 23, 30),
+                local_date=datetime.date(2024, 1, 2),
+            )
+        )
+        db_session.commit()
 
-        # Mock refresh to raise an error
-        with patch.object(
-            db_session, "refresh", side_effect=Exception("Refresh failed")
-        ):
-            with pytest.raises(Exception):
-                service.create_habit("Another Test", "weekly")
+        service = HabitService(db_session)
+        assert service._already_completed_in_period(
+            habit.id, Periodicity.DAILY, datetime.date(2024, 1, 2)
+        )
+        assert not service._already_completed_in_period(
+            habit.id, Periodicity.DAILY, datetime.date(2024, 1, 1)
+        )
+
+    def test_weekly_period_check_uses_iso_week(self, db_session):
+        habit = Habit(name="Shop", periodicity=Periodicity.WEEKLY)
+        db_session.add(habit)
+        db_session.commit()
+        db_session.add(
+            Completion(habit_id=habit.id, completed_at=datetime.datetime(2024, 1, 7))
+        )
+        db_session.commit()
+
+        service = HabitService(db_session)
+        assert service._already_completed_in_period(
+            habit.id, Periodicity.WEEKLY, datetime.date(2024, 1, 1)
+        )
+        assert not service._already_completed_in_period(
+            habit.id, Periodicity.WEEKLY, datetime.date(2024, 1, 8)
+        )
+
+    def test_update_preferences_rejects_unknown_timezone(self, db_session):
+        service = HabitService(db_session)
+
+        with pytest.raises(ValueError):
+            service.update_user_preferences(timezone="Not/AZone")
+
+
+class TestHabitServiceCompletionStatus:
+    """Test the bulk completion status query."""
+
+    @pytest.fixture
+    def habits(self, db_session):
+        daily = Habit(name="Daily", periodicity=Periodicity.DAILY)
+        weekly = Habit(name="Weekly", periodicity=Periodicity.WEEKLY)
+        idle = Habit(name="Idle", periodicity=Periodicity.WEEKLY)
+        db_session.add_all([daily, weekly, idle])
+        db_session.commit()
+        completed = {
+            daily: ["2024-01-01", "2024-01-02", "2024-01-05", "2024-01-08"],
+            weekly: ["2024-01-03", "2024-01-14", "2024-01-28"],
+        }
+        for habit, days in completed.items():
+            db_session.add_all(
+                Completion(
+                    habit_id=habit.id,
+                    completed_at=datetime.datetime.fromisoformat(day),
+                )
+                for day in days
+            )
+        db_session.commit()
+        return [daily, weekly, idle]
+
+    def test_parity_with_period_check(self, db_session, habits):
+        service = HabitService(db_session)
+        start = datetime.date(2023, 12, 30)
+        for offset in range(35):
+            day = start + datetime.timedelta(days=offset)
+            status = service.get_completion_status(target_date=day)
+            for habit in habits:
+                assert status[habit.id] == service._already_completed_in_period(
+                    habit.id, habit.periodicity, day
+                ), (habit.name, day)
+
+    def test_selected_ids_only(self, db_session, habits):
+        service = HabitService(db_session)
+        status = service.get_completion_status(
+            [habits[0].id], target_date=datetime.date(2024, 1, 2)
+        )
+        assert status == {habits[0].id: True}
+
+    def test_single_query(self, db_session, habits):
+        service = HabitService(db_session)
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            # SAVEPOINTs come from the test transaction, not the service
+            if not statement.startswith(("SAVEPOINT", "RELEASE")):
+                statements.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            service.get_completion_status(target_date=datetime.date(2024, 1, 2))
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
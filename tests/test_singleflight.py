@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from habittracker.analytics import AnalyticsService
+from habittracker.singleflight import SingleFlight, analytics_flights
+
+
+def _start_followers(flights, key, count, results):
+    """Start ``count`` threads calling ``flights.do(key, ...)`` and wait until
+    they are all waiting on the in-flight call."""
+
+    def follow():
+        try:
+            results.append(flights.do(key, lambda: "follower ran"))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=follow) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    while flights.metrics()["coalesced"] < count:
+        pass
+    return threads
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_computation(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        results = []
+        runs = []
+
+        def compute():
+            runs.append(1)
+            release.wait()
+            return "shared"
+
+        leader = threading.Thread(
+            target=lambda: results.append(flights.do("key", compute))
+        )
+        leader.start()
+        while flights.metrics()["in_flight"] == 0:
+            pass
+        followers = _start_followers(flights, "key", 3, results)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        assert runs == [1]
+        assert results == ["shared"] * 4
+        metrics = flights.metrics()
+        assert metrics["calls"] == 4
+        assert metrics["coalesced"] == 3
+        assert metrics["hit_rate"] == pytest.approx(0.75)
+        assert metrics["in_flight"] == 0
+
+    def test_errors_reach_every_waiter(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        def fail():
+            release.wait()
+            raise RuntimeError("boom")
+
+        leader = threading.Thread(
+            target=lambda: pytest.raises(RuntimeError, flights.do, "k", fail)
+        )
+        leader.start()
+        while flights.metrics()["in_flight"] == 0:
+            pass
+        followers = _start_followers(flights, "k", 2, results)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        assert [str(r) for r in results] == ["boom", "boom"]
+
+    def test_sequential_calls_are_not_cached(self):
+        flights = SingleFlight()
+        assert flights.do("k", lambda: 1) == 1
+        assert flights.do("k", lambda: 2) == 2
+        assert flights.metrics()["coalesced"] == 0
+
+    def test_service_methods_are_counted_by_name(self, db_session):
+        analytics_flights.reset()
+        AnalyticsService(db_session).overall_completion_rate()
+        by_method = analytics_flights.metrics()["by_method"]
+        assert by_method["AnalyticsService.overall_completion_rate"]["calls"] == 1
+
+
+def test_get_analytics_metrics(client):
+    """Test that the coalescing counters are exposed."""
+    client.get("/api/analytics/habits/completion-rates")
+    response = client.get("/api/analytics/metrics")
+    assert response.status_code == 200
+    metrics = response.json["singleflight"]
+    assert metrics["calls"] >= 1
+    assert "AnalyticsService.overall_completion_rate" in metrics["by_method"]
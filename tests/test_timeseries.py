@@ -0,0 +1,23 @@
+from habittracker import timeseries
+
+
+class TestTimeseries:
+    def test_bitmap_is_46_bytes_with_jan_1_first(self):
+        packed = timeseries.year_bitmap([0, 9, 365])
+        assert len(packed) == 46
+        assert packed[0] == 0b10000000
+        assert packed[1] == 0b01000000
+        assert packed[45] == 0b00000100
+
+    def test_encode_and_decode_bitmap_round_trip(self):
+        days = [0, 1, 2, 59, 200, 364]
+        encoded = timeseries.encode_bitmap(days)
+        assert len(encoded) == 64
+        assert timeseries.decode_bitmap(encoded) == days
+
+    def test_run_lengths(self):
+        assert timeseries.run_lengths([]) == []
+        assert timeseries.run_lengths([5]) == [[5, 1]]
+        assert timeseries.run_lengths([0, 1, 2, 4, 5, 9]) == [[0, 3], [4, 2], [9, 1]]
+        # Unordered and repeated days collapse into the same runs
+        assert timeseries.run_lengths([2, 0, 1, 1]) == [[0, 3]]